@@ -0,0 +1,334 @@
+"""월별 주문 예측 파이프라인 오프라인 벤치마크
+
+Supabase 없이 합성 orders/contacts/sales_activities 데이터를 만들어 run_monthly_forecast_pipeline()을
+그대로 실행하고 (로컬 SQLite 저장소 사용), 단계별 소요 시간, 초당 처리 고객 수, 최대 메모리를 측정한다.
+--save-baseline으로 기준값을 저장해 두면 이후 실행에서 기준 대비 느려진 단계를 회귀로 표시한다.
+--http를 주면 같은 데이터를 로컬 PostgREST 흉내 서버(mock_postgrest.py)로 띄우고 비동기 HTTP 계층으로 실행한다.
+실행 전에 새 인터프리터에서 forecast 모듈 import 시간을 재어, 예산(IMPORT_TIME_BUDGET_S)을 넘거나 모델링
+라이브러리가 import 시점에 로딩되면 회귀로 표시한다.
+
+    python backend/forecast/benchmark.py --customers 200 --months 48 --save-baseline
+    python backend/forecast/benchmark.py --customers 200 --months 48
+    python backend/forecast/benchmark.py --customers 200 --http --http-latency-ms 20
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import forecast
+from mock_postgrest import MockPostgrestServer
+
+# --- 벤치마크 설정 ---
+BENCHMARK_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+BENCHMARK_TOLERANCE = 0.20  # 기준 대비 20% 이상 느려지면 회귀로 표시
+BENCHMARK_MIN_DELTA_S = 0.5  # 짧은 단계의 측정 잡음은 무시
+GROUP_B_RATIO = 0.25  # 주문이 드문드문한(B그룹 후보) 고객 비율
+ACTIVITY_TYPE_MIX = {'견적 요청': 0.20, '신규 제안': 0.10, '방문': 0.30, '전화': 0.30, '교체 상담': 0.10}
+OUTCOME_MIX = {'성공': 0.3, '보류': 0.4, '실패': 0.2, None: 0.1}
+CONTACTS_PER_CUSTOMER = 3
+
+
+# --- 합성 데이터 생성 ---
+def generate_synthetic_tables(n_customers, months, seed=0, group_b_ratio=GROUP_B_RATIO,
+                              activity_type_mix=None, outcome_mix=None):
+    """Supabase 응답과 같은 모양의 contacts/orders/sales_activities 행(dict 리스트)을 생성
+
+    - 고객마다 기본 주문액, 연간 계절성(진폭/위상), 성장 추세가 다르고 가끔 대량 주문(5배)이 섞인다.
+    - group_b_ratio 비율의 고객은 주문이 있는 달이 5% 내외로 드물어 B그룹으로 분류된다.
+    - 활동 유형/결과는 activity_type_mix/outcome_mix 비율로 뽑는다.
+    """
+    rng = np.random.default_rng(seed)
+    activity_type_mix = activity_type_mix or ACTIVITY_TYPE_MIX
+    outcome_mix = outcome_mix or OUTCOME_MIX
+    end = pd.Timestamp(date.today()).to_period('M').to_timestamp()
+    month_starts = pd.date_range(end=end, periods=months, freq='MS')
+
+    customer_ids = np.arange(1, n_customers + 1)
+    sparse = rng.random(n_customers) < group_b_ratio
+    contacts = [{'CONTACT_ID': int(cust_id * 100 + k), 'CUSTOMER_ID': int(cust_id)}
+                for cust_id in customer_ids for k in range(CONTACTS_PER_CUSTOMER)]
+
+    # (고객, 월) 격자 단위로 주문 여부/금액을 한 번에 계산
+    active_prob = np.where(sparse, 0.05, 0.9)[:, None]
+    has_order = rng.random((n_customers, months)) < active_prob
+    base = rng.lognormal(mean=7.0, sigma=0.5, size=n_customers)[:, None]
+    amplitude = rng.uniform(0.1, 0.5, size=n_customers)[:, None]
+    phase = rng.uniform(0, 2 * np.pi, size=n_customers)[:, None]
+    trend = rng.normal(0.0, 0.01, size=n_customers)[:, None]
+    month_no = month_starts.month.to_numpy()[None, :]
+    step = np.arange(months)[None, :]
+    amount = base * (1 + amplitude * np.sin(2 * np.pi * month_no / 12 + phase)) * (1 + trend) ** step
+    amount *= rng.lognormal(0.0, 0.15, size=amount.shape)
+    amount *= np.where(rng.random(amount.shape) < 0.05, 5.0, 1.0)
+
+    cust_idx, month_idx = np.nonzero(has_order)
+    order_days = rng.integers(0, 28, size=len(cust_idx))
+    order_dates = (month_starts.to_numpy()[month_idx] + order_days.astype('timedelta64[D]')).astype('datetime64[D]')
+    contact_ids = customer_ids[cust_idx] * 100 + rng.integers(0, CONTACTS_PER_CUSTOMER, size=len(cust_idx))
+    orders = [{'ORDER_ID': i + 1, 'CONTACT_ID': int(contact_id), 'ORDER_DATE': str(order_date),
+               'AMOUNT': round(float(amt), 2)}
+              for i, (contact_id, order_date, amt) in enumerate(zip(contact_ids, order_dates,
+                                                                    amount[cust_idx, month_idx]))]
+
+    # 활동: 주문이 많은 고객일수록 활동도 많도록 월별 포아송 분포
+    activity_rate = np.where(sparse, 0.3, 1.5)[:, None] * (1 + 0.5 * has_order)
+    activity_counts = rng.poisson(activity_rate)
+    act_cust_idx = np.repeat(np.repeat(np.arange(n_customers), months), activity_counts.ravel())
+    act_month_idx = np.repeat(np.tile(np.arange(months), n_customers), activity_counts.ravel())
+    act_days = rng.integers(0, 28, size=len(act_cust_idx))
+    act_dates = (month_starts.to_numpy()[act_month_idx] + act_days.astype('timedelta64[D]')).astype('datetime64[D]')
+    act_types = rng.choice(list(activity_type_mix), size=len(act_cust_idx), p=list(activity_type_mix.values()))
+    outcome_values = list(outcome_mix)
+    outcome_idx = rng.choice(len(outcome_values), size=len(act_cust_idx), p=list(outcome_mix.values()))
+    activities = [{'ACTIVITY_ID': i + 1, 'CUSTOMER_ID': int(customer_ids[c]), 'ACTIVITY_DATE': str(d),
+                   'ACTIVITY_TYPE': str(t), 'OUTCOME': outcome_values[o]}
+                  for i, (c, d, t, o) in enumerate(zip(act_cust_idx, act_dates, act_types, outcome_idx))]
+
+    return {'contacts': contacts, 'orders': orders, 'sales_activities': activities}
+
+
+class _SyntheticResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class _SyntheticQuery:
+    """load_data_from_supabase()/DataSnapshot이 쓰는 select/gt/lte/order/range/limit/execute 호출만 흉내내는 쿼리
+
+    행은 ID 순으로 저장되어 있으므로 order()는 정렬을 다시 하지 않는다.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self._filters = []
+        self._range = None
+        self._count = None
+
+    def select(self, columns, count=None):
+        self._count = count
+        return self
+
+    def gt(self, column, value):
+        self._filters.append(lambda row: row[column] > value)
+        return self
+
+    def lte(self, column, value):
+        self._filters.append(lambda row: row[column] <= value)
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, stop):
+        self._range = (start, stop)
+        return self
+
+    def limit(self, count):
+        self._range = (0, count - 1)
+        return self
+
+    def execute(self):
+        rows = [row for row in self.rows if all(f(row) for f in self._filters)] if self._filters else self.rows
+        count = len(rows) if self._count == 'exact' else None
+        if self._range is not None:
+            rows = rows[self._range[0]:self._range[1] + 1]
+        return _SyntheticResponse(rows, count)
+
+
+class SyntheticSupabaseClient:
+    """합성 테이블을 Supabase 클라이언트처럼 페이지 단위로 돌려주는 대역
+
+    orders 조회는 contacts!inner(CUSTOMER_ID) 조인 결과처럼 'contacts' 필드를 붙여서 돌려준다.
+    """
+
+    def __init__(self, tables):
+        customer_by_contact = {c['CONTACT_ID']: c['CUSTOMER_ID'] for c in tables['contacts']}
+        self.tables = {
+            'orders': [{'ORDER_ID': o['ORDER_ID'], 'ORDER_DATE': o['ORDER_DATE'], 'AMOUNT': o['AMOUNT'],
+                        'contacts': {'CUSTOMER_ID': customer_by_contact[o['CONTACT_ID']]}}
+                       for o in tables['orders'] if o['CONTACT_ID'] in customer_by_contact],
+            'sales_activities': tables['sales_activities'],
+        }
+        self.request_count = 0
+
+    def table(self, name):
+        self.request_count += 1
+        return _SyntheticQuery(self.tables.get(name, []))
+
+
+# --- 벤치마크 실행/기준 비교 ---
+def measure_import(repeat=3):
+    """새 인터프리터에서 forecast 모듈을 import해 (최소 import 시간(초), import 시점에 로딩된 모델링 모듈 목록)을 반환"""
+    script = ("import json, sys, forecast; "
+              "print(json.dumps([forecast.MODULE_IMPORT_SECONDS, "
+              "[m for m in forecast.MODELING_MODULES if m in sys.modules]]))")
+    results = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return min(seconds for seconds, _ in results), results[-1][1]
+
+
+def run_benchmark(n_customers, months, seed=0, workers=1, prophet_validation=None, verbose=False, http=False,
+                  http_latency_ms=0, memory_limit_mb=0):
+    """합성 데이터로 파이프라인을 한 번 실행하고 결과 dict(설정, 단계별 시간, 처리량, 메모리)를 반환
+
+    http=True이면 SQLite 대신 로컬 PostgREST 흉내 서버(요청마다 http_latency_ms 지연)에 AsyncPostgrestIO로 읽고 쓴다.
+    memory_limit_mb > 0이면 파이프라인을 메모리 상한 모드로 실행한다.
+    """
+    print(f"🧪 합성 데이터 생성 중 (고객 {n_customers}명, {months}개월, seed={seed})...")
+    tables = generate_synthetic_tables(n_customers, months, seed=seed)
+    client = SyntheticSupabaseClient(tables)
+    print(f"✅ 주문 {len(tables['orders'])}건, 활동 {len(tables['sales_activities'])}건, "
+          f"연락처 {len(tables['contacts'])}건")
+
+    prophet_validation = prophet_validation or {'strategy': 'holdout', 'parallel': None, 'max_cutoffs': 0}
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    print("⏱️  파이프라인 실행 중...")
+    with contextlib.ExitStack() as stack:
+        if http:
+            server = MockPostgrestServer(client.tables, latency_s=http_latency_ms / 1000)
+            http_io = forecast.AsyncPostgrestIO(stack.enter_context(server), 'benchmark-key')
+            stack.callback(http_io.close)
+            backend = None
+        else:
+            http_io = None
+            backend = forecast.SQLiteForecastBackend()
+        state_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        started = time.perf_counter()
+        with output:
+            settings = forecast.PipelineSettings(
+                workers=workers, task_timeout=forecast.FORECAST_TASK_TIMEOUT_S, full_refit=True, state_dir=state_dir,
+                prophet_validation=prophet_validation, use_snapshot=False, memory_limit_mb=memory_limit_mb)
+            metrics = forecast.run_monthly_forecast_pipeline(settings, backend=backend, client=client, http_io=http_io)
+        wall_seconds = time.perf_counter() - started
+        forecast_rows = (len(server.tables.get(forecast.FORECAST_TABLE_NAME, [])) if http else
+                         int(len(backend.fetch_all())))
+    if metrics is None:
+        raise RuntimeError("파이프라인이 실행 지표 없이 종료되었습니다.")
+
+    customers = metrics['customers']
+    group_a_seconds = metrics['stages'].get('group_a', 0.0)
+    return {
+        'config': {'customers': n_customers, 'months': months, 'seed': seed, 'workers': workers,
+                   'prophet_validation': prophet_validation,
+                   'baseline_mape_threshold': forecast.BASELINE_MAPE_THRESHOLD,
+                   'http': http, 'http_latency_ms': http_latency_ms, 'memory_limit_mb': memory_limit_mb},
+        'rows': {'orders': len(tables['orders']), 'sales_activities': len(tables['sales_activities']),
+                 'forecasts': forecast_rows},
+        'stages': metrics['stages'],
+        'wall_seconds': wall_seconds,
+        'customers': customers,
+        'customers_per_second': customers['total'] / max(wall_seconds, 1e-9),
+        'group_a_customers_per_second': (customers['group_a'] - customers.get('group_a_baseline', 0)) /
+                                        max(group_a_seconds, 1e-9),
+        'peak_rss_mb': metrics['peak_rss_mb'],
+        'memory': metrics['memory'],
+    }
+
+
+def compare_with_baseline(result, baseline, tolerance=BENCHMARK_TOLERANCE, min_delta_s=BENCHMARK_MIN_DELTA_S):
+    """기준 대비 느려진 단계 목록 [(단계, 기준 초, 현재 초)]을 반환 (설정이 다르면 비교하지 않음)"""
+    if baseline.get('config') != result['config']:
+        print("⚠️ 기준값과 벤치마크 설정이 달라 비교를 건너뜁니다.")
+        return []
+    baseline_stages = dict(baseline['stages'], wall=baseline['wall_seconds'])
+    current_stages = dict(result['stages'], wall=result['wall_seconds'])
+    regressions = []
+    for stage, current in current_stages.items():
+        previous = baseline_stages.get(stage)
+        if previous is None:
+            continue
+        if current > previous * (1 + tolerance) and current - previous > min_delta_s:
+            regressions.append((stage, previous, current))
+    return regressions
+
+
+def print_report(result, baseline=None):
+    baseline_stages = dict(baseline['stages'], wall=baseline['wall_seconds']) if baseline else {}
+    print("\n📋 단계별 소요 시간")
+    for stage, seconds in list(result['stages'].items()) + [('wall', result['wall_seconds'])]:
+        previous = baseline_stages.get(stage)
+        change = f" (기준 {previous:.2f}초, {(seconds / previous - 1) * 100:+.0f}%)" if previous else ""
+        print(f"  - {stage:<18} {seconds:8.2f}초{change}")
+    customers = result['customers']
+    peak_rss = result['peak_rss_mb']
+    print(f"👥 고객 {customers['total']}명 (A {customers['group_a']} - 계절성 naive {customers.get('group_a_baseline', 0)}, "
+          f"B {customers['group_b']}), 전체 {result['customers_per_second']:.2f}명/초, "
+          f"그룹 A 정밀 예측 {result['group_a_customers_per_second']:.2f}명/초")
+    print(f"🧠 최대 메모리: {f'{peak_rss:,.0f}MB' if peak_rss is not None else '측정 불가'}")
+    memory = result.get('memory')
+    if memory and memory['limit_mb']:
+        print(f"   메모리 상한 {memory['limit_mb']:,}MB: 관측 최대 {memory['peak_rss_mb']:,.0f}MB "
+              f"(워커 최대 {memory['peak_worker_rss_mb']:,.0f}MB), 회수 {memory['reclaims']}회, "
+              f"회수 후에도 초과 {memory['over_limit']}회")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="월별 주문 예측 파이프라인 오프라인 벤치마크")
+    parser.add_argument("--customers", type=int, default=50, help="합성 고객 수")
+    parser.add_argument("--months", type=int, default=48, help="합성 데이터 기간(개월)")
+    parser.add_argument("--seed", type=int, default=0, help="난수 시드")
+    parser.add_argument("--workers", type=int, default=1, help="병렬 워커 수 (1이면 직렬 실행)")
+    parser.add_argument("--prophet-validation", choices=["cv", "holdout"], default="holdout",
+                        help="Prophet MAPE 계산 방식 (기본: 빠른 holdout)")
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE_PATH, help="기준값 JSON 경로")
+    parser.add_argument("--save-baseline", action="store_true", help="이번 결과를 기준값으로 저장")
+    parser.add_argument("--tolerance", type=float, default=BENCHMARK_TOLERANCE, help="회귀 판단 허용 비율")
+    parser.add_argument("--verbose", action="store_true", help="파이프라인 출력을 그대로 표시")
+    parser.add_argument("--http", action="store_true",
+                        help="로컬 PostgREST 흉내 서버 + 비동기 HTTP 계층으로 읽기/쓰기 (기본: 메모리/SQLite)")
+    parser.add_argument("--import-budget", type=float, default=forecast.IMPORT_TIME_BUDGET_S,
+                        help="forecast 모듈 import 시간 예산(초)")
+    parser.add_argument("--memory-limit-mb", type=int, default=0, help="파이프라인 메모리 상한 모드(MB, 0이면 끔)")
+    parser.add_argument("--http-latency-ms", type=int, default=0, help="--http 사용 시 요청마다 넣을 응답 지연(ms)")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    import_seconds, eager_modules = measure_import()
+    print(f"📦 forecast 모듈 import: {import_seconds:.2f}초 (예산 {args.import_budget:.2f}초)")
+    import_ok = import_seconds <= args.import_budget and not eager_modules
+    if eager_modules:
+        print(f"🔥 import 시점에 모델링 라이브러리가 로딩됨: {', '.join(eager_modules)}")
+    elif not import_ok:
+        print(f"🔥 import 시간 예산 초과: {import_seconds:.2f}초 > {args.import_budget:.2f}초")
+    result = run_benchmark(args.customers, args.months, seed=args.seed, workers=args.workers,
+                           prophet_validation={'strategy': args.prophet_validation, 'parallel': None,
+                                               'max_cutoffs': 0},
+                           verbose=args.verbose, http=args.http, http_latency_ms=args.http_latency_ms,
+                           memory_limit_mb=args.memory_limit_mb)
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    result['import_seconds'] = import_seconds
+    print_report(result, baseline if baseline and baseline.get('config') == result['config'] else None)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 기준값 저장: {args.baseline}")
+    elif baseline is not None:
+        regressions = compare_with_baseline(result, baseline, tolerance=args.tolerance)
+        if regressions:
+            for stage, previous, current in regressions:
+                print(f"🔥 성능 회귀: {stage} {previous:.2f}초 → {current:.2f}초")
+            sys.exit(1)
+        print("✅ 기준 대비 성능 회귀 없음.")
+    if not import_ok:
+        sys.exit(1)
@@ -0,0 +1,322 @@
+"""원천 데이터(orders/contacts, sales_activities) 로딩과 전처리, 로컬 스냅샷
+
+Supabase 클라이언트(또는 postgrest_io.AsyncPostgrestIO)에서 필요한 열만 페이지 단위로 스트리밍 로딩하고,
+전처리가 끝난 프레임을 state_dir/snapshot에 Arrow IPC 파일로 남겨 다음 실행에서는 추가분만 받는다.
+"""
+import json
+import os
+import sys
+import time
+from functools import partial
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # 선택 의존성: 없으면 로컬 스냅샷 없이 매번 전체 로딩
+    pa = None
+
+LOAD_PAGE_SIZE = 1000  # 원천 데이터 페이지 조회 크기 (PostgREST 기본 max-rows 이하)
+
+# --- 로컬 데이터 스냅샷 (전처리된 orders/activities, Arrow IPC) ---
+SNAPSHOT_AVAILABLE = pa is not None
+# 마지막 전체 로딩 후 이 시간이 지나면 전체 다시 로딩 (행 추가/삭제는 매 실행 행 수 비교로 감지, 이 주기는 값 수정 반영용)
+SNAPSHOT_FULL_REFRESH_HOURS = float(os.environ.get("FORECAST_SNAPSHOT_FULL_REFRESH_H", "24"))
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+class _TypedColumnBuffer:
+    """페이지 단위로 받은 레코드를 열별 NumPy 배열(고정 dtype)로 누적하는 버퍼
+
+    dtypes 값: 'id'(정수 ID, 최종 category), 'datetime'(datetime64), 'float32', 'category'(문자열)
+    """
+
+    def __init__(self, dtypes):
+        self.dtypes = dtypes
+        self.chunks = {col: [] for col in dtypes}
+        self.rows = 0
+
+    def append(self, columns):
+        for col, kind in self.dtypes.items():
+            values = pd.Series(columns[col], dtype=object)
+            if kind == 'id':
+                arr = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+            elif kind == 'datetime':
+                arr = pd.to_datetime(values).to_numpy(dtype='datetime64[ns]')
+            elif kind == 'float32':
+                arr = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float32)
+            else:
+                arr = pd.Categorical(values)
+            self.chunks[col].append(arr)
+        self.rows += len(columns[next(iter(self.dtypes))])
+
+    def to_frame(self, id_categories=None):
+        empty = {'id': np.array([], dtype=np.float64), 'datetime': np.array([], dtype='datetime64[ns]'),
+                 'float32': np.array([], dtype=np.float32), 'category': pd.Categorical([])}
+        data = {}
+        for col, kind in self.dtypes.items():
+            chunks = self.chunks[col]
+            if not chunks:
+                data[col] = empty[kind]
+            elif kind == 'category':
+                data[col] = union_categoricals(chunks)
+            else:
+                data[col] = np.concatenate(chunks)
+            self.chunks[col] = []
+        df = pd.DataFrame(data)
+        for col, kind in self.dtypes.items():
+            if kind == 'id':
+                df = df[df[col].notna()]
+                df[col] = pd.Categorical(df[col].astype(np.int64), categories=id_categories)
+        return df.reset_index(drop=True)
+
+
+def _iter_table_pages(client: "Client", table, columns, order_column, page_size, after=None):
+    """range() 기반 페이지 조회. 서버 max-rows 제한에 잘리지 않도록 고정된 정렬 순서로 끝까지 읽는다.
+
+    서버의 max-rows가 page_size보다 작으면 페이지가 짧게 오므로, 받은 행 수만큼 offset을 옮기고
+    빈 페이지가 올 때만 멈춘다. after를 지정하면 order_column 값이 after보다 큰 행만 읽는다 (스냅샷 이후 추가분).
+    """
+    offset = 0
+    while True:
+        query = client.table(table).select(columns)
+        if after is not None:
+            query = query.gt(order_column, after)
+        response = query.order(order_column).range(offset, offset + page_size - 1).execute()
+        rows = response.data or []
+        if not rows:
+            break
+        yield rows
+        offset += len(rows)
+
+
+def _peak_rss_mb():
+    """현재 프로세스의 최대 RSS(MB). resource 모듈이 없는 플랫폼(Windows)에서는 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _current_rss_mb():
+    """현재 프로세스의 RSS(MB). /proc가 없는 플랫폼에서는 최대 RSS로 대신한다."""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return _peak_rss_mb()
+
+
+def load_data_from_supabase(client: "Client", page_size=LOAD_PAGE_SIZE, after=None, http_io=None):
+    """orders(+contacts)와 sales_activities를 페이지 단위로 스트리밍 로딩
+
+    필요한 열만 조회하고, 각 페이지를 바로 열별 배열(CUSTOMER_ID: category, 날짜: datetime64, 금액: float32)로
+    변환하므로 전체 응답을 dict 리스트로 한꺼번에 들고 있지 않는다.
+    after={'orders': ORDER_ID, 'sales_activities': ACTIVITY_ID}를 넘기면 그 ID 이후의 행만 읽는다.
+    각 프레임의 attrs에는 마지막으로 읽은 ID('watermark')와 받은 원천 행 수('source_rows')를 남긴다.
+    http_io(AsyncPostgrestIO)를 넘기면 페이지를 여러 개씩 동시에 미리 요청한다 (결과 순서는 동일).
+    """
+    after = after or {}
+    iter_pages = http_io.iter_table_pages if http_io is not None else partial(_iter_table_pages, client)
+    try:
+        print("🚚 Supabase에서 데이터 로딩 중..." if not after else "🚚 Supabase에서 스냅샷 이후 추가 데이터 로딩 중...")
+        started = time.perf_counter()
+        watermarks = dict(after)
+        orders_buffer = _TypedColumnBuffer({'CUSTOMER_ID': 'id', 'ORDER_DATE': 'datetime', 'AMOUNT': 'float32'})
+        for rows in iter_pages('orders', 'ORDER_ID, ORDER_DATE, AMOUNT, contacts!inner(CUSTOMER_ID)', 'ORDER_ID',
+                               page_size, after=after.get('orders')):
+            watermarks['orders'] = rows[-1]['ORDER_ID']
+            orders_buffer.append({
+                'CUSTOMER_ID': [item['contacts']['CUSTOMER_ID'] if item.get('contacts') else None for item in rows],
+                'ORDER_DATE': [item['ORDER_DATE'] for item in rows],
+                'AMOUNT': [item['AMOUNT'] for item in rows]})
+
+        activity_columns = ('CUSTOMER_ID', 'ACTIVITY_DATE', 'ACTIVITY_TYPE', 'OUTCOME')
+        activities_buffer = _TypedColumnBuffer({'CUSTOMER_ID': 'id', 'ACTIVITY_DATE': 'datetime',
+                                                'ACTIVITY_TYPE': 'category', 'OUTCOME': 'category'})
+        for rows in iter_pages('sales_activities', ', '.join(('ACTIVITY_ID',) + activity_columns), 'ACTIVITY_ID',
+                               page_size, after=after.get('sales_activities')):
+            watermarks['sales_activities'] = rows[-1]['ACTIVITY_ID']
+            activities_buffer.append({col: [item.get(col) for item in rows] for col in activity_columns})
+
+        # 두 테이블의 CUSTOMER_ID 범주를 맞춰야 병합/비교 시 category dtype이 그대로 유지된다.
+        all_ids = np.concatenate([np.array([])] + orders_buffer.chunks['CUSTOMER_ID'] +
+                                 activities_buffer.chunks['CUSTOMER_ID'])
+        id_categories = np.unique(all_ids[~np.isnan(all_ids)]).astype(np.int64)
+        orders_df = orders_buffer.to_frame(id_categories)
+        activities_df = activities_buffer.to_frame(id_categories)
+        orders_df.attrs.update(watermark=watermarks.get('orders'), source_rows=orders_buffer.rows)
+        activities_df.attrs.update(watermark=watermarks.get('sales_activities'), source_rows=activities_buffer.rows)
+
+        elapsed = time.perf_counter() - started
+        peak_rss = _peak_rss_mb()
+        print(f"✅ 로드 완료: {len(orders_df)}개의 주문, {len(activities_df)}개의 활동. "
+              f"({(orders_buffer.rows + activities_buffer.rows) / max(elapsed, 1e-9):,.0f}행/초, "
+              f"최대 메모리: {f'{peak_rss:,.0f}MB' if peak_rss is not None else '측정 불가'})")
+        return orders_df, activities_df
+    except Exception as e:
+        print(f"🔥 Supabase 데이터 로딩 오류: {e}")
+        return None, None
+
+
+def preprocess_data(orders_df, activities_df):
+    orders_df.rename(columns={"ORDER_DATE": "ORDERED_AT", "AMOUNT": "SALES_AMOUNT"}, inplace=True)
+    orders_df["ORDERED_AT"] = pd.to_datetime(orders_df["ORDERED_AT"])
+    orders_df["MONTH_TS"] = orders_df["ORDERED_AT"].dt.to_period("M").dt.to_timestamp()
+    activities_df.rename(columns={"ACTIVITY_DATE": "CONTACTED_AT"}, inplace=True)
+    activities_df["CONTACTED_AT"] = pd.to_datetime(activities_df["CONTACTED_AT"])
+    activities_df["MONTH_TS"] = activities_df["CONTACTED_AT"].dt.to_period("M").dt.to_timestamp()
+    return orders_df, activities_df
+
+
+def _align_categories(frames, column):
+    """여러 프레임의 범주형 열을 같은 범주 집합으로 맞춘다 (concat/비교 후에도 category dtype 유지)"""
+    categories = frames[0][column].cat.categories
+    for df in frames[1:]:
+        categories = categories.union(df[column].cat.categories)
+    return [df.assign(**{column: df[column].cat.set_categories(categories)}) for df in frames]
+
+
+def _append_rows(base, delta):
+    if delta.empty:
+        return base
+    for column in base.columns:
+        if isinstance(base[column].dtype, pd.CategoricalDtype):
+            base, delta = _align_categories([base, delta], column)
+    return pd.concat([base, delta], ignore_index=True)
+
+
+class DataSnapshot:
+    """전처리까지 끝난 orders/activities 프레임의 로컬 스냅샷 (Arrow IPC 파일)
+
+    meta.json에 테이블별 워터마크(마지막으로 읽은 ORDER_ID/ACTIVITY_ID), 받은 원천 행 수, 마지막 전체 로딩
+    시각(created_at, 추가분을 덧붙여도 유지)을 저장한다. 매 실행마다 원격 테이블의 워터마크 이하 행 수를
+    스냅샷과 비교해 다르면(삭제, 더 작은 ID로 추가) 전체를 다시 읽고, 같으면 워터마크보다 큰 ID의 행만 받아
+    전처리 후 덧붙인다. 기존 행의 값 수정은 ID/행 수로 감지할 수 없으므로 full_refresh_hours(기본 24시간)
+    주기의 전체 재로딩으로만 반영된다.
+
+    읽을 때 파일을 메모리 맵으로 열지만 to_pandas()가 pandas 메모리로 복사하므로 zero-copy는 아니다.
+    스냅샷의 이점은 원격 전체 로딩과 전처리(날짜 파싱, 범주형 변환)를 건너뛰는 데 있다.
+    """
+
+    FILES = {'orders': 'orders.arrow', 'sales_activities': 'activities.arrow'}
+    ID_COLUMNS = {'orders': 'ORDER_ID', 'sales_activities': 'ACTIVITY_ID'}
+
+    def __init__(self, snapshot_dir, full_refresh_hours=SNAPSHOT_FULL_REFRESH_HOURS):
+        self.snapshot_dir = snapshot_dir
+        self.full_refresh_hours = full_refresh_hours
+
+    def _path(self, name):
+        return os.path.join(self.snapshot_dir, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path('meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('version') == SNAPSHOT_FORMAT_VERSION else None
+
+    def _read_frame(self, table):
+        with pa.memory_map(self._path(self.FILES[table]), 'r') as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+
+    def _write_frame(self, df, table):
+        path = self._path(self.FILES[table])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        os.replace(tmp_path, path)
+
+    def _remote_count(self, client, table, watermark, http_io=None):
+        """원격 테이블에서 ID가 watermark 이하인 행 수 (orders는 로딩과 같은 contacts 조인 기준)"""
+        id_column = self.ID_COLUMNS[table]
+        columns = f"{id_column}, contacts!inner(CUSTOMER_ID)" if table == 'orders' else id_column
+        if http_io is not None:
+            return http_io.count_rows(table, columns, [(id_column, f"lte.{watermark}")])
+        response = client.table(table).select(columns, count='exact').lte(id_column, watermark).limit(1).execute()
+        return response.count
+
+    def _stale_reason(self, client, meta, http_io=None):
+        age_hours = (time.time() - meta['created_at']) / 3600
+        if age_hours > self.full_refresh_hours:
+            return f"마지막 전체 로딩 후 {age_hours:.1f}시간 경과"
+        for table in self.FILES:
+            watermark = meta['watermarks'].get(table)
+            if watermark is None:
+                continue
+            try:
+                remote_rows = self._remote_count(client, table, watermark, http_io)
+            except Exception as e:
+                return f"{table} 행 수 확인 실패 ({e})"
+            if remote_rows != meta['source_rows'][table]:
+                return f"{table} 행 수 변경 ({meta['source_rows'][table]} → {remote_rows})"
+        return None
+
+    def save(self, orders, activities_df, watermarks, source_rows, created_at=None):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self._write_frame(orders, 'orders')
+        self._write_frame(activities_df, 'sales_activities')
+        meta = {'version': SNAPSHOT_FORMAT_VERSION, 'created_at': created_at or time.time(),
+                'watermarks': watermarks, 'source_rows': source_rows}
+        tmp_path = self._path(f"meta.json.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path('meta.json'))
+
+    def load(self, client: "Client", page_size=LOAD_PAGE_SIZE, http_io=None):
+        """스냅샷 + 추가분 (또는 전체 로딩) 결과를 전처리된 (orders, activities_df)로 반환. 로딩 실패 시 (None, None)"""
+        meta = self._read_meta()
+        stale_reason = "스냅샷 없음" if meta is None else self._stale_reason(client, meta, http_io)
+        if stale_reason is None:
+            try:
+                orders = self._read_frame('orders')
+                activities_df = self._read_frame('sales_activities')
+            except (OSError, pa.ArrowException) as e:
+                stale_reason = f"스냅샷 읽기 실패 ({e})"
+
+        if stale_reason is not None:
+            print(f"📦 로컬 스냅샷 전체 갱신: {stale_reason}")
+            orders, activities_df = load_data_from_supabase(client, page_size, http_io=http_io)
+            if orders is None:
+                return None, None
+            watermarks = {'orders': orders.attrs['watermark'], 'sales_activities': activities_df.attrs['watermark']}
+            source_rows = {'orders': orders.attrs['source_rows'],
+                           'sales_activities': activities_df.attrs['source_rows']}
+            orders, activities_df = preprocess_data(orders, activities_df)
+            self.save(orders, activities_df, watermarks, source_rows)
+            return orders, activities_df
+
+        print(f"📦 로컬 스냅샷 사용: 주문 {len(orders)}건, 활동 {len(activities_df)}건 "
+              f"(워터마크 {meta['watermarks']})")
+        new_orders, new_activities = load_data_from_supabase(client, page_size, after=meta['watermarks'],
+                                                             http_io=http_io)
+        if new_orders is None:
+            return None, None
+        if new_orders.empty and new_activities.empty:
+            return orders, activities_df
+
+        watermarks = {'orders': new_orders.attrs['watermark'], 'sales_activities': new_activities.attrs['watermark']}
+        source_rows = {table: meta['source_rows'][table] + frame.attrs['source_rows']
+                       for table, frame in (('orders', new_orders), ('sales_activities', new_activities))}
+        new_orders, new_activities = preprocess_data(new_orders, new_activities)
+        orders = _append_rows(orders, new_orders)
+        activities_df = _append_rows(activities_df, new_activities)
+        orders, activities_df = _align_categories([orders, activities_df], 'CUSTOMER_ID')
+        self.save(orders, activities_df, watermarks, source_rows, created_at=meta['created_at'])
+        print(f"📦 스냅샷에 추가: 주문 {len(new_orders)}건, 활동 {len(new_activities)}건")
+        return orders, activities_df
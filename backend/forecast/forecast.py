@@ -1,19 +1,44 @@
+import time
+
+_MODULE_IMPORT_STARTED = time.perf_counter()  # 모듈 import 시간 측정 시작 (IMPORT_TIME_BUDGET_S 참고)
+
 import warnings
+import argparse
 import gc
 import sys
 import os
+import importlib
 import pandas as pd
 import numpy as np
-from tqdm.auto import tqdm
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
-from supabase import create_client, Client
-from prophet import Prophet
-from prophet.diagnostics import cross_validation, performance_metrics
-from sklearn.metrics import mean_absolute_percentage_error
-import pmdarima as pm
-from sklearn.linear_model import LogisticRegression
+from typing import TYPE_CHECKING
 import multiprocessing
+import json
+import itertools
+import hashlib
+import heapq
+import io
+import cProfile
+import pstats
+import threading
+import queue
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# prophet/pmdarima/sklearn/supabase/tqdm/httpx는 실제로 쓰는 함수 안에서 import한다 (지연 로딩).
+# 모듈 import만으로 수 초가 걸리지 않도록, --dry-run이나 B그룹/데이터 부족 고객만 있는 실행에서는 로딩되지 않는다.
+if TYPE_CHECKING:
+    from supabase import Client
+
+# 원천 데이터 로딩/스냅샷, 비동기 PostgREST 계층, 예측 저장소는 별도 모듈에 있고 여기서 다시 내보낸다.
+from data_loading import (SNAPSHOT_AVAILABLE, DataSnapshot, load_data_from_supabase, preprocess_data,
+                          _current_rss_mb, _peak_rss_mb)
+from postgrest_io import AsyncPostgrestIO
+from forecast_backends import (FORECAST_TABLE_NAME, AsyncPostgrestForecastBackend, SQLiteForecastBackend,
+                               SupabaseForecastBackend, is_missing_conflict_constraint)
 
 warnings.filterwarnings("ignore")
 
@@ -29,12 +54,78 @@ CV_HORIZON_D_PROPHET = 90  # 3개월
 FUTURE_COUNT_STRATEGY = 'mean'
 FUTURE_COUNT_WINDOW = 6
 ARIMA_TEST_PERIODS = 3
-FORECAST_TABLE_NAME = "customer_order_forecast"
+
+# --- Prophet 검증 방식 ---
+# 'cv': Prophet cross_validation (컷오프마다 재학습), 'holdout': ARIMA와 같은 마지막 ARIMA_TEST_PERIODS개월 홀드아웃
+PROPHET_VALIDATION = os.environ.get("PROPHET_VALIDATION", "cv")
+PROPHET_CV_PARALLEL = os.environ.get("PROPHET_CV_PARALLEL") or None  # None, 'threads', 'processes'
+PROPHET_CV_MAX_CUTOFFS = int(os.environ.get("PROPHET_CV_MAX_CUTOFFS", "0"))  # 0이면 제한 없음 (최근 컷오프부터 사용)
+
+# --- 1단계 기준 모델 (계절성 naive) ---
+# 홀드아웃 MAPE가 임계값 이하인 A그룹 고객은 Prophet/ARIMA 학습을 생략한다 (0 이하이면 사용 안 함).
+BASELINE_MAPE_THRESHOLD = float(os.environ.get("BASELINE_MAPE_THRESHOLD", "10"))
+BASELINE_MODEL_NAME = "Seasonal Naive"
+BASELINE_SEASON = 12
+
+# --- 로컬 데이터 스냅샷 (전처리된 orders/activities, Arrow IPC) ---
+# 기본은 끔: 기존 행의 값 수정은 다음 전체 갱신(FORECAST_SNAPSHOT_FULL_REFRESH_H) 전까지 스냅샷에 반영되지 않고,
+# 그동안 해당 고객은 입력 지문이 같아 증분 실행에서 건너뛰어진다.
+FORECAST_SNAPSHOT = os.environ.get("FORECAST_SNAPSHOT", "0") == "1"
+SNAPSHOT_DIR_NAME = "snapshot"
+
+# --- 비동기 HTTP I/O (PostgREST 직접 호출) ---
+FORECAST_ASYNC_IO = os.environ.get("FORECAST_ASYNC_IO", "0") == "1"
+FORECAST_WRITE_QUEUE_SIZE = 4  # 비동기 모드에서 저장 대기 중인 고객 묶음 최대 수 (가득 차면 예측 루프가 기다림)
+
+# --- 병렬 실행 설정 ---
+FORECAST_WORKERS = int(os.environ.get("FORECAST_WORKERS", "1"))  # 1 이하이면 직렬 실행
+FORECAST_TASK_TIMEOUT_S = float(os.environ.get("FORECAST_TASK_TIMEOUT_S", "900"))  # 고객 1명당 최대 실행 시간(초, 병렬 모드만)
+TASK_POLL_INTERVAL_S = 1.0  # 병렬 모드에서 작업 시작/완료를 확인하는 간격(초)
+
+# --- DB 일괄 저장 설정 ---
+FORECAST_WRITE_BATCH_CUSTOMERS = 50  # 기존 예측을 한 번에 조회할 고객 수
+FORECAST_UPSERT_CHUNK_SIZE = 500  # upsert 요청 1회당 최대 행 수
+FORECAST_READ_PAGE_SIZE = 1000  # 페이지 단위 조회 크기 (PostgREST 기본 max-rows)
+
+# --- 증분 예측 상태 저장 위치 (GitHub Actions에서는 actions/cache로 보존) ---
+FORECAST_STATE_DIR = os.environ.get("FORECAST_STATE_DIR",
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".forecast_state"))
+FINGERPRINT_FILE_NAME = "customer_fingerprints.json"
+CHECKPOINT_FILE_NAME = "checkpoint.jsonl"  # 실행 도중 저장 완료된 고객 (정상 종료 시 삭제)
+
+# --- 모델 캐시 (ARIMA 차수 / Prophet 파라미터) ---
+MODEL_CACHE_DIR_NAME = "model_cache"
+MODEL_CACHE_MAX_ENTRIES = 20000  # 초과 시 오래된 고객부터 제거
+MODEL_CACHE_MAX_AGE_DAYS = 90
+
+# --- 실행 지표/프로파일링 ---
+FORECAST_VERBOSE = os.environ.get("FORECAST_VERBOSE", "0") == "1"  # 고객별/행별 상세 출력
+FORECAST_METRICS_PATH = os.environ.get("FORECAST_METRICS_PATH") or None  # 지정 시 실행 지표 파일 저장
+FORECAST_METRICS_FORMAT = os.environ.get("FORECAST_METRICS_FORMAT", "jsonl")  # 'jsonl' 또는 'prom'
+FORECAST_PROFILE_TOP_N = int(os.environ.get("FORECAST_PROFILE_TOP_N", "0"))  # 가장 느린 N명의 cProfile 결과 저장
+PROFILE_DIR_NAME = "profiles"
+PROFILE_STATS_LINES = 40
+SLOWEST_CUSTOMERS_REPORTED = 5
+
+# --- 메모리 상한 모드 ---
+FORECAST_MEMORY_LIMIT_MB = int(os.environ.get("FORECAST_MEMORY_LIMIT_MB", "0"))  # 0이면 끔
+MEMORY_BOUNDED_IN_FLIGHT_PER_WORKER = 2  # 메모리 상한 모드에서 워커당 미리 넘겨 두는 고객 수
+MEMORY_BOUNDED_TASKS_PER_CHILD = 25  # 메모리 상한 모드에서 워커 프로세스를 새로 띄우는 주기 (Stan/Prophet 누수 회수)
+# 상한을 넘은 상태에서는 직전 회수 이후 RSS가 이만큼(MB) 더 늘어야 다시 회수한다 (매 고객 flush/GC 방지)
+MEMORY_RECLAIM_GROWTH_MB = float(os.environ.get("FORECAST_MEMORY_RECLAIM_GROWTH_MB", "64"))
+MEMORY_RESUME_RATIO = 0.9  # RSS가 상한의 이 비율 아래로 내려오면 회수 조건을 초기화하고 동시 작업 수를 하나씩 복구
+
+# --- import 시간 예산 / 실행 계획(--dry-run) ---
+IMPORT_TIME_BUDGET_S = float(os.environ.get("FORECAST_IMPORT_BUDGET_S", "1.5"))  # 모델링 라이브러리 제외 모듈 import 예산
+MODELING_MODULES = ('prophet', 'prophet.diagnostics', 'pmdarima', 'sklearn.metrics')  # A그룹 학습 시에만 로딩
+PLAN_SECONDS_PER_CUSTOMER = float(os.environ.get("FORECAST_PLAN_SECONDS_PER_CUSTOMER", "5"))  # 정밀 예측 1명당 예상 소요(초)
 
 
 # --- 데이터베이스 헬퍼 함수 ---
 def create_supabase_client():
     try:
+        from supabase import create_client
+
         client = create_client(SUPABASE_URL, SUPABASE_KEY)
         print("✅ Supabase 클라이언트가 성공적으로 생성되었습니다.")
         return client
@@ -43,120 +134,277 @@ def create_supabase_client():
         return None
 
 
-def load_data_from_supabase(client: Client):
-    try:
-        print("🚚 Supabase에서 데이터 로딩 중...")
-        orders_response = client.table('orders').select(
-            'CONTACT_ID, ORDER_DATE, AMOUNT, contacts!inner(CUSTOMER_ID)'
-        ).execute()
-        activities_response = client.table('sales_activities').select(
-            'CUSTOMER_ID, ACTIVITY_DATE, ACTIVITY_TYPE, OUTCOME'
-        ).execute()
-        orders_data = [
-            {'CONTACT_ID': item['CONTACT_ID'], 'ORDER_DATE': item['ORDER_DATE'], 'AMOUNT': item['AMOUNT'],
-             'CUSTOMER_ID': item['contacts']['CUSTOMER_ID'] if item.get('contacts') else None}
-            for item in orders_response.data
-        ]
-        orders_df = pd.DataFrame(orders_data).dropna(subset=['CUSTOMER_ID'])
-        activities_df = pd.DataFrame(activities_response.data)
-        print(f"✅ 로드 완료: {len(orders_df)}개의 주문, {len(activities_df)}개의 활동.")
-        return orders_df, activities_df
-    except Exception as e:
-        print(f"🔥 Supabase 데이터 로딩 오류: {e}")
-        return None, None
-
-
-def preprocess_data(orders_df, activities_df):
-    orders_df.rename(columns={"ORDER_DATE": "ORDERED_AT", "AMOUNT": "SALES_AMOUNT"}, inplace=True)
-    orders_df["ORDERED_AT"] = pd.to_datetime(orders_df["ORDERED_AT"])
-    orders_df["MONTH_TS"] = orders_df["ORDERED_AT"].dt.to_period("M").dt.to_timestamp()
-    activities_df.rename(columns={"ACTIVITY_DATE": "CONTACTED_AT"}, inplace=True)
-    activities_df["CONTACTED_AT"] = pd.to_datetime(activities_df["CONTACTED_AT"])
-    activities_df["MONTH_TS"] = activities_df["CONTACTED_AT"].dt.to_period("M").dt.to_timestamp()
-    return orders_df, activities_df
-
+def _vprint(*args, **kwargs):
+    """FORECAST_VERBOSE일 때만 출력 (고객별/행별 상세 로그)"""
+    if FORECAST_VERBOSE:
+        print(*args, **kwargs)
 
-def update_or_insert_forecasts_db(client: Client, customer_id, forecast_df_to_save, table_name, current_run_datetime):
-    """첫 번째 코드와 동일한 DB 저장 로직 + PROBABILITY 컬럼 추가"""
-    forecast_df_to_save['PREDICTED_DATE_ISO'] = pd.to_datetime(forecast_df_to_save['PREDICTED_DATE']).dt.strftime(
-        '%Y-%m-%d')
-    min_pred_date = forecast_df_to_save['PREDICTED_DATE_ISO'].min()
-    max_pred_date = forecast_df_to_save['PREDICTED_DATE_ISO'].max()
-
-    old_forecasts_df = pd.DataFrame(columns=['PREDICTED_DATE', 'MAPE'])
 
+@contextmanager
+def _timed_stage(stage_seconds, name):
+    """with 블록의 소요 시간(초)을 stage_seconds[name]에 누적"""
+    started = time.perf_counter()
     try:
-        print(f"Supabase에서 고객 ID {customer_id}의 기존 예측 데이터 조회 중...")
-        response = client.table(table_name).select('PREDICTED_DATE, MAPE').eq('CUSTOMER_ID', customer_id).gte(
-            'PREDICTED_DATE', min_pred_date).lte('PREDICTED_DATE', max_pred_date).execute()
-
-        if not response.data:
-            print(f"Supabase에서 고객 ID {customer_id}의 기존 예측 데이터가 없습니다.")
+        yield
+    finally:
+        stage_seconds[name] = stage_seconds.get(name, 0.0) + time.perf_counter() - started
+
+
+# --- 예측 결과 저장 (일괄 upsert) ---
+# 실패/이벤트 케이스는 MAPE 비교 없이 기존 데이터를 덮어쓴다 (Event-Driven 추가)
+FAILURE_MODEL_NAMES = ("Data Insufficient", "Prediction Failed", "Event-Driven (Logistic)")
+
+
+def decide_forecast_operation(new_model_name, new_mape, has_existing, old_mape):
+    """기존 예측과 비교해 (작업, 이유)를 결정. 작업은 'INSERT', 'UPDATE' 또는 None(작업 없음)"""
+    if not has_existing:
+        return 'INSERT', "기존 예측 없음"
+    if new_model_name in FAILURE_MODEL_NAMES:
+        return 'UPDATE', f"'{new_model_name}' 상태이므로 기존 데이터를 덮어쓰기"
+    # 성공적인 예측의 경우에만 MAPE를 비교
+    if pd.isna(old_mape):
+        return 'UPDATE', "기존 MAPE 없음"
+    if new_mape is not None and new_mape < old_mape:
+        return 'UPDATE', f"성능 향상 (기존 MAPE: {old_mape:.2f}% -> 새 MAPE: {new_mape:.2f}%)"
+    return None, f"성능 저하/동일 (기존 MAPE: {old_mape:.2f}% (또는 None), 새 MAPE: {new_mape})->업데이트 안함"
+
+
+def _forecast_key(customer_id, predicted_date):
+    """(CUSTOMER_ID, 'YYYY-MM-DD') 형태의 비교용 키"""
+    return int(customer_id), str(predicted_date)[:10]
+
+
+def _optional_float(value):
+    return float(value) if pd.notna(value) else None
+
+
+def prefetch_existing_forecasts(backend, min_date, max_date, page_size=FORECAST_READ_PAGE_SIZE):
+    """예측 기간 전체의 기존 예측을 페이지 단위로 한 번에 읽어 {(CUSTOMER_ID, 'YYYY-MM-DD'): MAPE} 로 반환
+
+    서버 max-rows 제한으로 페이지가 page_size보다 짧게 올 수 있으므로 빈 페이지가 올 때까지 읽는다.
+    """
+    print(f"🔎 기존 예측 데이터 일괄 조회 중 ({min_date} ~ {max_date})...")
+    existing, offset = {}, 0
+    while True:
+        page = backend.fetch_existing_page(min_date, max_date, offset, page_size)
+        if not page:
+            break
+        for r in page:
+            existing[_forecast_key(r['CUSTOMER_ID'], r['PREDICTED_DATE'])] = pd.to_numeric(r.get('MAPE'),
+                                                                                         errors='coerce')
+        offset += len(page)
+    print(f"✅ 기존 예측 {len(existing)}건 조회 완료.")
+    return existing
+
+
+class ForecastBulkWriter:
+    """여러 고객의 예측을 batch_customers명씩 모아 기존 예측 조회, decide_forecast_operation() 판단, 청크 upsert를
+    한 번에 수행 (queue_size > 0이면 별도 저장 스레드에서)"""
+
+    def __init__(self, backend, current_run_datetime, batch_customers=FORECAST_WRITE_BATCH_CUSTOMERS,
+                 chunk_size=FORECAST_UPSERT_CHUNK_SIZE, existing=None, existing_range=None, on_flush=None,
+                 queue_size=0):
+        self.backend = backend
+        self.current_run_datetime = current_run_datetime
+        self.batch_customers = batch_customers
+        self.chunk_size = chunk_size
+        self.existing = existing
+        self.existing_range = existing_range
+        self.on_flush = on_flush
+        self._pending = []
+        self.stats = {'customers': 0, 'INSERT': 0, 'UPDATE': 0, 'SKIP': 0, 'failed_rows': 0, 'seconds': 0.0,
+                      'read_seconds': 0.0, 'upsert_seconds': 0.0}
+        self.failed_customers = set()
+        self.upsert_supported = True
+        self._queue = None
+        if queue_size > 0:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(target=self._drain_queue, name='forecast-writer', daemon=True)
+            self._thread.start()
+
+    def add(self, customer_id, forecast_df_to_save):
+        self._pending.append((customer_id, forecast_df_to_save))
+        if len(self._pending) >= self.batch_customers:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        if self._queue is not None:
+            self._queue.put(pending)
         else:
-            old_forecasts_df = pd.DataFrame(response.data)
-            if 'PREDICTED_DATE' in old_forecasts_df.columns:
-                old_forecasts_df['PREDICTED_DATE'] = pd.to_datetime(old_forecasts_df['PREDICTED_DATE'])
-            if 'MAPE' in old_forecasts_df.columns:
-                old_forecasts_df['MAPE'] = pd.to_numeric(old_forecasts_df['MAPE'], errors='coerce')
-            else:
-                old_forecasts_df['MAPE'] = np.nan
-
-    except Exception as e:
-        print(f"!!! Supabase 기존 예측 데이터 조회 중 예상치 못한 오류 발생 (고객 ID: {customer_id}): {e}")
-        old_forecasts_df = pd.DataFrame(columns=['PREDICTED_DATE', 'MAPE'])
-
-    print(f"\n[DB 작업 결정] 고객 ID: {customer_id}...")
-    for _, new_row in forecast_df_to_save.iterrows():
-        new_pred_date_dt = new_row['PREDICTED_DATE']
-        new_mape = new_row['MAPE'] if pd.notna(new_row['MAPE']) else None
-        new_model_name = new_row['PREDICTION_MODEL']
+            self._flush_batch(pending)
+
+    def _drain_queue(self):
+        while True:
+            pending = self._queue.get()
+            if pending is None:
+                return
+            try:
+                self._flush_batch(pending)
+            except Exception as e:
+                print(f"!!! 예측 데이터 저장 스레드 오류 (고객 {len(pending)}명 저장 실패): {e}")
+                self.stats['failed_rows'] += sum(len(df) for _, df in pending)
+                self.failed_customers.update(int(customer_id) for customer_id, _ in pending)
+
+    def _flush_batch(self, pending):
+        started = time.perf_counter()
+        try:
+            self._flush_pending(pending)
+        finally:
+            self.stats['seconds'] += time.perf_counter() - started
+
+    def _flush_pending(self, pending):
+        failed_before = set(self.failed_customers)
+        self._write_pending(pending)
+        if self.on_flush is not None:
+            newly_failed = self.failed_customers - failed_before
+            self.on_flush([int(customer_id) for customer_id, _ in pending if int(customer_id) not in newly_failed])
+
+    def _write_pending(self, pending):
+        existing = self._existing_for(pending)
+        if existing is None:
+            self.stats['failed_rows'] += sum(len(df) for _, df in pending)
+            self.failed_customers.update(int(customer_id) for customer_id, _ in pending)
+            return
+
+        rows, operations = [], []
+        generation_datetime = self.current_run_datetime.isoformat()
+        for customer_id, forecast_df in pending:
+            _vprint(f"\n[DB 작업 결정] 고객 ID: {customer_id}...")
+            for new_row in forecast_df.to_dict('records'):
+                pred_date = pd.Timestamp(new_row['PREDICTED_DATE']).strftime('%Y-%m-%d')
+                new_mape = _optional_float(new_row['MAPE'])
+                new_model_name = new_row['PREDICTION_MODEL']
+                key = _forecast_key(customer_id, pred_date)
+                operation, reason = decide_forecast_operation(new_model_name, new_mape, key in existing,
+                                                              existing.get(key))
+                _vprint(f"  - 날짜: {pred_date}, 결정: {operation or '작업 없음'}, 이유: {reason}")
+                self.stats[operation or 'SKIP'] += 1
+                if operation is None:
+                    continue
+                rows.append({
+                    'CUSTOMER_ID': int(customer_id),
+                    'PREDICTED_DATE': pred_date,
+                    'PREDICTED_QUANTITY': _optional_float(new_row['PREDICTED_QUANTITY']),
+                    'MAPE': new_mape,
+                    'PREDICTION_MODEL': new_model_name,
+                    'PROBABILITY': _optional_float(new_row.get('PROBABILITY')),
+                    'FORECAST_GENERATION_DATETIME': generation_datetime
+                })
+                operations.append(operation)
+        self.stats['customers'] += len(pending)
+
+        starts = range(0, len(rows), self.chunk_size)
+        chunks = [rows[start:start + self.chunk_size] for start in starts]
+        chunk_operations = [operations[start:start + self.chunk_size] for start in starts]
+        for chunk, error in zip(chunks, self._upsert_chunks(chunks, chunk_operations)):
+            if error is not None:
+                print(f"!!! 예측 데이터 일괄 upsert 실패 ({len(chunk)}행): {error}")
+                self.stats['failed_rows'] += len(chunk)
+                self.failed_customers.update(row['CUSTOMER_ID'] for row in chunk)
+                continue
+            if self.existing is not None:
+                for row in chunk:
+                    self.existing[_forecast_key(row['CUSTOMER_ID'], row['PREDICTED_DATE'])] = _optional_float(
+                        row['MAPE'])
+
+    def _upsert_chunks(self, chunks, chunk_operations):
+        """청크별 저장 결과(None 또는 예외) 목록. 테이블에 유니크 제약이 없으면(42P10) INSERT/UPDATE로 나눠 저장"""
+        if not chunks:
+            return []
+        with _timed_stage(self.stats, 'upsert_seconds'):
+            if not self.upsert_supported:
+                return [self._write_rows(chunk, ops) for chunk, ops in zip(chunks, chunk_operations)]
+            errors = self._try_upsert(chunks)
+            if any(is_missing_conflict_constraint(error) for error in errors):
+                print("⚠️ 예측 테이블에 (CUSTOMER_ID, PREDICTED_DATE) 유니크 제약이 없어 INSERT/UPDATE로 나눠 저장합니다.")
+                self.upsert_supported = False
+                errors = [self._write_rows(chunk, ops) if is_missing_conflict_constraint(error) else error
+                          for chunk, ops, error in zip(chunks, chunk_operations, errors)]
+            return errors
+
+    def _try_upsert(self, chunks):
+        if hasattr(self.backend, 'upsert_many'):
+            try:
+                return self.backend.upsert_many(chunks)
+            except Exception as e:
+                return [e] * len(chunks)
+        errors = []
+        for chunk in chunks:
+            try:
+                self.backend.upsert(chunk)
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+                if is_missing_conflict_constraint(e):  # 남은 청크도 같은 이유로 실패하므로 바로 나눠 저장한다
+                    return errors + [e] * (len(chunks) - len(errors))
+        return errors
+
+    def _write_rows(self, chunk, operations):
+        """decide_forecast_operation() 결과대로 INSERT 행은 한 번에 추가하고 UPDATE 행은 키별로 갱신"""
+        inserts = [row for row, operation in zip(chunk, operations) if operation == 'INSERT']
+        updates = [row for row, operation in zip(chunk, operations) if operation == 'UPDATE']
+        try:
+            if inserts:
+                self.backend.insert(inserts)
+            if updates:
+                self.backend.update(updates)
+        except Exception as e:
+            return e
+        return None
 
-        existing_record = old_forecasts_df[old_forecasts_df['PREDICTED_DATE'] == new_pred_date_dt]
-        operation, reason = None, "조건 불충족"
+    def _existing_for(self, pending):
+        pred_dates = pd.concat([pd.to_datetime(df['PREDICTED_DATE']) for _, df in pending])
+        min_pred_date, max_pred_date = pred_dates.min().strftime('%Y-%m-%d'), pred_dates.max().strftime('%Y-%m-%d')
+        if self.existing is not None and self.existing_range is not None and \
+                self.existing_range[0] <= min_pred_date and max_pred_date <= self.existing_range[1]:
+            return self.existing
+        fetched = self._fetch_batch_existing(pending, min_pred_date, max_pred_date)
+        if fetched is None or self.existing is None:
+            return fetched
+        self.existing.update(fetched)
+        return self.existing
+
+    def _fetch_batch_existing(self, pending, min_pred_date, max_pred_date):
+        customer_ids = [customer_id for customer_id, _ in pending]
+        try:
+            with _timed_stage(self.stats, 'read_seconds'):
+                rows = self.backend.fetch_existing(customer_ids, min_pred_date, max_pred_date)
+            return {_forecast_key(r['CUSTOMER_ID'], r['PREDICTED_DATE']): pd.to_numeric(r.get('MAPE'),
+                                                                                      errors='coerce')
+                    for r in rows}
+        except Exception as e:
+            # 기존 MAPE를 모르는 상태로 upsert하면 더 좋은 예측을 덮어쓸 수 있으므로 이번 묶음은 건너뛴다.
+            print(f"!!! 기존 예측 데이터 일괄 조회 실패 (고객 {len(customer_ids)}명 저장 건너뜀): {e}")
+            return None
 
-        # 실패 케이스 정의 (Event-Driven 추가)
-        is_failure_case = new_model_name in ["Data Insufficient", "Prediction Failed", "Event-Driven (Logistic)"]
+    def close(self):
+        self.flush()
+        if self._queue is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._queue = None
+        print(f"💾 DB 저장 요약: 고객 {self.stats['customers']}명, INSERT {self.stats['INSERT']}건, "
+              f"UPDATE {self.stats['UPDATE']}건, 유지 {self.stats['SKIP']}건, 실패 {self.stats['failed_rows']}건, "
+              f"요청 {getattr(self.backend, 'request_count', '?')}회")
 
-        if existing_record.empty:
-            operation, reason = 'INSERT', "기존 예측 없음"
-        elif is_failure_case:
-            operation, reason = 'UPDATE', f"'{new_model_name}' 상태이므로 기존 데이터를 덮어쓰기"
-        else:
-            # 성공적인 예측의 경우에만 MAPE를 비교
-            old_mape = existing_record.iloc[0]['MAPE']
-            if pd.isna(old_mape):
-                operation, reason = 'UPDATE', "기존 MAPE 없음"
-            elif new_mape is not None and old_mape is not None and new_mape < old_mape:
-                operation, reason = 'UPDATE', f"성능 향상 (기존 MAPE: {old_mape:.2f}% -> 새 MAPE: {new_mape:.2f}%)"
-            else:
-                reason = f"성능 저하/동일 (기존 MAPE: {old_mape:.2f}% (또는 None), 새 MAPE: {new_mape})->업데이트 안함"
-
-        print(f"  - 날짜: {new_pred_date_dt.strftime('%Y-%m-%d')}, 결정: {operation or '작업 없음'}, 이유: {reason}")
-
-        # 첫 번째 코드와 동일한 DB payload 구조 + PROBABILITY 추가
-        db_payload = {
-            'CUSTOMER_ID': int(customer_id),
-            'PREDICTED_DATE': new_pred_date_dt.strftime('%Y-%m-%d'),
-            'PREDICTED_QUANTITY': new_row['PREDICTED_QUANTITY'],
-            'MAPE': new_mape,
-            'PREDICTION_MODEL': new_model_name,
-            'PROBABILITY': new_row.get('PROBABILITY'),  # 확률 값 추가
-            'FORECAST_GENERATION_DATETIME': current_run_datetime.isoformat()
-        }
 
-        try:
-            if operation == 'INSERT':
-                client.table(table_name).insert(db_payload).execute()
-            elif operation == 'UPDATE':
-                client.table(table_name).update(db_payload).eq('CUSTOMER_ID', customer_id).eq('PREDICTED_DATE',
-                                                                                              new_pred_date_dt.strftime(
-                                                                                                  '%Y-%m-%d')).execute()
-        except Exception as e:
-            print(
-                f"!!! Supabase {operation} 작업 실패 (고객 ID: {customer_id}, 날짜: {new_pred_date_dt.strftime('%Y-%m-%d')}): {e}")
+def update_or_insert_forecasts_db(client: "Client", customer_id, forecast_df_to_save, table_name, current_run_datetime):
+    """단일 고객 저장 (호환용). 파이프라인은 ForecastBulkWriter로 여러 고객을 묶어서 저장한다."""
+    writer = ForecastBulkWriter(SupabaseForecastBackend(client, table_name), current_run_datetime)
+    writer.add(customer_id, forecast_df_to_save)
+    writer.flush()
 
 
 def create_event_features(orders, activities):
+    """B그룹 이벤트 모델 학습 데이터 (고객 x 월 격자) 생성
+
+    격자 전체를 (고객 수, 월 수) 2차원 배열로 계산한다. 최근 6개월 핵심 활동 수는 누적합 차이로,
+    마지막 대량 주문 이후 개월 수는 월 번호 차이로, TARGET(향후 6개월 내 대량 주문)은 슬라이딩 최대값으로 구한다.
+    값은 기존 merge/rolling 방식과 같고, 열은 float32/int16으로 저장해 메모리를 줄인다.
+    """
     print("📊 B그룹용 이벤트 예측 모델의 학습 데이터 생성 중...")
     if orders.empty:
         print("⚠️ 주문 데이터가 없어 학습 데이터를 생성할 수 없습니다.")
@@ -169,32 +417,48 @@ def create_event_features(orders, activities):
     activities['IS_KEY_ACTIVITY'] = activities['ACTIVITY_TYPE'].str.contains('|'.join(keywords), na=False)
 
     all_months = pd.date_range(start=orders['MONTH_TS'].min(), end=pd.to_datetime(date.today()), freq='MS')
-    all_customers = orders['CUSTOMER_ID'].unique()
-    training_df = pd.MultiIndex.from_product([all_customers, all_months], names=['CUSTOMER_ID', 'MONTH_TS']).to_frame(
-        index=False)
-
-    key_activities_monthly = activities[activities['IS_KEY_ACTIVITY']].groupby(
-        ['CUSTOMER_ID', 'MONTH_TS']).size().reset_index(name='KEY_ACTIVITY_COUNT')
-    training_df = pd.merge(training_df, key_activities_monthly, on=['CUSTOMER_ID', 'MONTH_TS'], how='left').fillna(0)
-    training_df['KEY_ACTIVITY_LAST_6M'] = training_df.groupby('CUSTOMER_ID')['KEY_ACTIVITY_COUNT'].transform(
-        lambda x: x.rolling(6, min_periods=1).sum())
-
+    all_customers = pd.Index(orders['CUSTOMER_ID'].unique())
+    n_customers, n_months = len(all_customers), len(all_months)
+    first_month_no = all_months[0].year * 12 + all_months[0].month
+
+    def grid_counts(df):
+        """(고객, 월)별 행 수를 격자 배열로 집계 (격자 밖의 고객/월은 무시)"""
+        cust_idx = all_customers.get_indexer(np.asarray(df['CUSTOMER_ID']))
+        month_idx = (df['MONTH_TS'].dt.year * 12 + df['MONTH_TS'].dt.month).to_numpy() - first_month_no
+        valid = (cust_idx >= 0) & (month_idx >= 0) & (month_idx < n_months)
+        flat = cust_idx[valid] * n_months + month_idx[valid].astype(np.int64)
+        return np.bincount(flat, minlength=n_customers * n_months).reshape(n_customers, n_months)
+
+    # 최근 6개월(현재 월 포함) 핵심 활동 수: 누적합 차이
+    key_activity_count = grid_counts(activities[activities['IS_KEY_ACTIVITY']])
+    cumulative = np.cumsum(key_activity_count, axis=1)
+    key_activity_last_6m = cumulative.copy()
+    key_activity_last_6m[:, 6:] -= cumulative[:, :-6]
+
+    # 마지막 대량 주문 이후 개월 수 (대량 주문이 없으면 120, 음수는 0)
     large_orders = orders[orders['IS_LARGE_ORDER']]
-    last_large_order_month = large_orders.groupby('CUSTOMER_ID')['MONTH_TS'].max().reset_index().rename(
-        columns={'MONTH_TS': 'LAST_LARGE_ORDER_TS'})
-    training_df = pd.merge(training_df, last_large_order_month, on='CUSTOMER_ID', how='left')
-
-    training_df['MONTHS_SINCE_LAST_LARGE'] = (
-                (training_df['MONTH_TS'].dt.year - training_df['LAST_LARGE_ORDER_TS'].dt.year) * 12 +
-                (training_df['MONTH_TS'].dt.month - training_df['LAST_LARGE_ORDER_TS'].dt.month))
-    training_df['MONTHS_SINCE_LAST_LARGE'] = training_df.groupby('CUSTOMER_ID')[
-        'MONTHS_SINCE_LAST_LARGE'].ffill().fillna(120).clip(lower=0)
-
-    large_order_monthly = large_orders.groupby(['CUSTOMER_ID', 'MONTH_TS']).size().reset_index(name='HAS_LARGE_ORDER')
-    training_df = pd.merge(training_df, large_order_monthly[['CUSTOMER_ID', 'MONTH_TS', 'HAS_LARGE_ORDER']],
-                           on=['CUSTOMER_ID', 'MONTH_TS'], how='left').fillna(0)
-    training_df['TARGET'] = training_df.groupby('CUSTOMER_ID')['HAS_LARGE_ORDER'].transform(
-        lambda x: x.rolling(6, min_periods=1).max().shift(-6)).fillna(0)
+    last_large_month_no = (large_orders['MONTH_TS'].dt.year * 12 + large_orders['MONTH_TS'].dt.month).groupby(
+        np.asarray(large_orders['CUSTOMER_ID'])).max()
+    last_large = last_large_month_no.reindex(all_customers).to_numpy(dtype=np.float64)
+    grid_month_no = first_month_no + np.arange(n_months)
+    months_since_last_large = np.where(np.isnan(last_large)[:, None], 120,
+                                       grid_month_no[None, :] - np.nan_to_num(last_large)[:, None]).clip(min=0)
+
+    # TARGET: 다음 달부터 6개월 동안의 월별 대량 주문 수 최대값 (6개월을 다 볼 수 없는 마지막 구간은 0)
+    has_large_order = grid_counts(large_orders)
+    target = np.zeros_like(has_large_order)
+    if n_months > 6:
+        target[:, :n_months - 6] = sliding_window_view(has_large_order, 6, axis=1)[:, 1:].max(axis=2)
+
+    training_df = pd.DataFrame({
+        'CUSTOMER_ID': all_customers.take(np.repeat(np.arange(n_customers), n_months)),
+        'MONTH_TS': np.tile(all_months.to_numpy(), n_customers),
+        'KEY_ACTIVITY_COUNT': key_activity_count.ravel().astype(np.float32),
+        'KEY_ACTIVITY_LAST_6M': key_activity_last_6m.ravel().astype(np.float32),
+        'MONTHS_SINCE_LAST_LARGE': months_since_last_large.ravel().astype(np.int16),
+        'HAS_LARGE_ORDER': has_large_order.ravel().astype(np.int16),
+        'TARGET': target.ravel().astype(np.int16),
+    })
 
     features = ['KEY_ACTIVITY_LAST_6M', 'MONTHS_SINCE_LAST_LARGE']
     X = training_df[features]
@@ -205,6 +469,8 @@ def create_event_features(orders, activities):
 
 
 def train_event_model(X, y):
+    from sklearn.linear_model import LogisticRegression
+
     print("🧠 B그룹용 이벤트 예측 모델 학습 중...")
     model = LogisticRegression(class_weight='balanced', random_state=42)
     model.fit(X, y)
@@ -212,43 +478,158 @@ def train_event_model(X, y):
     return model
 
 
-# --- 메인 파이프라인 ---
-def run_monthly_forecast_pipeline():
-    supabase = create_supabase_client()
-    if not supabase: return
+# --- 증분 예측: 고객별 데이터 지문 ---
+def _hash_rows_by_customer(df, customer_ids, value_columns):
+    """고객별로 행 해시를 합산한 값 (행 순서와 무관한 데이터 지문)"""
+    row_hash = pd.util.hash_pandas_object(df[value_columns], index=False)
+    return row_hash.groupby(customer_ids.to_numpy()).sum()
+
+
+def compute_customer_fingerprints(orders, activities_df, horizon_start, config_key):
+    """고객별 지문 {고객 ID: dict} 계산. 값이 이전 실행과 같으면 모델을 다시 학습할 필요가 없다.
+
+    마지막 주문/활동 시각, 월별 매출 시계열과 월별 활동 구성의 해시, 예측 시작 월, 설정 키를 포함한다.
+    예측 시작 월이 바뀌면 예측 구간 자체가 달라지므로 모든 고객이 다시 학습 대상이 된다.
+    """
+    monthly_sales = orders.groupby(['CUSTOMER_ID', 'MONTH_TS'], observed=True)['SALES_AMOUNT'].sum().reset_index()
+    sales_hash = _hash_rows_by_customer(monthly_sales, monthly_sales['CUSTOMER_ID'], ['MONTH_TS', 'SALES_AMOUNT'])
+    last_order = orders.groupby('CUSTOMER_ID', observed=True)['ORDERED_AT'].max()
+
+    activity_keys = [col for col in ['CUSTOMER_ID', 'MONTH_TS', 'ACTIVITY_TYPE', 'OUTCOME'] if
+                     col in activities_df.columns]
+    if activities_df.empty:
+        activity_hash, last_activity = pd.Series(dtype=np.uint64), pd.Series(dtype='datetime64[ns]')
+    else:
+        monthly_activities = activities_df.groupby(activity_keys, observed=True, dropna=False).size().reset_index(
+            name='COUNT')
+        activity_hash = _hash_rows_by_customer(monthly_activities, monthly_activities['CUSTOMER_ID'],
+                                               activity_keys[1:] + ['COUNT'])
+        last_activity = activities_df.groupby('CUSTOMER_ID', observed=True)['CONTACTED_AT'].max()
+
+    horizon = horizon_start.strftime('%Y-%m')
+    fingerprints = {}
+    for cust_id in last_order.index:
+        fingerprints[int(cust_id)] = {
+            'last_order': last_order[cust_id].isoformat(),
+            'last_activity': last_activity[cust_id].isoformat() if cust_id in last_activity.index else None,
+            'series_hash': f"{int(sales_hash.get(cust_id, 0)):016x}{int(activity_hash.get(cust_id, 0)):016x}",
+            'horizon': horizon,
+            'config': config_key,
+        }
+    return fingerprints
 
-    orders, activities_df = load_data_from_supabase(supabase)
-    if orders is None or orders.empty:
-        print("주문 데이터가 없어 파이프라인을 종료합니다.")
-        return
 
-    orders, activities_df = preprocess_data(orders, activities_df)
-    forecast_generation_datetime = datetime.now()
-    future_start_date = pd.to_datetime(date.today()).to_period("M").to_timestamp()
-    future_dates_fixed = pd.date_range(start=future_start_date, periods=BASE_FUTURE, freq="MS")
+def forecast_config_key(potential_regressors, baseline_mape_threshold=BASELINE_MAPE_THRESHOLD,
+                        prophet_validation=None):
+    """모델 입력/설정이 바뀌면 달라지는 키 (바뀌면 전체 재학습)
 
-    # --- 1. 이벤트 예측 모델 학습 ---
-    X_train, y_train, training_df_full = create_event_features(orders, activities_df)
-    event_model = train_event_model(X_train, y_train)
+    계절성 naive 임계값과 Prophet 검증 방식(strategy, max_cutoffs)도 선택 모델/MAPE를 바꾸므로 포함한다.
+    병렬 방식(parallel)은 결과에 영향이 없어 제외한다.
+    """
+    prophet_validation = prophet_validation or {'strategy': PROPHET_VALIDATION, 'max_cutoffs': PROPHET_CV_MAX_CUTOFFS}
+    config = [MIN_MONTHS, BASE_FUTURE, CV_PERIOD_D_PROPHET, CV_HORIZON_D_PROPHET, FUTURE_COUNT_WINDOW,
+              ARIMA_TEST_PERIODS, BASELINE_SEASON, float(baseline_mape_threshold),
+              prophet_validation.get('strategy', 'cv'), int(prophet_validation.get('max_cutoffs') or 0)
+              ] + sorted(potential_regressors)
+    return hashlib.sha1(json.dumps(config, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
 
-    # --- 2. B그룹(특별 관리) 분류 ---
-    print("\n📊 '특별 관리 고객(B그룹)' 분류 중...")
-    customer_first_order = orders.groupby('CUSTOMER_ID')['MONTH_TS'].min()
-    customer_active_months = orders.groupby('CUSTOMER_ID')['MONTH_TS'].nunique()
-    current_month_period = pd.to_datetime(date.today()).to_period('M')
-    total_lifespan_months = ((current_month_period.year - customer_first_order.dt.year) * 12 + (
-                current_month_period.month - customer_first_order.dt.month) + 1).fillna(0)
-    total_lifespan_months[total_lifespan_months <= 0] = 1
-    active_ratio = (customer_active_months / total_lifespan_months).fillna(0)
-    INACTIVITY_RATIO_THRESHOLD = 0.90
-    group_b_customer_ids = set(active_ratio[active_ratio <= (1 - INACTIVITY_RATIO_THRESHOLD)].index)
-    print(f"✅ 분류 완료: 총 {len(group_b_customer_ids)}명의 고객이 특별 관리 그룹(B그룹)으로 분류되었습니다.")
 
-    # B그룹 고객의 과거 대량 주문 평균액 계산
-    large_order_threshold = orders['SALES_AMOUNT'].quantile(0.75)
-    avg_large_order_amount = orders[orders['SALES_AMOUNT'] >= large_order_threshold].groupby('CUSTOMER_ID')[
-        'SALES_AMOUNT'].mean()
+def load_fingerprints(state_dir=FORECAST_STATE_DIR, file_name=FINGERPRINT_FILE_NAME):
+    path = os.path.join(state_dir, file_name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return {int(k): v for k, v in json.load(f).items()}
+    except (OSError, ValueError) as e:
+        print(f"!!! 고객 지문 파일을 읽을 수 없어 전체 재학습합니다 ({path}): {e}")
+        return {}
+
+
+def save_fingerprints(fingerprints, state_dir=FORECAST_STATE_DIR, file_name=FINGERPRINT_FILE_NAME):
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, file_name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({str(k): v for k, v in fingerprints.items()}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# --- 샤딩 / 재시작 체크포인트 ---
+def parse_shard(spec):
+    """'i/N' 형식의 샤드 지정(0 <= i < N)을 (i, N)으로 변환"""
+    try:
+        index, count = (int(part) for part in str(spec).split('/'))
+    except ValueError:
+        raise ValueError(f"샤드 지정 형식은 'i/N'이어야 합니다: {spec}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"샤드 번호는 0 이상 {count - 1} 이하여야 합니다: {spec}")
+    return index, count
+
+
+def customer_shard(customer_id, shard_count):
+    """CUSTOMER_ID의 안정적인 해시로 샤드 번호 계산 (실행/프로세스가 달라도 항상 같은 값)"""
+    digest = hashlib.md5(str(int(customer_id)).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+def shard_file_name(file_name, shard):
+    """샤드별 상태 파일 이름 (샤드가 1개면 원래 이름 그대로)"""
+    index, count = shard
+    if count == 1:
+        return file_name
+    stem, ext = os.path.splitext(file_name)
+    return f"{stem}.shard-{index}-of-{count}{ext}"
+
+
+class RunCheckpoint:
+    """실행 도중 DB 저장까지 끝난 고객과 그 지문을 한 줄씩 덧붙여 기록하는 체크포인트
+
+    실행이 중간에 멈추면 다음 실행은 지문이 그대로인 기록된 고객을 다시 예측하지 않고 이어서 진행한다
+    (지문에 예측 시작 월과 설정 키가 들어 있으므로 다음 달 실행이나 설정 변경 시에는 자동으로 무시된다).
+    정상 종료 시 기록은 고객 지문 파일에 합쳐지고 체크포인트는 삭제된다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def load(self):
+        completed = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # 중단 시점에 잘린 마지막 줄
+                    completed[int(record['customer_id'])] = record['fingerprint']
+        except OSError:
+            pass
+        return completed
+
+    def record(self, fingerprints):
+        if not fingerprints:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        for cust_id, fp in fingerprints.items():
+            self._file.write(json.dumps({'customer_id': int(cust_id), 'fingerprint': fp}, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def clear(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
 
+
+# --- 활동 기반 회귀 변수 행렬 ---
+def build_potential_regressors(activities_df):
     potential_regressors = ['total_activities_count']
     if 'ACTIVITY_TYPE' in activities_df.columns:
         potential_regressors.extend(
@@ -256,215 +637,1357 @@ def run_monthly_forecast_pipeline():
     if 'OUTCOME' in activities_df.columns:
         potential_regressors.extend(
             [f'outcome_{str(out).replace(" ", "_")}' for out in activities_df['OUTCOME'].dropna().unique()])
+    return potential_regressors
+
+
+class ActivityFeatureMatrix:
+    """(고객, 월, 회귀 변수) 활동 집계를 한 번에 계산해 두는 희소 행렬
+
+    활동이 있는 (고객, 월) 조합만 행으로 저장하고, 행은 고객 → 월 순으로 정렬되어 있어
+    고객 한 명의 블록은 values[start:stop] 슬라이스(복사 없는 뷰)로 꺼낼 수 있다.
+    열은 potential_regressors 순서이며 값은 기존 고객별 get_dummies/merge 결과와 같다.
+    """
+
+    def __init__(self, regressors, months, values, offsets):
+        self.regressors = regressors
+        self.months = months
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, activities_df, potential_regressors):
+        n_regs = len(potential_regressors)
+        if activities_df.empty:
+            return cls(potential_regressors, np.array([], dtype='datetime64[ns]'),
+                       np.zeros((0, n_regs), dtype=np.float32), {})
+
+        column_index = {name: i for i, name in enumerate(potential_regressors)}
+        group_keys = activities_df[['CUSTOMER_ID', 'MONTH_TS']]
+        grouped = group_keys.groupby(['CUSTOMER_ID', 'MONTH_TS'], observed=True, sort=True)
+        row_of_activity = grouped.ngroup().to_numpy()
+        row_keys = grouped.size().index
+        n_rows = len(row_keys)
+
+        # 각 활동이 더해질 (행, 열) 위치를 모아서 bincount 한 번으로 집계
+        has_row = row_of_activity >= 0  # 고객 ID/월이 결측인 활동은 어느 행에도 속하지 않는다
+        flat_positions = [row_of_activity[has_row] * n_regs + column_index['total_activities_count']]
+        for source_col, prefix in (('ACTIVITY_TYPE', 'act_type'), ('OUTCOME', 'outcome')):
+            if source_col not in activities_df.columns:
+                continue
+            # 기존 get_dummies 열 이름은 공백을 그대로 두므로, 이름이 일치하는 값만 회귀 변수로 집계된다.
+            codes, uniques = pd.factorize(activities_df[source_col])
+            col_of_code = np.array([column_index.get(f'{prefix}_{value}', -1) for value in uniques] + [-1])
+            col_of_activity = col_of_code[codes]  # 결측값(code -1)은 마지막 -1로 매핑
+            mask = has_row & (col_of_activity >= 0)
+            flat_positions.append(row_of_activity[mask] * n_regs + col_of_activity[mask])
+        counts = np.bincount(np.concatenate(flat_positions), minlength=n_rows * n_regs)
+        values = counts.reshape(n_rows, n_regs).astype(np.float32)
+
+        row_customers = row_keys.get_level_values(0).to_numpy()
+        months = row_keys.get_level_values(1).to_numpy(dtype='datetime64[ns]')
+        boundaries = np.flatnonzero(row_customers[1:] != row_customers[:-1]) + 1
+        starts = np.concatenate([[0], boundaries])
+        stops = np.concatenate([boundaries, [n_rows]])
+        offsets = {int(row_customers[start]): (int(start), int(stop)) for start, stop in zip(starts, stops)}
+        return cls(potential_regressors, months, values, offsets)
+
+    def customer_block(self, customer_id):
+        """고객의 (월 배열, 회귀 변수 행렬) 뷰. 활동이 없으면 빈 배열"""
+        start, stop = self.offsets.get(int(customer_id), (0, 0))
+        return self.months[start:stop], self.values[start:stop]
+
+    def model_input(self, customer_id, df_sales):
+        """월별 매출(ds, y)에 고객의 회귀 변수를 붙인 모델 입력. 활동이 없는 달은 0"""
+        block_months, block_values = self.customer_block(customer_id)
+        features = np.zeros((len(df_sales), len(self.regressors)), dtype=np.float64)
+        if len(block_months):
+            ds = df_sales['ds'].to_numpy(dtype='datetime64[ns]')
+            idx = np.minimum(np.searchsorted(block_months, ds), len(block_months) - 1)
+            found = block_months[idx] == ds
+            features[found] = block_values[idx[found]]
+        df_model_input = df_sales.copy()
+        df_model_input[self.regressors] = features
+        return df_model_input
+
+
+class CustomerSeriesPartitions:
+    """A그룹 고객별 월 매출을 고객마다 따로 잡은 작은 (월, 매출) 배열로 미리 나눠 둔 저장소 (메모리 상한 모드)
+
+    주문 원본 행 대신 (고객, 월) 합계만 들고 있으므로 orders 전체를 루프 내내 살려 둘 필요가 없고,
+    순회하면서 꺼낸 고객의 배열은 바로 버린다. 순회 결과는 (고객 ID, MONTH_TS/SALES_AMOUNT DataFrame)으로
+    forecast_single_customer()가 원본 주문으로 계산하는 월별 합계와 같은 값을 준다.
+    """
+
+    def __init__(self, customer_ids, partitions):
+        self.customer_ids = customer_ids
+        self._partitions = partitions
+
+    @classmethod
+    def build(cls, orders, customer_ids):
+        subset = orders.loc[orders['CUSTOMER_ID'].isin(customer_ids), ['CUSTOMER_ID', 'MONTH_TS', 'SALES_AMOUNT']]
+        monthly = subset.groupby(['CUSTOMER_ID', 'MONTH_TS'], observed=True, sort=True)['SALES_AMOUNT'].sum()
+        row_customers = monthly.index.get_level_values(0).to_numpy()
+        months = monthly.index.get_level_values(1).to_numpy(dtype='datetime64[ns]')
+        sales = monthly.to_numpy()
+        boundaries = np.flatnonzero(row_customers[1:] != row_customers[:-1]) + 1
+        starts = np.concatenate([[0], boundaries]).astype(int) if len(row_customers) else []
+        stops = np.concatenate([boundaries, [len(row_customers)]]).astype(int) if len(row_customers) else []
+        # 슬라이스를 복사해 고객마다 독립된 배열로 두어야 꺼낸 뒤 바로 해제된다.
+        partitions = {int(row_customers[start]): (months[start:stop].copy(), sales[start:stop].copy())
+                      for start, stop in zip(starts, stops)}
+        return cls([cust_id for cust_id in customer_ids if int(cust_id) in partitions], partitions)
+
+    def __len__(self):
+        return len(self.customer_ids)
+
+    def __iter__(self):
+        for cust_id in self.customer_ids:
+            months, sales = self._partitions.pop(int(cust_id))
+            yield cust_id, pd.DataFrame({'MONTH_TS': months, 'SALES_AMOUNT': sales})
+
+    @property
+    def nbytes(self):
+        return sum(months.nbytes + sales.nbytes for months, sales in self._partitions.values())
+
+
+class MemoryGuard:
+    """고객마다 부모 + 워커 RSS의 최대값을 기록하고, limit_mb(소프트 상한)를 넘으면 메모리를 회수하고 동시 작업 수를
+    줄인다 (limit_mb가 0이면 기록만)"""
+
+    def __init__(self, limit_mb=0, workers=1, max_in_flight=None):
+        self.limit_mb = limit_mb
+        self.workers = max(workers, 1)
+        self.max_in_flight = max_in_flight or self.workers * MEMORY_BOUNDED_IN_FLIGHT_PER_WORKER
+        self.in_flight = self.max_in_flight
+        self.min_in_flight = self.in_flight
+        self.peak_rss_mb = 0.0
+        self.peak_worker_rss_mb = 0.0
+        self.reclaims = 0
+        self.over_limit = 0  # 회수 후에도 상한을 넘은 횟수
+        self._last_reclaim_mb = None  # 직전 회수 직후의 RSS (상한 아래로 내려오면 None)
+        self._worker_rss = {}  # pid -> 마지막으로 보고된 RSS (최근 workers개 프로세스만)
+
+    def total_rss_mb(self):
+        return (_current_rss_mb() or 0.0) + sum(self._worker_rss.values())
+
+    def in_flight_limit(self):
+        """iter_customer_forecasts()의 max_in_flight로 넘기는 현재 동시 작업 수 (매 결과마다 다시 읽힘)"""
+        return self.in_flight
+
+    def observe(self, run_info, on_pressure=None):
+        pid, rss_mb = run_info.get('pid'), run_info.get('rss_mb')
+        if pid is not None and rss_mb is not None and pid != os.getpid():
+            self._worker_rss.pop(pid, None)
+            self._worker_rss[pid] = rss_mb
+            while len(self._worker_rss) > self.workers:  # 재시작된 워커의 옛 기록은 버린다
+                self._worker_rss.pop(next(iter(self._worker_rss)))
+            self.peak_worker_rss_mb = max(self.peak_worker_rss_mb, rss_mb)
+        total = self.total_rss_mb()
+        self.peak_rss_mb = max(self.peak_rss_mb, total)
+        if not self.limit_mb:
+            return
+        if total <= self.limit_mb * MEMORY_RESUME_RATIO:
+            self._last_reclaim_mb = None
+            self.in_flight = min(self.in_flight + 1, self.max_in_flight)
+            return
+        if total <= self.limit_mb:
+            return
+        if self._last_reclaim_mb is not None and total < self._last_reclaim_mb + MEMORY_RECLAIM_GROWTH_MB:
+            return
+        self.reclaims += 1
+        if on_pressure is not None:
+            on_pressure()
+        gc.collect()
+        after = self.total_rss_mb()
+        self._last_reclaim_mb = after
+        if after > self.limit_mb:
+            if not self.over_limit:  # 매 고객 반복되지 않도록 처음 한 번만 출력 (횟수는 stats()에 집계)
+                print(f"⚠️ 메모리 상한 초과: 회수 후에도 {after:,.0f}MB > {self.limit_mb:,}MB (회수 전 {total:,.0f}MB), "
+                      f"동시 작업 수를 줄입니다")
+            self.over_limit += 1
+            self.in_flight = max(self.in_flight // 2, 1)
+            self.min_in_flight = min(self.min_in_flight, self.in_flight)
+
+    def stats(self):
+        return {'limit_mb': self.limit_mb, 'peak_rss_mb': round(self.peak_rss_mb, 1),
+                'peak_worker_rss_mb': round(self.peak_worker_rss_mb, 1), 'reclaims': self.reclaims,
+                'over_limit': self.over_limit, 'min_in_flight': self.min_in_flight}
+
+
+# --- 모델 캐시 ---
+class ModelCache:
+    """고객별 ARIMA 차수와 Prophet 파라미터를 저장하는 디스크 캐시 (고객당 JSON 파일 1개)
+
+    각 항목은 학습에 쓴 시계열의 지문(series_hash)을 함께 저장한다. 지문이 같으면 ARIMA는 차수 탐색 없이
+    저장된 차수로 바로 학습하고, 지문이 달라도 이전 차수를 탐색 시작점으로, Prophet 파라미터를 초기값으로 쓴다.
+    워커 프로세스는 서로 다른 파일만 쓰므로 잠금이 필요 없고, 제거(evict)는 부모 프로세스에서 실행 끝에 한 번 한다.
+    """
+
+    def __init__(self, cache_dir, max_entries=MODEL_CACHE_MAX_ENTRIES, max_age_days=MODEL_CACHE_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+
+    def _path(self, customer_id):
+        return os.path.join(self.cache_dir, f"{int(customer_id)}.json")
+
+    def get(self, customer_id):
+        try:
+            with open(self._path(customer_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, customer_id, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(customer_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"!!! 모델 캐시 저장 실패 (고객 ID: {customer_id}): {e}")
+
+    def evict(self):
+        """max_age_days보다 오래된 항목을 지우고, 그래도 max_entries를 넘으면 오래된 순서로 지운다."""
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        entries.sort()
+        expire_before = time.time() - self.max_age_days * 86400
+        to_remove = [path for mtime, path in entries if mtime < expire_before]
+        remaining = len(entries) - len(to_remove)
+        if remaining > self.max_entries:
+            to_remove.extend(path for mtime, path in entries[len(to_remove):len(to_remove) + remaining -
+                                                             self.max_entries])
+        for path in to_remove:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return len(to_remove)
+
+
+def _model_input_fingerprint(df_model_input, active_regressors):
+    row_hash = pd.util.hash_pandas_object(df_model_input[['ds', 'y'] + active_regressors], index=False)
+    return hashlib.sha1(row_hash.to_numpy().tobytes() + '|'.join(active_regressors).encode('utf-8')).hexdigest()
+
+
+def _prophet_warm_start_params(model):
+    """학습된 Prophet 모델의 파라미터를 다음 학습의 초기값(init)으로 쓸 수 있는 형태로 변환"""
+    params = {name: float(model.params[name][0][0]) for name in ['k', 'm', 'sigma_obs']}
+    params.update({name: model.params[name][0].tolist() for name in ['delta', 'beta']})
+    return params
+
+
+def _arima_spec(model):
+    return {'order': [int(v) for v in model.order], 'seasonal_order': [int(v) for v in model.seasonal_order],
+            'with_intercept': bool(model.with_intercept)}
+
+
+def _fit_arima_spec(spec, y, exog):
+    """차수 탐색 없이 지정된 차수로 ARIMA 학습"""
+    import pmdarima as pm
+
+    model = pm.ARIMA(order=tuple(spec['order']), seasonal_order=tuple(spec['seasonal_order']),
+                     with_intercept=spec['with_intercept'], suppress_warnings=True)
+    return model.fit(y, exogenous=exog)
+
+
+def _search_arima(y, exog, warm_spec=None):
+    """auto_arima 단계적 탐색. warm_spec이 있으면 이전에 선택된 차수에서 탐색을 시작한다."""
+    import pmdarima as pm
+
+    start = {}
+    if warm_spec:
+        p, _, q = warm_spec['order']
+        P, _, Q, _ = warm_spec['seasonal_order']
+        start = {'start_p': p, 'start_q': q, 'start_P': P, 'start_Q': Q}
+    return pm.auto_arima(y, exogenous=exog, m=12, seasonal=True, suppress_warnings=True, stepwise=True,
+                         error_action='ignore', **start)
+
+
+# --- 모델링 라이브러리 지연 로딩 ---
+def load_modeling_stack():
+    """MODELING_MODULES를 미리 import하고 걸린 시간(초)을 반환 (이미 로딩되어 있으면 0에 가깝다)
+
+    각 함수가 필요할 때 import하므로 호출하지 않아도 동작은 같지만, 파이프라인은 A그룹 학습 직전에 한 번 불러
+    로딩 시간을 'import_modeling' 단계로 따로 집계하고, 병렬 워커가 fork 시 로딩된 모듈을 물려받게 한다.
+    """
+    started = time.perf_counter()
+    for name in MODELING_MODULES:
+        importlib.import_module(name)
+    return time.perf_counter() - started
+
+
+def check_import_budget(budget_s=IMPORT_TIME_BUDGET_S):
+    """모듈 import 시간(MODULE_IMPORT_SECONDS)이 예산 안인지 확인하고 (초, 예산 내 여부)를 반환"""
+    within = MODULE_IMPORT_SECONDS <= budget_s
+    if not within:
+        print(f"⚠️ 모듈 import에 {MODULE_IMPORT_SECONDS:.2f}초 걸렸습니다 (예산 {budget_s:.2f}초). "
+              f"최상위 import에 무거운 라이브러리가 추가되지 않았는지 확인하세요.")
+    return MODULE_IMPORT_SECONDS, within
+
+
+# --- Prophet 학습/검증 ---
+def _new_prophet_model(active_regressors):
+    from prophet import Prophet
+
+    model_prophet = Prophet(yearly_seasonality=True, seasonality_mode="additive", stan_backend="CMDSTANPY")
+    for reg in active_regressors:
+        model_prophet.add_regressor(reg)
+    return model_prophet
+
+
+def _prophet_holdout_mape(df_model_input, active_regressors):
+    """ARIMA와 같은 기준의 홀드아웃 MAPE: 마지막 ARIMA_TEST_PERIODS개월(월 단위 보간)을 떼어 두고 1회 학습
+
+    (MAPE 또는 None, 학습 횟수) 반환. ARIMA와 마찬가지로 검증 구간에 0 이하 값이 있으면 MAPE를 계산하지 않는다.
+    """
+    from sklearn.metrics import mean_absolute_percentage_error
+
+    y_series = df_model_input.set_index("ds")["y"].asfreq("MS").interpolate()
+    test_y = y_series[-ARIMA_TEST_PERIODS:]
+    if not np.all(test_y > 0):
+        return None, 0
+    train_df = df_model_input[df_model_input['ds'] < test_y.index[0]][['ds', 'y'] + active_regressors]
+    model_holdout = _new_prophet_model(active_regressors)
+    model_holdout.fit(train_df)
+    test_df = pd.DataFrame({'ds': test_y.index})
+    if active_regressors:
+        exog_series = df_model_input.set_index("ds")[active_regressors].asfreq("MS").interpolate()
+        test_df[active_regressors] = exog_series.loc[test_y.index].to_numpy()
+    test_pred = model_holdout.predict(test_df)['yhat'].to_numpy()
+    return mean_absolute_percentage_error(test_y, test_pred) * 100, 1
+
+
+def validate_prophet(model_prophet, df_model_input, active_regressors, settings):
+    """설정된 방식으로 Prophet MAPE(%)를 계산하고 (MAPE 또는 None, 검증 정보)를 반환
+
+    settings: {'strategy': 'cv' | 'holdout', 'parallel': None | 'threads' | 'processes', 'max_cutoffs': int}
+    검증 정보에는 방식, 재학습 횟수, 소요 시간(초)이 담겨 실행 지표로 집계된다.
+    """
+    started = time.perf_counter()
+    strategy = settings.get('strategy', 'cv')
+    info = {'strategy': strategy}
+    if strategy == 'holdout':
+        prophet_mape, info['fits'] = _prophet_holdout_mape(df_model_input, active_regressors)
+    else:
+        parallel = settings.get('parallel')
+        if parallel == 'processes' and multiprocessing.current_process().daemon:
+            parallel = 'threads'  # 프로세스 풀 워커(daemon)는 자식 프로세스를 만들 수 없다
+        initial = pd.Timedelta(days=CV_PERIOD_D_PROPHET * 3)
+        period = pd.Timedelta(days=CV_PERIOD_D_PROPHET)
+        horizon = pd.Timedelta(days=CV_HORIZON_D_PROPHET)
+        from prophet.diagnostics import cross_validation, performance_metrics, generate_cutoffs
+
+        cutoffs = None
+        if settings.get('max_cutoffs'):
+            cutoffs = generate_cutoffs(model_prophet.history.reset_index(drop=True), horizon, initial,
+                                       period)[-settings['max_cutoffs']:]
+        cv_results = cross_validation(model_prophet, initial=initial, period=period, horizon=horizon,
+                                      cutoffs=cutoffs, parallel=parallel, disable_tqdm=True)
+        info['parallel'] = parallel
+        info['fits'] = int(cv_results['cutoff'].nunique()) if not cv_results.empty else 0
+        if not cv_results.empty:
+            metrics = performance_metrics(cv_results)
+            prophet_mape = metrics['mape'].mean() * 100
+        else:
+            prophet_mape = None
+    info['seconds'] = time.perf_counter() - started
+    return prophet_mape, info
+
+
+# --- 고객별 예측 (직렬/병렬 공용) ---
+def finalize_forecast_frame(chosen_forecast, chosen_mape, chosen_model_name):
+    """선택된 예측 결과를 DB 저장 형식으로 변환 (공통 후처리)"""
+    chosen_forecast["yhat"] = np.maximum(0, chosen_forecast["yhat"])
+    final_df_for_db = chosen_forecast.rename(columns={"ds": "PREDICTED_DATE", "yhat": "PREDICTED_QUANTITY"})
+    final_df_for_db["MAPE"] = chosen_mape
+    final_df_for_db["PREDICTION_MODEL"] = chosen_model_name
+
+    # PROBABILITY 컬럼이 없으면 None으로 설정
+    if 'PROBABILITY' not in final_df_for_db.columns:
+        final_df_for_db['PROBABILITY'] = None
+    return final_df_for_db
+
+
+def insufficient_forecast_frame(future_dates_fixed):
+    """MIN_MONTHS개월 미만 고객에게 저장하는 'Data Insufficient' 예측 (예측값 0, MAPE 없음)"""
+    return finalize_forecast_frame(pd.DataFrame({'ds': future_dates_fixed, 'yhat': 0}), None, "Data Insufficient")
+
+
+def split_insufficient_customers(orders, customer_ids):
+    """A그룹 고객을 (매출 월 수가 MIN_MONTHS 미만인 고객, 나머지 고객)으로 나눈다 (customer_ids 순서 유지)
+
+    forecast_single_customer()의 데이터 부족 판정(월별 매출 행 수)과 같은 기준이다. 주문이 없는 고객은 어느 쪽에도
+    들어가지 않는다.
+    """
+    month_counts = orders.loc[orders['CUSTOMER_ID'].isin(customer_ids)].groupby('CUSTOMER_ID', observed=True)[
+        'MONTH_TS'].nunique()
+    month_counts = month_counts.to_dict()
+    insufficient = [cust_id for cust_id in customer_ids if 0 < month_counts.get(cust_id, 0) < MIN_MONTHS]
+    sufficient = [cust_id for cust_id in customer_ids if month_counts.get(cust_id, 0) >= MIN_MONTHS]
+    return insufficient, sufficient
+
+
+def score_group_b_customers(customer_ids, training_df_full, event_model, avg_large_order_amount,
+                            future_dates_fixed, purchase_threshold=0.5):
+    """B그룹 고객 전체를 한 번에 이벤트 예측하고 (고객 ID, DB 저장용 DataFrame)을 순서대로 반환
+
+    고객별 마지막 특징 행은 groupby-last 한 번으로 구하고, 고객 x 미래 BASE_FUTURE개월 특징 행렬 전체를
+    predict_proba 한 번으로 계산한다.
+    """
+    customer_ids = list(customer_ids)
+    if not customer_ids:
+        return []
+    features = ['KEY_ACTIVITY_LAST_6M', 'MONTHS_SINCE_LAST_LARGE']
+    last_features = training_df_full.groupby('CUSTOMER_ID', observed=True)[features].last().loc[customer_ids]
+
+    months_ahead = np.arange(1, BASE_FUTURE + 1)
+    future_features_df = pd.DataFrame({
+        'KEY_ACTIVITY_LAST_6M': np.repeat(last_features['KEY_ACTIVITY_LAST_6M'].to_numpy(), BASE_FUTURE),
+        'MONTHS_SINCE_LAST_LARGE': (last_features['MONTHS_SINCE_LAST_LARGE'].to_numpy()[:, None] +
+                                    months_ahead).ravel()})
+    purchase_probabilities = event_model.predict_proba(future_features_df)[:, 1].reshape(len(customer_ids),
+                                                                                          BASE_FUTURE)
+    avg_order_values = avg_large_order_amount.reindex(customer_ids).fillna(0).to_numpy()
+    predicted_quantities = np.where(purchase_probabilities >= purchase_threshold, avg_order_values[:, None], 0)
+
+    results = []
+    for i, cust_id in enumerate(customer_ids):
+        chosen_forecast = pd.DataFrame(
+            {'ds': future_dates_fixed, 'yhat': predicted_quantities[i], 'PROBABILITY': purchase_probabilities[i]})
+        results.append((cust_id, finalize_forecast_frame(chosen_forecast, None, "Event-Driven (Logistic)")))
+    return results
+
+
+def seasonal_naive_baseline(orders, customer_ids, future_dates_fixed, season=BASELINE_SEASON,
+                            test_periods=ARIMA_TEST_PERIODS):
+    """고객 x 월 매출 행렬 하나로 전체 고객의 계절성 naive 예측(1년 전 같은 달 값)과 홀드아웃 MAPE를 계산
+
+    고객별 시계열은 ARIMA와 같이 첫 주문 월 ~ 마지막 주문 월 구간을 월 단위로 보간한다. 홀드아웃은 마지막
+    test_periods개월이며, ARIMA와 마찬가지로 그 구간에 0 이하 값이 있거나 이력이 season + test_periods개월보다
+    짧거나 주문이 있는 달이 MIN_MONTHS보다 적으면 MAPE는 NaN이다.
+    미래 월은 마지막 데이터 월 이하에서 같은 달(최소 1년 전) 값을 쓴다.
+    (고객 ID Index, MAPE 배열, 예측 행렬(고객 x len(future_dates_fixed))) 반환
+    """
+    subset = orders[orders['CUSTOMER_ID'].isin(customer_ids)]
+    monthly = subset.groupby(['CUSTOMER_ID', 'MONTH_TS'], observed=True)['SALES_AMOUNT'].sum().unstack('MONTH_TS')
+    if monthly.empty:
+        return monthly.index, np.array([]), np.empty((0, len(future_dates_fixed)))
+    all_months = pd.date_range(start=monthly.columns.min(), end=monthly.columns.max(), freq='MS')
+    monthly = monthly.reindex(columns=all_months)
+
+    observed = monthly.notna().to_numpy()
+    values = monthly.interpolate(axis=1, limit_area='inside').to_numpy(dtype=np.float64)
+    n_customers, n_months = values.shape
+    rows = np.arange(n_customers)[:, None]
+    first = observed.argmax(axis=1)
+    last = n_months - 1 - observed[:, ::-1].argmax(axis=1)
+    eligible = (observed.sum(axis=1) >= MIN_MONTHS) & (last - first + 1 >= season + test_periods)
+
+    # 홀드아웃: 마지막 test_periods개월을 1년 전 같은 달 값으로 예측
+    test_idx = last[:, None] - np.arange(test_periods)[::-1]
+    test_y = values[rows, test_idx]
+    test_pred = values[rows, np.maximum(test_idx - season, 0)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mape = np.mean(np.abs(test_y - test_pred) / np.abs(test_y), axis=1) * 100
+    valid = eligible & np.all(test_y > 0, axis=1) & ~np.isnan(test_pred).any(axis=1)
+    mape = np.where(valid, mape, np.nan)
+
+    # 미래 월: 마지막 데이터 월 이하에서 가장 가까운 같은 달 (최소 1년 전)
+    first_month_no = all_months[0].year * 12 + all_months[0].month
+    future_col = (future_dates_fixed.year * 12 + future_dates_fixed.month).to_numpy() - first_month_no
+    years_back = np.maximum(np.ceil((future_col[None, :] - last[:, None]) / season), 1).astype(np.int64)
+    source_col = future_col[None, :] - years_back * season
+    forecasts = values[rows, np.clip(source_col, 0, n_months - 1)]
+    forecasts[~eligible] = np.nan
+    return monthly.index, mape, forecasts
+
+
+def score_baseline_customers(orders, customer_ids, future_dates_fixed, mape_threshold=BASELINE_MAPE_THRESHOLD):
+    """계절성 naive 홀드아웃 MAPE가 mape_threshold 이하인 고객만 (고객 ID, DB 저장용 DataFrame, MAPE)로 반환
+
+    나머지 고객은 기존대로 Prophet/ARIMA로 예측한다. mape_threshold가 0 이하이면 빈 리스트를 반환한다.
+    """
+    if mape_threshold <= 0 or not len(customer_ids):
+        return []
+    baseline_ids, mape, forecasts = seasonal_naive_baseline(orders, customer_ids, future_dates_fixed)
+    accepted = np.flatnonzero(~np.isnan(mape) & (mape <= mape_threshold))
+    results = []
+    for i in accepted:
+        chosen_forecast = pd.DataFrame({'ds': future_dates_fixed, 'yhat': forecasts[i]})
+        results.append((baseline_ids[i], finalize_forecast_frame(chosen_forecast, float(mape[i]), BASELINE_MODEL_NAME),
+                        float(mape[i])))
+    return results
+
+
+def forecast_single_customer(cust_id, grp_orders, context):
+    """A그룹 고객 한 명의 시계열 예측을 수행하고 (DB 저장용 DataFrame, 실행 정보)를 반환 (DB 접근 없음)
+
+    실행 정보에는 선택 모델, MAPE와 단계별 소요 시간(timings: prophet_fit, prophet_validation, arima_eval,
+    arima_final, total)이 담긴다. B그룹 고객은 score_group_b_customers()로 한꺼번에 처리한다.
+    """
+    started = time.perf_counter()
+    timings = {}
+    cache_hit = False
+    activity_features = context['activity_features']
+    potential_regressors = context['potential_regressors']
+    future_start_date = context['future_start_date']
+    future_dates_fixed = context['future_dates_fixed']
+    model_cache = context.get('model_cache')
+    validation_settings = context.get('prophet_validation', {})
+    prophet_validation_info = None
+
+    _vprint(f"\n--- 고객 ID: {cust_id} 예측 시작 ---")
+
+    # --- 그룹 A: 시계열 예측 (Prophet + ARIMA) ---
+    _vprint(f"➡️  그룹 A (시계열 예측): 일반 예측 대상으로 분류되었습니다.")
+    df_sales = grp_orders.groupby("MONTH_TS")["SALES_AMOUNT"].sum().reset_index().rename(
+        columns={"MONTH_TS": "ds", "SALES_AMOUNT": "y"})
+    df_sales["ds"] = pd.to_datetime(df_sales["ds"])
+    # 활동 회귀 변수는 파이프라인 시작 시 한 번 만든 행렬에서 고객 블록만 꺼내 붙인다.
+    df_model_input = activity_features.model_input(cust_id, df_sales)
+
+    active_regressors = [col for col in potential_regressors if df_model_input[col].sum() > 0]
+
+    _vprint(f"모델 입력 데이터 크기: {len(df_model_input)}, 활성 회귀 변수: {active_regressors}")
+
+    chosen_model_name, chosen_forecast, chosen_mape = "Data Insufficient", None, None
+
+    if len(df_model_input) >= MIN_MONTHS:
+        future_regressor_values = {col: round(df_model_input[col].tail(FUTURE_COUNT_WINDOW).mean()) for col in
+                                   active_regressors}
+        _vprint(f"미래 회귀 변수 값 (평균): {future_regressor_values}")
+
+        # 모델 캐시 조회: 같은 입력이면 저장된 ARIMA 차수를 그대로, 아니면 이전 결과를 시작점으로 사용
+        series_hash = _model_input_fingerprint(df_model_input, active_regressors)
+        cache_entry = (model_cache.get(cust_id) if model_cache else None) or {}
+        cache_hit = cache_entry.get('series_hash') == series_hash
+        new_cache_entry = {'series_hash': series_hash}
+
+        # Prophet 모델 시도
+        prophet_forecast, prophet_mape = None, None
+        _vprint("Prophet 모델 시도 중...")
+        try:
+            model_prophet = _new_prophet_model(active_regressors)
+            fit_kwargs = {}
+            if cache_entry.get('prophet_init'):
+                # 모양이 맞지 않는 초기값은 Prophet이 기본값으로 대체한다.
+                fit_kwargs['init'] = {name: np.asarray(value) for name, value in
+                                      cache_entry['prophet_init'].items()}
+            with _timed_stage(timings, 'prophet_fit'):
+                model_prophet.fit(df_model_input[['ds', 'y'] + active_regressors], **fit_kwargs)
+            # 교차 검증은 fit_kwargs를 재사용하므로, 각 컷오프는 기존처럼 기본 초기값으로 학습하도록 되돌린다.
+            model_prophet.fit_kwargs = {}
+            new_cache_entry['prophet_init'] = _prophet_warm_start_params(model_prophet)
+
+            future_df_prophet = pd.DataFrame({'ds': future_dates_fixed})
+            for reg, val in future_regressor_values.items():
+                future_df_prophet[reg] = val
+
+            forecast_p = model_prophet.predict(future_df_prophet)
+            prophet_forecast = forecast_p[['ds', 'yhat']]
+
+            # Prophet 검증 (기본: 기존과 동일한 교차 검증)
+            _vprint(f"Prophet 검증 시작 (방식: {validation_settings.get('strategy', 'cv')})...")
+            with _timed_stage(timings, 'prophet_validation'):
+                prophet_mape, prophet_validation_info = validate_prophet(model_prophet, df_model_input,
+                                                                         active_regressors, validation_settings)
+            if prophet_mape is not None:
+                _vprint(f"Prophet MAPE (고객 ID: {cust_id}): {prophet_mape:.2f}%")
+            else:
+                _vprint(f"Prophet 검증 결과가 비어있습니다. (고객 ID: {cust_id})")
+        except Exception as e:
+            print(f"!!! Prophet 모델링 실패 (고객 ID: {cust_id}): {e}")
+            prophet_forecast, prophet_mape = None, None
+
+        # ARIMA 모델 시도 (첫 번째 코드와 동일 로직)
+        arima_forecast, arima_mape = None, None
+        _vprint("ARIMA 모델 시도 중...")
+        if len(df_model_input) >= 12 + ARIMA_TEST_PERIODS:
+            try:
+                y_series = df_model_input.set_index("ds")["y"].asfreq("MS").interpolate()
+                exog_series = df_model_input.set_index("ds")[active_regressors].asfreq(
+                    "MS").interpolate() if active_regressors else None
+
+                train_y, test_y = y_series[:-ARIMA_TEST_PERIODS], y_series[-ARIMA_TEST_PERIODS:]
+                train_exog, test_exog = (exog_series[:-ARIMA_TEST_PERIODS],
+                                         exog_series[-ARIMA_TEST_PERIODS:]) if exog_series is not None else (
+                None, None)
+
+                eval_started = time.perf_counter()
+                if cache_hit and cache_entry.get('arima'):
+                    _vprint(f"ARIMA 캐시 적중: 저장된 차수 {cache_entry['arima']['order']} 사용")
+                    eval_model = _fit_arima_spec(cache_entry['arima'], train_y, train_exog)
+                else:
+                    eval_model = _search_arima(train_y, train_exog, warm_spec=cache_entry.get('arima'))
+                new_cache_entry['arima'] = _arima_spec(eval_model)
+                test_pred = eval_model.predict(n_periods=len(test_y), exogenous=test_exog)
+                timings['arima_eval'] = time.perf_counter() - eval_started
+
+                if np.all(test_y > 0):
+                    from sklearn.metrics import mean_absolute_percentage_error
+
+                    arima_mape = mean_absolute_percentage_error(test_y, test_pred) * 100
+                    _vprint(f"ARIMA MAPE (고객 ID: {cust_id}): {arima_mape:.2f}%")
+                else:
+                    arima_mape = None
+
+                # 최종 모델은 평가용 탐색에서 찾은 차수로 전체 기간을 다시 학습 (두 번째 탐색 생략)
+                final_started = time.perf_counter()
+                final_model = _fit_arima_spec(new_cache_entry['arima'], y_series, exog_series)
+
+                last_data_date = y_series.index[-1]
+                gap_months = (future_start_date.year - last_data_date.year) * 12 + (
+                            future_start_date.month - last_data_date.month)
+                gap_months = max(0, gap_months)
+                total_periods_to_predict = gap_months + BASE_FUTURE
+
+                future_exog = None
+                if active_regressors:
+                    future_exog_dates = pd.date_range(start=last_data_date + relativedelta(months=1),
+                                                      periods=total_periods_to_predict, freq="MS")
+                    future_exog = pd.DataFrame(future_regressor_values, index=future_exog_dates)
+                    if exog_series is not None:
+                        future_exog = future_exog[exog_series.columns]
+
+                full_future_pred = final_model.predict(n_periods=total_periods_to_predict,
+                                                       exogenous=future_exog)
+                future_pred = full_future_pred.iloc[-BASE_FUTURE:]
+                timings['arima_final'] = time.perf_counter() - final_started
+
+                arima_forecast = pd.DataFrame({"ds": future_pred.index, "yhat": future_pred.values})
+
+            except Exception as e:
+                print(f"!!! ARIMA 모델링 실패 (고객 ID: {cust_id}): {e}")
+                arima_forecast, arima_mape = None, None
+        else:
+            _vprint(f"ARIMA 모델링을 위한 데이터 부족 (고객 ID: {cust_id}).")
+
+        if model_cache and len(new_cache_entry) > 1:
+            model_cache.put(cust_id, new_cache_entry)
+
+        # 모델 선택 로직 (첫 번째 코드와 동일)
+        if prophet_mape is not None and (arima_mape is None or prophet_mape < arima_mape):
+            chosen_forecast, chosen_mape, chosen_model_name = prophet_forecast, prophet_mape, "Prophet"
+            _vprint(f"최종 선택 모델: Prophet (MAPE: {prophet_mape:.2f}%)")
+        elif arima_mape is not None:
+            chosen_forecast, chosen_mape, chosen_model_name = arima_forecast, arima_mape, "ARIMA"
+            _vprint(f"최종 선택 모델: ARIMA (MAPE: {arima_mape:.2f}%)")
+        elif prophet_forecast is not None:
+            chosen_forecast, chosen_mape, chosen_model_name = prophet_forecast, prophet_mape, "Prophet (No MAPE)"
+            _vprint(f"최종 선택 모델: Prophet (MAPE 없음)")
+        else:
+            chosen_model_name = "Prediction Failed"
+            chosen_forecast = pd.DataFrame({'ds': future_dates_fixed, 'yhat': 0})
+            print(f"!!! 예측 실패. (고객 ID: {cust_id})")
+    else:
+        # 파이프라인은 split_insufficient_customers()로 미리 걸러내므로 단독 호출 시에만 여기로 온다.
+        chosen_model_name = "Data Insufficient"
+        chosen_forecast = pd.DataFrame({'ds': future_dates_fixed, 'yhat': 0})
+        _vprint(f"데이터 부족 (고객 ID: {cust_id}).")
+
+    # --- 공통 후처리 ---
+    final_df_for_db = finalize_forecast_frame(chosen_forecast, chosen_mape, chosen_model_name)
+
+    if FORECAST_VERBOSE:
+        print(f"💾 최종 예측 데이터 (모델: {chosen_model_name}):")
+        print(final_df_for_db.head())
+        print(f"DB 저장될 데이터 수: {len(final_df_for_db)}")
+    timings['total'] = time.perf_counter() - started
+    run_info = {'model': chosen_model_name, 'mape': chosen_mape, 'prophet_validation': prophet_validation_info,
+                'months': len(df_model_input), 'cache_hit': cache_hit, 'timings': timings}
+    return final_df_for_db, run_info
 
-    for cust_id, grp_orders in tqdm(orders.groupby("CUSTOMER_ID"), desc="고객별 예측"):
-        print(f"\n--- 고객 ID: {cust_id} 예측 시작 ---")
 
-        if cust_id in group_b_customer_ids:
-            # --- 그룹 B: 이벤트 예측 ---
-            print(f"➡️  그룹 B (이벤트 예측): 특별 관리 대상으로 분류되었습니다.")
+# 워커 프로세스마다 한 번만 전달되는 공유 컨텍스트 (고객별 작업에는 주문 데이터만 전달)
+_WORKER_CONTEXT = None
+_WORKER_TASK_STARTS = None  # 작업 토큰 -> 워커에서 실제로 시작한 시각 (Manager dict, 제한 시간 측정용)
 
-            future_features_list = []
-            base_months_since = \
-            training_df_full[training_df_full['CUSTOMER_ID'] == cust_id]['MONTHS_SINCE_LAST_LARGE'].iloc[-1]
-            base_activities = training_df_full[training_df_full['CUSTOMER_ID'] == cust_id]['KEY_ACTIVITY_LAST_6M'].iloc[
-                -1]
 
-            for i in range(BASE_FUTURE):
-                future_features_list.append(
-                    {'KEY_ACTIVITY_LAST_6M': base_activities, 'MONTHS_SINCE_LAST_LARGE': base_months_since + i + 1})
+def _init_forecast_worker(context, task_starts=None):
+    global _WORKER_CONTEXT, _WORKER_TASK_STARTS, FORECAST_VERBOSE
+    _WORKER_CONTEXT = context
+    _WORKER_TASK_STARTS = task_starts
+    FORECAST_VERBOSE = context.get('verbose', FORECAST_VERBOSE)
+    warnings.filterwarnings("ignore")
 
-            future_features_df = pd.DataFrame(future_features_list)
-            purchase_probabilities = event_model.predict_proba(future_features_df)[:, 1]
 
-            purchase_threshold = 0.5
-            avg_order_val = avg_large_order_amount.get(cust_id, 0)
-            predicted_quantities = [avg_order_val if prob >= purchase_threshold else 0 for prob in
-                                    purchase_probabilities]
+def _run_customer_forecast(cust_id, grp_orders, context):
+    """forecast_single_customer() 실행. context['profile']이면 cProfile 결과 요약을 run_info['profile']에 담는다.
 
-            chosen_model_name = "Event-Driven (Logistic)"
-            chosen_forecast = pd.DataFrame(
-                {'ds': future_dates_fixed, 'yhat': predicted_quantities, 'PROBABILITY': purchase_probabilities})
-            chosen_mape = None
+    실행한 프로세스의 ID와 실행 직후 RSS(MB)를 run_info['pid'], run_info['rss_mb']에 남긴다 (MemoryGuard용).
+    """
+    if not context.get('profile'):
+        final_df_for_db, run_info = forecast_single_customer(cust_id, grp_orders, context)
+    else:
+        profiler = cProfile.Profile()
+        final_df_for_db, run_info = profiler.runcall(forecast_single_customer, cust_id, grp_orders, context)
+        buffer = io.StringIO()
+        pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(PROFILE_STATS_LINES)
+        run_info['profile'] = buffer.getvalue()
+    run_info['pid'] = os.getpid()
+    run_info['rss_mb'] = _current_rss_mb()
+    return final_df_for_db, run_info
 
-        else:
-            # --- 그룹 A: 시계열 예측 (Prophet + ARIMA) ---
-            print(f"➡️  그룹 A (시계열 예측): 일반 예측 대상으로 분류되었습니다.")
-            df_sales = grp_orders.groupby("MONTH_TS")["SALES_AMOUNT"].sum().reset_index().rename(
-                columns={"MONTH_TS": "ds", "SALES_AMOUNT": "y"})
-            df_sales["ds"] = pd.to_datetime(df_sales["ds"])
-            customer_activities = activities_df[activities_df["CUSTOMER_ID"] == cust_id].copy()
-            df_model_input = df_sales.copy()
-
-            if not customer_activities.empty:
-                df_model_input = pd.merge(df_model_input, customer_activities.groupby("MONTH_TS").size().reset_index(
-                    name="total_activities_count").rename(columns={"MONTH_TS": "ds"}), on="ds", how="left")
-                if 'ACTIVITY_TYPE' in customer_activities.columns:
-                    dummies_activities_type = pd.get_dummies(customer_activities, columns=['ACTIVITY_TYPE'],
-                                                             prefix='act_type', dtype=int)
-                    df_model_input = pd.merge(df_model_input, dummies_activities_type.groupby("MONTH_TS").sum(
-                        numeric_only=True).reset_index().rename(columns={"MONTH_TS": "ds"}), on="ds", how="left")
-                if 'OUTCOME' in customer_activities.columns:
-                    dummies_outcomes = pd.get_dummies(customer_activities, columns=['OUTCOME'], prefix='outcome',
-                                                      dtype=int)
-                    df_model_input = pd.merge(df_model_input, dummies_outcomes.groupby("MONTH_TS").sum(
-                        numeric_only=True).reset_index().rename(columns={"MONTH_TS": "ds"}), on="ds", how="left")
-
-            for col in potential_regressors:
-                if col not in df_model_input.columns:
-                    df_model_input[col] = 0
-            df_model_input.fillna(0, inplace=True)
-
-            active_regressors = [col for col in potential_regressors if
-                                 df_model_input[col].sum() > 0 and col in df_model_input.columns]
-
-            print(f"모델 입력 데이터 크기: {len(df_model_input)}, 활성 회귀 변수: {active_regressors}")
-
-            chosen_model_name, chosen_forecast, chosen_mape = "Data Insufficient", None, None
-
-            if len(df_model_input) >= MIN_MONTHS:
-                future_regressor_values = {col: round(df_model_input[col].tail(FUTURE_COUNT_WINDOW).mean()) for col in
-                                           active_regressors}
-                print(f"미래 회귀 변수 값 (평균): {future_regressor_values}")
-
-                # Prophet 모델 시도
-                prophet_forecast, prophet_mape = None, None
-                print("Prophet 모델 시도 중...")
-                try:
-                    model_prophet = Prophet(yearly_seasonality=True, seasonality_mode="additive",
-                                            stan_backend="CMDSTANPY")
-                    for reg in active_regressors:
-                        model_prophet.add_regressor(reg)
-                    model_prophet.fit(df_model_input[['ds', 'y'] + active_regressors])
-
-                    future_df_prophet = pd.DataFrame({'ds': future_dates_fixed})
-                    for reg, val in future_regressor_values.items():
-                        future_df_prophet[reg] = val
-
-                    forecast_p = model_prophet.predict(future_df_prophet)
-                    prophet_forecast = forecast_p[['ds', 'yhat']]
-
-                    # Prophet 교차 검증 (첫 번째 코드와 동일)
-                    print("Prophet 교차 검증 시작 (parallel=None)...")
-                    cv_results = cross_validation(model_prophet, initial=f'{CV_PERIOD_D_PROPHET * 3} days',
-                                                  period=f'{CV_PERIOD_D_PROPHET} days',
-                                                  horizon=f'{CV_HORIZON_D_PROPHET} days', parallel=None,
-                                                  disable_tqdm=True)
-
-                    if not cv_results.empty:
-                        metrics = performance_metrics(cv_results)
-                        prophet_mape = metrics['mape'].mean() * 100
-                        print(f"Prophet MAPE (고객 ID: {cust_id}): {prophet_mape:.2f}%")
-                    else:
-                        print(f"Prophet 교차 검증 결과가 비어있습니다. (고객 ID: {cust_id})")
-                        prophet_mape = None
-                except Exception as e:
-                    print(f"!!! Prophet 모델링 실패 (고객 ID: {cust_id}): {e}")
-                    prophet_forecast, prophet_mape = None, None
-
-                # ARIMA 모델 시도 (첫 번째 코드와 동일 로직)
-                arima_forecast, arima_mape = None, None
-                print("ARIMA 모델 시도 중...")
-                if len(df_model_input) >= 12 + ARIMA_TEST_PERIODS:
-                    try:
-                        y_series = df_model_input.set_index("ds")["y"].asfreq("MS").interpolate()
-                        exog_series = df_model_input.set_index("ds")[active_regressors].asfreq(
-                            "MS").interpolate() if active_regressors else None
-
-                        train_y, test_y = y_series[:-ARIMA_TEST_PERIODS], y_series[-ARIMA_TEST_PERIODS:]
-                        train_exog, test_exog = (exog_series[:-ARIMA_TEST_PERIODS],
-                                                 exog_series[-ARIMA_TEST_PERIODS:]) if exog_series is not None else (
-                        None, None)
-
-                        eval_model = pm.auto_arima(train_y, exogenous=train_exog, m=12, seasonal=True,
-                                                   suppress_warnings=True, stepwise=True, error_action='ignore')
-                        test_pred = eval_model.predict(n_periods=len(test_y), exogenous=test_exog)
-
-                        if np.all(test_y > 0):
-                            arima_mape = mean_absolute_percentage_error(test_y, test_pred) * 100
-                            print(f"ARIMA MAPE (고객 ID: {cust_id}): {arima_mape:.2f}%")
-                        else:
-                            arima_mape = None
-
-                        final_model = pm.auto_arima(y_series, exogenous=exog_series, m=12, seasonal=True,
-                                                    suppress_warnings=True, stepwise=True, error_action='ignore')
-
-                        last_data_date = y_series.index[-1]
-                        gap_months = (future_start_date.year - last_data_date.year) * 12 + (
-                                    future_start_date.month - last_data_date.month)
-                        gap_months = max(0, gap_months)
-                        total_periods_to_predict = gap_months + BASE_FUTURE
-
-                        future_exog = None
-                        if active_regressors:
-                            future_exog_dates = pd.date_range(start=last_data_date + relativedelta(months=1),
-                                                              periods=total_periods_to_predict, freq="MS")
-                            future_exog = pd.DataFrame(future_regressor_values, index=future_exog_dates)
-                            if exog_series is not None:
-                                future_exog = future_exog[exog_series.columns]
-
-                        full_future_pred = final_model.predict(n_periods=total_periods_to_predict,
-                                                               exogenous=future_exog)
-                        future_pred = full_future_pred.iloc[-BASE_FUTURE:]
-
-                        arima_forecast = pd.DataFrame({"ds": future_pred.index, "yhat": future_pred.values})
-
-                    except Exception as e:
-                        print(f"!!! ARIMA 모델링 실패 (고객 ID: {cust_id}): {e}")
-                        arima_forecast, arima_mape = None, None
-                else:
-                    print(f"ARIMA 모델링을 위한 데이터 부족 (고객 ID: {cust_id}).")
-
-                # 모델 선택 로직 (첫 번째 코드와 동일)
-                if prophet_mape is not None and (arima_mape is None or prophet_mape < arima_mape):
-                    chosen_forecast, chosen_mape, chosen_model_name = prophet_forecast, prophet_mape, "Prophet"
-                    print(f"최종 선택 모델: Prophet (MAPE: {prophet_mape:.2f}%)")
-                elif arima_mape is not None:
-                    chosen_forecast, chosen_mape, chosen_model_name = arima_forecast, arima_mape, "ARIMA"
-                    print(f"최종 선택 모델: ARIMA (MAPE: {arima_mape:.2f}%)")
-                elif prophet_forecast is not None:
-                    chosen_forecast, chosen_mape, chosen_model_name = prophet_forecast, prophet_mape, "Prophet (No MAPE)"
-                    print(f"최종 선택 모델: Prophet (MAPE 없음)")
-                else:
-                    chosen_model_name = "Prediction Failed"
-                    chosen_forecast = pd.DataFrame({'ds': future_dates_fixed, 'yhat': 0})
-                    print(f"!!! 예측 실패. (고객 ID: {cust_id})")
-            else:
-                chosen_model_name = "Data Insufficient"
-                chosen_forecast = pd.DataFrame({'ds': future_dates_fixed, 'yhat': 0})
-                print(f"데이터 부족 (고객 ID: {cust_id}).")
 
-        # --- 공통 후처리 및 저장 로직 ---
-        chosen_forecast["yhat"] = np.maximum(0, chosen_forecast["yhat"])
-        final_df_for_db = chosen_forecast.rename(columns={"ds": "PREDICTED_DATE", "yhat": "PREDICTED_QUANTITY"})
-        final_df_for_db["MAPE"] = chosen_mape
-        final_df_for_db["PREDICTION_MODEL"] = chosen_model_name
+def _forecast_customer_task(token, cust_id, grp_orders):
+    if _WORKER_TASK_STARTS is not None:
+        _WORKER_TASK_STARTS[token] = time.time()
+    return _run_customer_forecast(cust_id, grp_orders, _WORKER_CONTEXT)
 
-        # PROBABILITY 컬럼이 없으면 None으로 설정
-        if 'PROBABILITY' not in final_df_for_db.columns:
-            final_df_for_db['PROBABILITY'] = None
 
-        print(f"💾 최종 예측 데이터 (모델: {chosen_model_name}):")
-        print(final_df_for_db.head())
-        print(f"DB 저장될 데이터 수: {len(final_df_for_db)}")
+def _timed_out_result(context, task_timeout):
+    final_df_for_db = finalize_forecast_frame(
+        pd.DataFrame({'ds': context['future_dates_fixed'], 'yhat': 0}), None, "Prediction Failed")
+    run_info = {'model': "Prediction Failed", 'mape': None, 'prophet_validation': None,
+                'timings': {'total': task_timeout}, 'timed_out': True}
+    return final_df_for_db, run_info
 
-        update_or_insert_forecasts_db(supabase, cust_id, final_df_for_db, FORECAST_TABLE_NAME,
-                                      forecast_generation_datetime)
 
-        gc.collect()
+def iter_customer_forecasts(customer_groups, context, workers=1, task_timeout=None, max_in_flight=None,
+                            maxtasksperchild=None):
+    """고객별 예측 결과를 (고객 ID, DataFrame, 실행 정보) 순서대로 생성 (workers > 1이면 프로세스 풀 사용)
+
+    task_timeout은 병렬 모드에서만 적용되며, 넘긴 고객은 'Prediction Failed'로 처리하고 풀을 다시 시작한다."""
+    if not len(customer_groups):
+        return  # 학습할 고객이 없으면 풀/Manager 프로세스를 띄우지 않는다
+    from tqdm.auto import tqdm
+
+    if workers <= 1:
+        for cust_id, grp_orders in tqdm(customer_groups, desc="고객별 예측"):
+            yield (cust_id,) + _run_customer_forecast(cust_id, grp_orders, context)
+        return
+
+    print(f"⚙️ 병렬 모드: 워커 {workers}개, 작업당 제한 시간 {task_timeout}초")
+    manager = multiprocessing.Manager()
+    task_starts = manager.dict()
+    tokens = itertools.count()
+
+    def new_pool():
+        return multiprocessing.Pool(processes=workers, initializer=_init_forecast_worker,
+                                    initargs=(context, task_starts), maxtasksperchild=maxtasksperchild)
 
+    def submit(entry):
+        # entry = [토큰, 고객 ID, 주문 데이터, AsyncResult (None이면 이미 제한 시간 초과)]
+        entry[0] = next(tokens)
+        entry[3] = pool.apply_async(_forecast_customer_task, tuple(entry[:3]))
+        return entry
+
+    def elapsed(entry, now):
+        started = task_starts.get(entry[0])
+        return None if started is None else now - started
+
+    pool = new_pool()
+    try:
+        with tqdm(total=len(customer_groups), desc="고객별 예측 (병렬)") as progress:
+            groups = iter(customer_groups)
+            pending = deque()
+            while True:
+                # 제한이 줄었으면 진행 중인 작업이 그 아래로 빠질 때까지 새로 넘기지 않는다.
+                window = (max_in_flight() if callable(max_in_flight) else max_in_flight) or len(customer_groups)
+                while len(pending) < window:
+                    group = next(groups, None)
+                    if group is None:
+                        break
+                    pending.append(submit([None, group[0], group[1], None]))
+                if not pending:
+                    return
+                entry = pending[0]
+                token, cust_id, _, async_result = entry
+                result = None
+                while async_result is not None:
+                    if task_timeout is None:
+                        result = async_result.get()
+                        break
+                    async_result.wait(TASK_POLL_INTERVAL_S)
+                    if async_result.ready():
+                        result = async_result.get()
+                        break
+                    task_elapsed = elapsed(entry, time.time())
+                    if task_elapsed is not None and task_elapsed >= task_timeout:
+                        break
+                pending.popleft()
+                task_starts.pop(token, None)
+
+                if result is None:
+                    print(f"!!! 제한 시간({task_timeout}초) 초과로 예측 실패 처리 (고객 ID: {cust_id})")
+                    result = _timed_out_result(context, task_timeout)
+                    if async_result is not None:
+                        # 멈춘 워커를 종료하고 풀을 새로 띄운다. 끝난 결과는 부모에 이미 있으므로 그대로 두고,
+                        # 끝나지 않은 작업은 (제한 시간을 넘긴 것은 실패 처리) 새 풀에 다시 넘긴다.
+                        now = time.time()
+                        unfinished = [e for e in pending if e[3] is not None and not e[3].ready()]
+                        for e in unfinished:
+                            e_elapsed = elapsed(e, now)
+                            task_starts.pop(e[0], None)
+                            if e_elapsed is not None and e_elapsed >= task_timeout:
+                                e[3] = None
+                        print(f"♻️ 멈춘 워커 정리: 풀을 다시 시작하고 작업 "
+                              f"{sum(e[3] is not None for e in unfinished)}건을 다시 넘깁니다.")
+                        pool.terminate()
+                        pool.join()
+                        pool = new_pool()
+                        for e in unfinished:
+                            if e[3] is not None:
+                                submit(e)
+                progress.update()
+                yield (cust_id,) + tuple(result)
+    finally:
+        # 멈춘 Stan 프로세스가 남지 않도록 종료 (정상 종료 시에도 남은 워커 정리)
+        pool.terminate()
+        pool.join()
+        manager.shutdown()
+
+
+# --- 실행 지표 기록 ---
+class RunMetricsRecorder:
+    """단계별/고객별 실행 지표를 집계해 JSONL 또는 Prometheus textfile 형식으로 저장
+
+    fmt='jsonl'이면 고객 기록({"type": "customer", ...})을 도착하는 대로 한 줄씩 쓰고, 마지막에 실행 요약
+    ({"type": "run", ...}) 한 줄을 덧붙인다. fmt='prom'이면 실행이 끝날 때 node_exporter textfile collector용
+    파일을 원자적으로 쓴다. path가 None이면 파일 없이 요약만 집계한다.
+    profile_top_n > 0이면 가장 느린 N명의 프로파일 요약을 profile_dir에 고객별 텍스트 파일로 저장한다.
+    """
+
+    def __init__(self, path=None, fmt='jsonl', profile_top_n=0, profile_dir=None):
+        if fmt not in ('jsonl', 'prom'):
+            raise ValueError(f"지원하지 않는 실행 지표 형식: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.profile_top_n = profile_top_n
+        self.profile_dir = profile_dir
+        self.model_counts = {}
+        self.customer_stage_seconds = {}
+        self.mape_values = []
+        self._slowest = []  # (소요 시간, 고객 ID, 프로파일) 최소 힙
+        self._file = None
+        if path and fmt == 'jsonl':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, 'w', encoding='utf-8')
+
+    def _write_line(self, record):
+        if self._file is not None:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def record_model(self, model_name, count=1, mape=None):
+        self.model_counts[model_name] = self.model_counts.get(model_name, 0) + count
+        if mape is not None:
+            self.mape_values.append(float(mape))
+
+    def record_customer(self, cust_id, run_info):
+        self.record_model(run_info['model'], mape=run_info.get('mape'))
+        timings = run_info.get('timings', {})
+        for stage, seconds in timings.items():
+            self.customer_stage_seconds[stage] = self.customer_stage_seconds.get(stage, 0.0) + seconds
+
+        keep = max(self.profile_top_n, SLOWEST_CUSTOMERS_REPORTED)
+        entry = (timings.get('total', 0.0), int(cust_id), run_info.get('profile'))
+        if len(self._slowest) < keep:
+            heapq.heappush(self._slowest, entry)
+        elif entry[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+        self._write_line({'type': 'customer', 'customer_id': int(cust_id), 'model': run_info['model'],
+                          'mape': _optional_float(run_info.get('mape')), 'months': run_info.get('months'),
+                          'cache_hit': run_info.get('cache_hit'), 'timed_out': run_info.get('timed_out', False),
+                          'rss_mb': _optional_float(run_info.get('rss_mb')),
+                          'timings': {stage: round(seconds, 4) for stage, seconds in timings.items()}})
+
+    def slowest_customers(self):
+        return [(cust_id, seconds) for seconds, cust_id, _ in sorted(self._slowest, reverse=True)]
+
+    def summary(self, run_metrics):
+        return dict(run_metrics,
+                    models=dict(self.model_counts),
+                    mape_mean=float(np.mean(self.mape_values)) if self.mape_values else None,
+                    customer_stage_seconds=self.customer_stage_seconds,
+                    slowest_customers=self.slowest_customers()[:SLOWEST_CUSTOMERS_REPORTED])
+
+    def _write_profiles(self):
+        profiled = [(seconds, cust_id, profile) for seconds, cust_id, profile in sorted(self._slowest, reverse=True)
+                    if profile][:self.profile_top_n]
+        if not profiled or not self.profile_dir:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        for seconds, cust_id, profile in profiled:
+            with open(os.path.join(self.profile_dir, f"customer_{cust_id}.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"# 고객 ID: {cust_id}, 소요 시간: {seconds:.2f}초\n{profile}")
+        print(f"🔬 가장 느린 고객 {len(profiled)}명의 프로파일 저장: {self.profile_dir}")
+
+    def _prometheus_text(self, summary):
+        def metric(name, help_text, kind, samples):
+            lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+            return lines
+
+        lines = []
+        lines += metric("forecast_stage_seconds", "파이프라인 단계별 소요 시간(초)", "gauge",
+                        [({'stage': stage}, seconds) for stage, seconds in summary['stages'].items()])
+        lines += metric("forecast_customer_stage_seconds_total", "고객별 모델 단계 소요 시간 합계(초)", "gauge",
+                        [({'stage': stage}, seconds) for stage, seconds in summary['customer_stage_seconds'].items()])
+        lines += metric("forecast_customers", "고객 수", "gauge",
+                        [({'group': group}, count) for group, count in summary['customers'].items()])
+        lines += metric("forecast_model_customers", "선택 모델별 고객 수", "gauge",
+                        [({'model': model}, count) for model, count in summary['models'].items()])
+        if summary['mape_mean'] is not None:
+            lines += metric("forecast_mape_mean", "선택 모델 평균 MAPE(%)", "gauge", [({}, summary['mape_mean'])])
+        lines += metric("forecast_db_rows", "저장 결정별 행 수", "gauge",
+                        [({'operation': op}, summary['writer'][op]) for op in ('INSERT', 'UPDATE', 'SKIP',
+                                                                              'failed_rows')])
+        if summary['peak_rss_mb'] is not None:
+            lines += metric("forecast_peak_rss_bytes", "최대 RSS(바이트)", "gauge",
+                            [({}, int(summary['peak_rss_mb'] * 1024 * 1024))])
+        memory = summary.get('memory')
+        if memory:
+            lines += metric("forecast_observed_rss_peak_bytes", "고객별로 관측한 부모+워커 RSS 합계의 최대값(바이트)",
+                            "gauge", [({}, int(memory['peak_rss_mb'] * 1024 * 1024))])
+            lines += metric("forecast_memory_reclaims", "메모리 상한 초과로 회수(GC/저장 버퍼 비우기)한 횟수", "gauge",
+                            [({}, memory['reclaims'])])
+        lines += metric("forecast_last_run_timestamp_seconds", "마지막 실행 종료 시각", "gauge", [({}, time.time())])
+        return '\n'.join(lines) + '\n'
+
+    def close(self, run_metrics):
+        """실행 요약을 기록하고 파일을 닫은 뒤 요약 dict를 반환"""
+        summary = self.summary(run_metrics)
+        if self.fmt == 'jsonl':
+            self._write_line(dict(summary, type='run'))
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        elif self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self._prometheus_text(summary))
+            os.replace(tmp_path, self.path)
+        if self.path:
+            print(f"📝 실행 지표 저장: {self.path} ({self.fmt})")
+        self._write_profiles()
+        return summary
+
+
+# --- 실행 계획 (--dry-run) ---
+def _estimate_prophet_validation_fits(span_days, settings):
+    """히스토리 길이(일)로 Prophet 검증 재학습 횟수를 추정 (generate_cutoffs와 같은 규칙)"""
+    if settings.get('strategy', 'cv') == 'holdout':
+        return 1
+    usable = span_days - CV_HORIZON_D_PROPHET - CV_PERIOD_D_PROPHET * 3
+    cutoffs = int(usable // CV_PERIOD_D_PROPHET) + 1 if usable >= 0 else 0
+    return min(cutoffs, settings['max_cutoffs']) if settings.get('max_cutoffs') else cutoffs
+
+
+def plan_forecast_run(orders, customer_ids, future_dates_fixed, baseline_mape_threshold, prophet_validation,
+                      workers=1):
+    """모델을 학습하지 않고 예측 대상 A그룹 고객(customer_ids)을 데이터 부족/계절성 naive/정밀 예측으로 나누고
+    예상 작업량을 반환 (Prophet/ARIMA 학습 횟수, 고객당 PLAN_SECONDS_PER_CUSTOMER초 기준 예상 소요 시간)"""
+    insufficient, candidates = split_insufficient_customers(orders, customer_ids)
+    months = orders.loc[orders['CUSTOMER_ID'].isin(candidates)].groupby('CUSTOMER_ID', observed=True)[
+        'MONTH_TS'].agg(['min', 'max'])
+    baseline_ids = {cust_id for cust_id, _, _ in score_baseline_customers(orders, candidates, future_dates_fixed,
+                                                                         baseline_mape_threshold)}
+    fit_months = months.loc[[cust_id for cust_id in candidates if cust_id not in baseline_ids]]
+    # 고객마다 Prophet 전체 학습 1회 + 검증 재학습, ARIMA 차수 탐색 1회 + 최종 학습 1회
+    prophet_fits = sum(1 + _estimate_prophet_validation_fits(span.days, prophet_validation)
+                       for span in fit_months['max'] - fit_months['min'])
+    return {
+        'insufficient': len(insufficient),
+        'baseline': len(baseline_ids),
+        'fit': len(fit_months),
+        'prophet_fits': prophet_fits,
+        'arima_fits': 2 * len(fit_months),
+        'estimated_seconds': len(fit_months) * PLAN_SECONDS_PER_CUSTOMER / max(workers, 1),
+    }
+
+
+# --- 메인 파이프라인 ---
+@dataclass
+class PipelineSettings:
+    """run_monthly_forecast_pipeline() 실행 옵션 (기본값은 환경 변수 기반 전역 설정, CLI에서는 from_args()로 생성)"""
+
+    workers: int = FORECAST_WORKERS
+    task_timeout: float = FORECAST_TASK_TIMEOUT_S
+    full_refit: bool = False
+    state_dir: str = FORECAST_STATE_DIR
+    prophet_validation: dict = None
+    verbose: bool = None
+    metrics_path: str = FORECAST_METRICS_PATH
+    metrics_format: str = FORECAST_METRICS_FORMAT
+    profile_top_n: int = FORECAST_PROFILE_TOP_N
+    baseline_mape_threshold: float = BASELINE_MAPE_THRESHOLD
+    shard: tuple = (0, 1)
+    resume: bool = True
+    use_snapshot: bool = FORECAST_SNAPSHOT
+    dry_run: bool = False
+    memory_limit_mb: int = FORECAST_MEMORY_LIMIT_MB
+
+    def __post_init__(self):
+        if self.prophet_validation is None:
+            self.prophet_validation = {'strategy': PROPHET_VALIDATION, 'parallel': PROPHET_CV_PARALLEL,
+                                       'max_cutoffs': PROPHET_CV_MAX_CUTOFFS}
+
+    @classmethod
+    def from_args(cls, args):
+        """parse_args() 결과로 설정 생성"""
+        return cls(workers=args.workers, task_timeout=args.task_timeout, full_refit=args.full,
+                   prophet_validation={'strategy': args.prophet_validation,
+                                       'parallel': None if args.cv_parallel == "none" else args.cv_parallel,
+                                       'max_cutoffs': args.cv_max_cutoffs},
+                   verbose=args.verbose, metrics_path=args.metrics_out, metrics_format=args.metrics_format,
+                   profile_top_n=args.profile_top, baseline_mape_threshold=args.baseline_mape_threshold,
+                   shard=args.shard, resume=not args.no_resume, use_snapshot=args.snapshot,
+                   dry_run=args.dry_run, memory_limit_mb=args.memory_limit_mb)
+
+
+def run_monthly_forecast_pipeline(settings=None, backend=None, client=None, http_io=None):
+    """settings(PipelineSettings, 없으면 기본값)대로 월별 예측을 실행하고 실행 지표 dict를 반환
+
+    backend를 지정하지 않으면 Supabase 예측 테이블에 저장한다 (로컬 테스트 시 SQLiteForecastBackend 사용).
+    client를 넘기면 Supabase 대신 해당 클라이언트에서 원천 데이터를 읽는다 (벤치마크용 합성 데이터 등).
+    http_io(AsyncPostgrestIO)를 넘기면 로딩/저장을 비동기 HTTP 계층으로 수행하고 (페이지 동시 조회, upsert 청크
+    동시 전송), 저장은 별도 스레드가 FORECAST_WRITE_QUEUE_SIZE 크기의 큐로 받아 예측과 겹쳐서 진행한다.
+    http_io를 닫는 것은 호출한 쪽의 책임이다.
+    실행 지표에는 단계별 소요 시간(초), 고객 수, 저장 통계, 선택 모델, 최대 메모리가 담긴다
+    (settings.dry_run이면 plan_forecast_run()의 예상 작업량).
+    """
+    settings = settings or PipelineSettings()
+    global FORECAST_VERBOSE
+    if settings.verbose is not None:
+        FORECAST_VERBOSE = settings.verbose
+    stage_seconds = {}
+    supabase = client or create_supabase_client()
+    if not supabase: return
+
+    if settings.use_snapshot and not SNAPSHOT_AVAILABLE:
+        print("⚠️ pyarrow가 설치되어 있지 않아 로컬 스냅샷 없이 전체 데이터를 로딩합니다.")
+    if settings.use_snapshot and SNAPSHOT_AVAILABLE:
+        # 스냅샷 경로는 전처리(추가분만)까지 함께 수행하므로 'load' 단계에 모두 포함된다.
+        with _timed_stage(stage_seconds, 'load'):
+            orders, activities_df = DataSnapshot(os.path.join(settings.state_dir, SNAPSHOT_DIR_NAME)).load(
+                supabase, http_io=http_io)
+        if orders is None or orders.empty:
+            print("주문 데이터가 없어 파이프라인을 종료합니다.")
+            return
+    else:
+        with _timed_stage(stage_seconds, 'load'):
+            orders, activities_df = load_data_from_supabase(supabase, http_io=http_io)
+        if orders is None or orders.empty:
+            print("주문 데이터가 없어 파이프라인을 종료합니다.")
+            return
+
+        with _timed_stage(stage_seconds, 'preprocess'):
+            orders, activities_df = preprocess_data(orders, activities_df)
+    # 로딩에 성공한 뒤에 만들어야 조기 종료 시 지표 파일이 열린 채 남지 않는다.
+    recorder = RunMetricsRecorder(None if settings.dry_run else settings.metrics_path, settings.metrics_format,
+                                  settings.profile_top_n, os.path.join(settings.state_dir, PROFILE_DIR_NAME))
+    forecast_generation_datetime = datetime.now()
+    future_start_date = pd.to_datetime(date.today()).to_period("M").to_timestamp()
+    future_dates_fixed = pd.date_range(start=future_start_date, periods=BASE_FUTURE, freq="MS")
+
+    # --- 1. 이벤트 예측 모델 학습 ---
+    if not settings.dry_run:
+        with _timed_stage(stage_seconds, 'event_features'):
+            X_train, y_train, training_df_full = create_event_features(orders, activities_df)
+        with _timed_stage(stage_seconds, 'event_model'):
+            event_model = train_event_model(X_train, y_train)
+
+    # --- 2. B그룹(특별 관리) 분류 ---
+    classify_started = time.perf_counter()
+    print("\n📊 '특별 관리 고객(B그룹)' 분류 중...")
+    customer_first_order = orders.groupby('CUSTOMER_ID', observed=True)['MONTH_TS'].min()
+    customer_active_months = orders.groupby('CUSTOMER_ID', observed=True)['MONTH_TS'].nunique()
+    current_month_period = pd.to_datetime(date.today()).to_period('M')
+    total_lifespan_months = ((current_month_period.year - customer_first_order.dt.year) * 12 + (
+                current_month_period.month - customer_first_order.dt.month) + 1).fillna(0)
+    total_lifespan_months[total_lifespan_months <= 0] = 1
+    active_ratio = (customer_active_months / total_lifespan_months).fillna(0)
+    INACTIVITY_RATIO_THRESHOLD = 0.90
+    group_b_customer_ids = set(active_ratio[active_ratio <= (1 - INACTIVITY_RATIO_THRESHOLD)].index)
+    print(f"✅ 분류 완료: 총 {len(group_b_customer_ids)}명의 고객이 특별 관리 그룹(B그룹)으로 분류되었습니다.")
+
+    # B그룹 고객의 과거 대량 주문 평균액 계산
+    large_order_threshold = orders['SALES_AMOUNT'].quantile(0.75)
+    avg_large_order_amount = orders[orders['SALES_AMOUNT'] >= large_order_threshold].groupby('CUSTOMER_ID', observed=True)[
+        'SALES_AMOUNT'].mean()
+
+    stage_seconds['classify'] = time.perf_counter() - classify_started
+
+    with _timed_stage(stage_seconds, 'activity_features'):
+        potential_regressors = build_potential_regressors(activities_df)
+        activity_features = ActivityFeatureMatrix.build(activities_df, potential_regressors)
+
+    model_cache = ModelCache(os.path.join(settings.state_dir, MODEL_CACHE_DIR_NAME))
+    context = {
+        'activity_features': activity_features,
+        'potential_regressors': potential_regressors,
+        'future_start_date': future_start_date,
+        'future_dates_fixed': future_dates_fixed,
+        'model_cache': model_cache,
+        'prophet_validation': settings.prophet_validation,
+        'verbose': FORECAST_VERBOSE,
+        'profile': settings.profile_top_n > 0,
+    }
+
+    # --- 3. 증분 모드: 데이터가 바뀌지 않은 A그룹 고객은 모델 학습 생략 ---
+    with _timed_stage(stage_seconds, 'fingerprints'):
+        config_key = forecast_config_key(potential_regressors, settings.baseline_mape_threshold,
+                                         settings.prophet_validation)
+        fingerprints = compute_customer_fingerprints(orders, activities_df, future_start_date, config_key)
+    if settings.shard[1] > 1:
+        fingerprints = {cust_id: fp for cust_id, fp in fingerprints.items()
+                        if customer_shard(cust_id, settings.shard[1]) == settings.shard[0]}
+        print(f"🧩 샤드 {settings.shard[0]}/{settings.shard[1]}: 고객 {len(fingerprints)}명 담당")
+    fingerprint_file = shard_file_name(FINGERPRINT_FILE_NAME, settings.shard)
+    previous_fingerprints = {} if settings.full_refit else load_fingerprints(settings.state_dir, fingerprint_file)
+    unchanged_customer_ids = {cust_id for cust_id, fp in fingerprints.items()
+                              if cust_id not in group_b_customer_ids and previous_fingerprints.get(cust_id) == fp}
+    if settings.full_refit:
+        print("🔁 전체 재학습 모드(--full): 모든 고객을 다시 예측합니다.")
+    else:
+        print(f"🔁 증분 모드: 변경 없는 A그룹 고객 {len(unchanged_customer_ids)}명 건너뜀, "
+              f"예측 대상 {len(fingerprints) - len(unchanged_customer_ids)}명")
+
+    # 중단된 이전 실행에서 이미 저장까지 끝난 A그룹 고객은 이어서 건너뛴다.
+    checkpoint = RunCheckpoint(os.path.join(settings.state_dir, shard_file_name(CHECKPOINT_FILE_NAME, settings.shard)))
+    if not settings.resume and not settings.dry_run:
+        checkpoint.clear()
+    checkpointed = checkpoint.load()
+    resumed_customer_ids = {cust_id for cust_id, fp in checkpointed.items()
+                            if cust_id not in group_b_customer_ids and cust_id not in unchanged_customer_ids and
+                            fingerprints.get(cust_id) == fp}
+    if resumed_customer_ids:
+        print(f"⏯️  체크포인트에서 재개: 이전 실행에서 완료된 A그룹 고객 {len(resumed_customer_ids)}명 건너뜀")
+    target_customer_ids = [cust_id for cust_id in customer_first_order.index
+                           if cust_id in fingerprints and cust_id not in unchanged_customer_ids and
+                           cust_id not in resumed_customer_ids and cust_id not in group_b_customer_ids]
+    group_b_in_orders = [cust_id for cust_id in customer_first_order.index
+                         if cust_id in group_b_customer_ids and int(cust_id) in fingerprints]
+
+    if settings.dry_run:
+        with _timed_stage(stage_seconds, 'plan'):
+            plan = plan_forecast_run(orders, target_customer_ids, future_dates_fixed, settings.baseline_mape_threshold,
+                                     settings.prophet_validation, workers=settings.workers)
+        modeling_loaded = sorted(name for name in MODELING_MODULES if name in sys.modules)
+        print(f"📝 실행 계획 (--dry-run): 고객 {len(fingerprints)}명 = B그룹 {len(group_b_in_orders)}명 + "
+              f"A그룹 {len(fingerprints) - len(group_b_in_orders)}명 (변경 없음 {len(unchanged_customer_ids)}명, "
+              f"체크포인트 재개 {len(resumed_customer_ids)}명)")
+        print(f"   예측 대상 A그룹 {len(target_customer_ids)}명: 데이터 부족 {plan['insufficient']}명, "
+              f"계절성 naive {plan['baseline']}명, 정밀 예측(Prophet/ARIMA) {plan['fit']}명")
+        print(f"   예상 작업량: Prophet 학습 {plan['prophet_fits']}회, ARIMA 학습 {plan['arima_fits']}회, "
+              f"약 {plan['estimated_seconds'] / 60:.1f}분 (워커 {max(settings.workers, 1)}개, "
+              f"고객당 {PLAN_SECONDS_PER_CUSTOMER:g}초 기준)")
+        print(f"   모듈 import {MODULE_IMPORT_SECONDS:.2f}초, 모델링 라이브러리 로딩: "
+              f"{', '.join(modeling_loaded) if modeling_loaded else '없음'}")
+        return {
+            'stages': stage_seconds,
+            'customers': {'total': len(fingerprints), 'group_a': len(fingerprints) - len(group_b_in_orders),
+                          'group_b': len(group_b_in_orders), 'skipped': len(unchanged_customer_ids),
+                          'resumed': len(resumed_customer_ids)},
+            'plan': plan,
+            'import_seconds': MODULE_IMPORT_SECONDS,
+            'modeling_modules_loaded': modeling_loaded,
+            'peak_rss_mb': _peak_rss_mb(),
+        }
+
+    if backend is None:
+        backend = (AsyncPostgrestForecastBackend(http_io, FORECAST_TABLE_NAME) if http_io is not None else
+                   SupabaseForecastBackend(supabase, FORECAST_TABLE_NAME))
+    # 마지막 데이터가 이번 달인 고객의 ARIMA 예측은 다음 달부터 시작하므로 한 달 더 넓게 조회한다.
+    existing_range = (future_dates_fixed.min().strftime('%Y-%m-%d'),
+                      (future_dates_fixed.max() + relativedelta(months=1)).strftime('%Y-%m-%d'))
+    with _timed_stage(stage_seconds, 'prefetch'):
+        try:
+            existing_forecasts = prefetch_existing_forecasts(backend, *existing_range)
+        except Exception as e:
+            print(f"!!! 기존 예측 데이터 일괄 조회 실패, 고객 묶음 단위 조회로 전환합니다: {e}")
+            existing_forecasts = None
+
+    completed_customer_ids = set()
+
+    def record_checkpoint(saved_customer_ids):
+        checkpoint.record({cust_id: fingerprints[cust_id] for cust_id in saved_customer_ids
+                           if cust_id in completed_customer_ids})
+
+    writer = ForecastBulkWriter(backend, forecast_generation_datetime, existing=existing_forecasts,
+                                existing_range=existing_range, on_flush=record_checkpoint,
+                                queue_size=FORECAST_WRITE_QUEUE_SIZE if http_io is not None else 0)
+
+    # --- 4. 그룹 B: 이벤트 예측 (전체 고객 일괄 계산) ---
+    print(f"➡️  그룹 B (이벤트 예측): {len(group_b_in_orders)}명 일괄 예측 중...")
+    with _timed_stage(stage_seconds, 'group_b'):
+        for cust_id, final_df_for_db in score_group_b_customers(group_b_in_orders, training_df_full, event_model,
+                                                                avg_large_order_amount, future_dates_fixed):
+            writer.add(cust_id, final_df_for_db)
+            recorder.record_model(final_df_for_db['PREDICTION_MODEL'].iloc[0])
+    del X_train, y_train, training_df_full, event_model  # B그룹 전용 데이터는 A그룹 루프 동안 들고 있지 않는다
+
+    # --- 5. 그룹 A: 데이터 부족 고객과 1단계 계절성 naive (전체 고객 일괄 계산) ---
+    with _timed_stage(stage_seconds, 'baseline'):
+        # MIN_MONTHS개월 미만 고객은 모델 없이 'Data Insufficient' 결과를 바로 저장한다 (워커로 보내지 않음).
+        insufficient_customer_ids, candidate_customer_ids = split_insufficient_customers(orders, target_customer_ids)
+        for cust_id in insufficient_customer_ids:
+            completed_customer_ids.add(int(cust_id))
+            writer.add(cust_id, insufficient_forecast_frame(future_dates_fixed))
+            recorder.record_model("Data Insufficient")
+        baseline_results = score_baseline_customers(orders, candidate_customer_ids, future_dates_fixed,
+                                                    settings.baseline_mape_threshold)
+        for cust_id, final_df_for_db, baseline_mape in baseline_results:
+            completed_customer_ids.add(int(cust_id))
+            writer.add(cust_id, final_df_for_db)
+            recorder.record_model(BASELINE_MODEL_NAME, mape=baseline_mape)
+    if settings.baseline_mape_threshold > 0:
+        print(f"⚡ 1단계 계절성 naive: {len(baseline_results)}명 (MAPE ≤ {settings.baseline_mape_threshold:g}%) "
+              f"Prophet/ARIMA 생략, {len(candidate_customer_ids) - len(baseline_results)}명 정밀 예측")
+    if insufficient_customer_ids:
+        print(f"📭 데이터 부족 ({MIN_MONTHS}개월 미만): {len(insufficient_customer_ids)}명 모델 학습 없이 저장")
+    baseline_customer_ids = {cust_id for cust_id, _, _ in baseline_results}
+    fit_customer_ids = [cust_id for cust_id in candidate_customer_ids if cust_id not in baseline_customer_ids]
+    with _timed_stage(stage_seconds, 'partition'):
+        if settings.memory_limit_mb > 0:
+            customer_groups = CustomerSeriesPartitions.build(orders, fit_customer_ids)
+            print(f"🧠 메모리 상한 모드 ({settings.memory_limit_mb:,}MB): 고객 {len(customer_groups)}명의 월 매출 "
+                  f"{customer_groups.nbytes / 1024:,.0f}KB로 분할, 원본 주문/활동 데이터 해제")
+        else:
+            fit_customer_set = set(fit_customer_ids)
+            customer_groups = [(cust_id, grp_orders)
+                               for cust_id, grp_orders in orders.groupby("CUSTOMER_ID", observed=True)
+                               if cust_id in fit_customer_set]
+    # 이후로는 고객별 입력(customer_groups)과 활동 행렬(context)만 쓰므로 원본 데이터는 해제한다.
+    del orders, activities_df
+    bounded = settings.memory_limit_mb > 0
+    memory_guard = MemoryGuard(settings.memory_limit_mb, settings.workers,
+                               max_in_flight=settings.workers * MEMORY_BOUNDED_IN_FLIGHT_PER_WORKER)
+
+    # --- 6. 그룹 A: 시계열 예측 (고객별) ---
+    validation_metrics = {'strategy': settings.prophet_validation['strategy'], 'customers': 0, 'fits': 0,
+                          'seconds': 0.0}
+    if customer_groups:
+        # 데이터 부족/계절성 naive 고객을 뺀 뒤 실제로 학습할 고객이 남았을 때만 prophet/pmdarima를 로딩한다 (fork된 병렬 워커도 그대로 물려받음).
+        with _timed_stage(stage_seconds, 'import_modeling'):
+            load_modeling_stack()
+    with _timed_stage(stage_seconds, 'group_a'):
+        for cust_id, final_df_for_db, run_info in iter_customer_forecasts(
+                customer_groups, context, workers=settings.workers, task_timeout=settings.task_timeout,
+                max_in_flight=memory_guard.in_flight_limit if bounded else None,
+                maxtasksperchild=MEMORY_BOUNDED_TASKS_PER_CHILD if bounded else None):
+            # DB 저장은 항상 부모 프로세스에서 수행 (저장이 끝난 완료 고객은 체크포인트에 기록됨)
+            if run_info['model'] != "Prediction Failed":
+                completed_customer_ids.add(int(cust_id))
+            writer.add(cust_id, final_df_for_db)
+            recorder.record_customer(cust_id, run_info)
+            if run_info.get('prophet_validation'):
+                validation_metrics['customers'] += 1
+                validation_metrics['fits'] += run_info['prophet_validation']['fits']
+                validation_metrics['seconds'] += run_info['prophet_validation']['seconds']
+            # 매 고객마다 전체 GC를 돌리지 않고, 상한을 넘었을 때만 (넘은 뒤에는 RSS가 더 늘었을 때만) 저장 버퍼를
+            # 비우고 회수한다. 회수로 부족하면 워커에 넘기는 고객 수를 줄인다.
+            memory_guard.observe(run_info, on_pressure=writer.flush)
+    writer.close()
+    # 저장 시간은 그룹 A/B 단계에도 포함되어 있으므로 따로 뺀 값을 함께 기록한다.
+    stage_seconds['write'] = writer.stats['seconds']
+    stage_seconds['db_read'] = stage_seconds['prefetch'] + writer.stats['read_seconds']
+    stage_seconds['db_write'] = writer.stats['upsert_seconds']
+
+    # 저장에 성공한 고객만 지문을 갱신 (실패/미저장 고객은 다음 실행에서 다시 예측)
+    new_fingerprints = {cust_id: fp for cust_id, fp in previous_fingerprints.items()
+                        if cust_id in unchanged_customer_ids}
+    for cust_id in (completed_customer_ids - writer.failed_customers) | resumed_customer_ids:
+        new_fingerprints[cust_id] = fingerprints[cust_id]
+    save_fingerprints(new_fingerprints, settings.state_dir, fingerprint_file)
+    checkpoint.clear()
+    evicted = model_cache.evict()
+    if evicted:
+        print(f"🧹 모델 캐시 정리: {evicted}개 항목 제거")
+
+    print(f"📈 Prophet 검증 ({validation_metrics['strategy']}): 고객 {validation_metrics['customers']}명, "
+          f"재학습 {validation_metrics['fits']}회, {validation_metrics['seconds']:.1f}초")
+    summary = recorder.close({
+        'stages': stage_seconds,
+        'customers': {'total': len(fingerprints),
+                      'group_a': len(customer_groups) + len(baseline_results) + len(insufficient_customer_ids),
+                      'group_a_baseline': len(baseline_results),
+                      'group_a_insufficient': len(insufficient_customer_ids), 'group_b': len(group_b_in_orders),
+                      'skipped': len(unchanged_customer_ids), 'resumed': len(resumed_customer_ids)},
+        'writer': dict(writer.stats),
+        'peak_rss_mb': _peak_rss_mb(),
+        'memory': memory_guard.stats(),
+        'import_seconds': MODULE_IMPORT_SECONDS,
+        'prophet_validation': validation_metrics,
+    })
+    slowest = ', '.join(f"{cust_id}({seconds:.1f}초)" for cust_id, seconds in summary['slowest_customers'])
+    print("⏱️  단계별 소요 시간: " + ', '.join(f"{stage} {seconds:.1f}초" for stage, seconds in stage_seconds.items()))
+    if slowest:
+        print(f"🐢 가장 느린 고객: {slowest}")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="월별 주문 예측 파이프라인")
+    parser.add_argument("--full", action="store_true", help="데이터 변경 여부와 관계없이 모든 고객을 다시 학습")
+    parser.add_argument("--workers", type=int, default=FORECAST_WORKERS, help="병렬 워커 수 (1이면 직렬 실행)")
+    parser.add_argument("--task-timeout", type=float, default=FORECAST_TASK_TIMEOUT_S,
+                        help="고객 1명당 최대 실행 시간(초). --workers 2 이상일 때만 적용 (직렬 실행은 제한 없음)")
+    parser.add_argument("--prophet-validation", choices=["cv", "holdout"], default=PROPHET_VALIDATION,
+                        help="Prophet MAPE 계산 방식 (cv: 교차 검증, holdout: ARIMA와 같은 마지막 구간 홀드아웃)")
+    parser.add_argument("--cv-parallel", choices=["none", "threads", "processes"],
+                        default=PROPHET_CV_PARALLEL or "none", help="Prophet 교차 검증 컷오프 병렬 처리 방식")
+    parser.add_argument("--cv-max-cutoffs", type=int, default=PROPHET_CV_MAX_CUTOFFS,
+                        help="교차 검증에 사용할 최근 컷오프 최대 개수 (0이면 전체)")
+    parser.add_argument("--baseline-mape-threshold", type=float, default=BASELINE_MAPE_THRESHOLD,
+                        help="계절성 naive 홀드아웃 MAPE(%%)가 이 값 이하면 Prophet/ARIMA 생략 (0이면 사용 안 함)")
+    parser.add_argument("--shard", type=parse_shard, default=(0, 1), metavar="i/N",
+                        help="CUSTOMER_ID 해시 기준 N개 샤드 중 i번(0부터)만 예측 (여러 러너로 나눠 실행)")
+    parser.add_argument("--snapshot", action=argparse.BooleanOptionalAction, default=FORECAST_SNAPSHOT,
+                        help="로컬 데이터 스냅샷 + 추가분만 로딩 (기존 행 수정은 전체 갱신 주기가 지나야 반영)")
+    parser.add_argument("--async-io", action="store_true", default=FORECAST_ASYNC_IO,
+                        help="PostgREST를 비동기로 직접 호출 (연결 풀/동시 조회/재시도, 저장을 예측과 겹쳐서 실행)")
+    parser.add_argument("--memory-limit-mb", type=int, default=FORECAST_MEMORY_LIMIT_MB,
+                        help="메모리 상한 모드: 고객별 입력을 미리 분할하고 RSS가 이 값(MB)을 넘으면 메모리 회수 및 "
+                             "동시 작업 수 축소 (소프트 임계값, 0이면 끔)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="모델 학습/DB 저장 없이 고객 분류(A/B/데이터 부족)와 예상 작업량만 출력")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="중단된 이전 실행의 체크포인트를 무시하고 처음부터 다시 예측")
+    parser.add_argument("--verbose", action="store_true", default=FORECAST_VERBOSE,
+                        help="고객별 모델링 과정과 행별 저장 결정을 모두 출력")
+    parser.add_argument("--metrics-out", default=FORECAST_METRICS_PATH, help="실행 지표 저장 경로")
+    parser.add_argument("--metrics-format", choices=["jsonl", "prom"], default=FORECAST_METRICS_FORMAT,
+                        help="실행 지표 형식 (jsonl: 고객별 기록 + 요약, prom: Prometheus textfile)")
+    parser.add_argument("--profile-top", type=int, default=FORECAST_PROFILE_TOP_N,
+                        help="가장 느린 N명의 cProfile 결과 저장 (0이면 사용 안 함)")
+    return parser.parse_args(argv)
+
+
+MODULE_IMPORT_SECONDS = time.perf_counter() - _MODULE_IMPORT_STARTED
 
 if __name__ == '__main__':
     if sys.platform.startswith('win'):
         multiprocessing.freeze_support()
 
-    print("🚀 월별 주문 예측 파이프라인 시작...")
+    args = parse_args()
+    print(f"🚀 월별 주문 예측 파이프라인 시작... (모듈 import {MODULE_IMPORT_SECONDS:.2f}초)")
+    check_import_budget()
+    http_io = AsyncPostgrestIO(SUPABASE_URL, SUPABASE_KEY) if args.async_io else None
     try:
-        run_monthly_forecast_pipeline()
+        run_monthly_forecast_pipeline(PipelineSettings.from_args(args), http_io=http_io)
     except Exception as e:
         print(f"!!! 월별 주문 예측 파이프라인 실행 중 치명적인 오류 발생: {e}")
         import traceback
 
         traceback.print_exc()
+    finally:
+        if http_io is not None:
+            http_io.close()
 
     print("🏁 월별 주문 예측 파이프라인 종료.")
@@ -0,0 +1,182 @@
+"""예측 결과 테이블 저장소 (Supabase, 로컬 SQLite, 비동기 PostgREST)
+
+세 저장소 모두 fetch_existing(), fetch_existing_page(), upsert(), insert(), update()를 제공하며
+forecast.ForecastBulkWriter가 이 인터페이스로 기존 예측을 조회하고 새 예측을 저장한다.
+upsert()는 (CUSTOMER_ID, PREDICTED_DATE) 유니크 제약이 필요하다 (supabase/migrations 참고). 제약이 없는 테이블에서는
+PostgREST가 42P10 오류를 돌려주며, 이때 ForecastBulkWriter는 insert()/update()로 나눠 저장한다.
+"""
+import asyncio
+import sqlite3
+from typing import TYPE_CHECKING
+
+import pandas as pd
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+FORECAST_TABLE_NAME = "customer_order_forecast"
+# on_conflict 열에 맞는 유니크 제약이 없을 때 PostgreSQL/PostgREST 오류 코드
+MISSING_CONFLICT_CONSTRAINT_CODE = "42P10"
+
+
+def is_missing_conflict_constraint(error):
+    """upsert 실패가 (CUSTOMER_ID, PREDICTED_DATE) 유니크 제약이 없어서인지 (supabase APIError, PostgrestRequestError)"""
+    return getattr(error, 'code', None) == MISSING_CONFLICT_CONSTRAINT_CODE
+
+
+class SupabaseForecastBackend:
+    """Supabase(PostgREST) 예측 테이블 저장소. upsert()는 (CUSTOMER_ID, PREDICTED_DATE) 유니크 제약이 필요하다."""
+
+    def __init__(self, client: "Client", table_name=FORECAST_TABLE_NAME):
+        self.client = client
+        self.table_name = table_name
+        self.request_count = 0
+
+    def fetch_existing(self, customer_ids, min_date, max_date):
+        self.request_count += 1
+        response = self.client.table(self.table_name).select('CUSTOMER_ID, PREDICTED_DATE, MAPE').in_(
+            'CUSTOMER_ID', [int(c) for c in customer_ids]).gte('PREDICTED_DATE', min_date).lte(
+            'PREDICTED_DATE', max_date).execute()
+        return response.data or []
+
+    def fetch_existing_page(self, min_date, max_date, offset, limit):
+        self.request_count += 1
+        response = self.client.table(self.table_name).select('CUSTOMER_ID, PREDICTED_DATE, MAPE').gte(
+            'PREDICTED_DATE', min_date).lte('PREDICTED_DATE', max_date).order('CUSTOMER_ID').order(
+            'PREDICTED_DATE').range(offset, offset + limit - 1).execute()
+        return response.data or []
+
+    def upsert(self, rows):
+        self.request_count += 1
+        self.client.table(self.table_name).upsert(rows, on_conflict='CUSTOMER_ID,PREDICTED_DATE').execute()
+
+    def insert(self, rows):
+        self.request_count += 1
+        self.client.table(self.table_name).insert(rows).execute()
+
+    def update(self, rows):
+        """행마다 (CUSTOMER_ID, PREDICTED_DATE)가 같은 기존 행을 갱신"""
+        for row in rows:
+            self.request_count += 1
+            self.client.table(self.table_name).update(row).eq('CUSTOMER_ID', row['CUSTOMER_ID']).eq(
+                'PREDICTED_DATE', row['PREDICTED_DATE']).execute()
+
+
+class SQLiteForecastBackend:
+    """오프라인 테스트/벤치마크용 로컬 저장소. path=':memory:'이면 메모리에만 저장한다.
+
+    ForecastBulkWriter(queue_size > 0)의 저장 스레드에서도 쓸 수 있도록 연결을 스레드 간에 공유한다
+    (저장 중에는 저장 스레드만 연결을 쓴다).
+    """
+
+    def __init__(self, path=':memory:', table_name=FORECAST_TABLE_NAME):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.table_name = table_name
+        self.request_count = 0
+        self.conn.execute(
+            f'CREATE TABLE IF NOT EXISTS "{table_name}" ('
+            '"CUSTOMER_ID" INTEGER NOT NULL, "PREDICTED_DATE" TEXT NOT NULL, "PREDICTED_QUANTITY" REAL, '
+            '"MAPE" REAL, "PREDICTION_MODEL" TEXT, "PROBABILITY" REAL, "FORECAST_GENERATION_DATETIME" TEXT, '
+            'PRIMARY KEY ("CUSTOMER_ID", "PREDICTED_DATE"))')
+
+    def fetch_existing(self, customer_ids, min_date, max_date):
+        self.request_count += 1
+        customer_ids = [int(c) for c in customer_ids]
+        placeholders = ','.join('?' * len(customer_ids))
+        cursor = self.conn.execute(
+            f'SELECT "CUSTOMER_ID", "PREDICTED_DATE", "MAPE" FROM "{self.table_name}" '
+            f'WHERE "CUSTOMER_ID" IN ({placeholders}) AND "PREDICTED_DATE" BETWEEN ? AND ?',
+            customer_ids + [min_date, max_date])
+        return [dict(zip(('CUSTOMER_ID', 'PREDICTED_DATE', 'MAPE'), row)) for row in cursor.fetchall()]
+
+    def fetch_existing_page(self, min_date, max_date, offset, limit):
+        self.request_count += 1
+        cursor = self.conn.execute(
+            f'SELECT "CUSTOMER_ID", "PREDICTED_DATE", "MAPE" FROM "{self.table_name}" '
+            f'WHERE "PREDICTED_DATE" BETWEEN ? AND ? ORDER BY "CUSTOMER_ID", "PREDICTED_DATE" LIMIT ? OFFSET ?',
+            (min_date, max_date, limit, offset))
+        return [dict(zip(('CUSTOMER_ID', 'PREDICTED_DATE', 'MAPE'), row)) for row in cursor.fetchall()]
+
+    def upsert(self, rows):
+        self.request_count += 1
+        columns = list(rows[0].keys())
+        quoted = ', '.join(f'"{c}"' for c in columns)
+        updates = ', '.join(f'"{c}" = excluded."{c}"' for c in columns if c not in ('CUSTOMER_ID', 'PREDICTED_DATE'))
+        with self.conn:
+            self.conn.executemany(
+                f'INSERT INTO "{self.table_name}" ({quoted}) VALUES ({", ".join("?" * len(columns))}) '
+                f'ON CONFLICT ("CUSTOMER_ID", "PREDICTED_DATE") DO UPDATE SET {updates}',
+                [tuple(row[c] for c in columns) for row in rows])
+
+    def insert(self, rows):
+        self.request_count += 1
+        columns = list(rows[0].keys())
+        quoted = ', '.join(f'"{c}"' for c in columns)
+        with self.conn:
+            self.conn.executemany(
+                f'INSERT INTO "{self.table_name}" ({quoted}) VALUES ({", ".join("?" * len(columns))})',
+                [tuple(row[c] for c in columns) for row in rows])
+
+    def update(self, rows):
+        self.request_count += 1
+        columns = [c for c in rows[0].keys() if c not in ('CUSTOMER_ID', 'PREDICTED_DATE')]
+        assignments = ', '.join(f'"{c}" = ?' for c in columns)
+        with self.conn:
+            self.conn.executemany(
+                f'UPDATE "{self.table_name}" SET {assignments} WHERE "CUSTOMER_ID" = ? AND "PREDICTED_DATE" = ?',
+                [tuple(row[c] for c in columns) + (row['CUSTOMER_ID'], row['PREDICTED_DATE']) for row in rows])
+
+    def fetch_all(self):
+        return pd.read_sql_query(f'SELECT * FROM "{self.table_name}"', self.conn)
+
+
+class AsyncPostgrestForecastBackend:
+    """AsyncPostgrestIO를 쓰는 예측 테이블 저장소. SupabaseForecastBackend와 같은 메서드에 더해
+    여러 upsert 청크를 동시에 보내는 upsert_many()를 제공한다."""
+
+    def __init__(self, http_io, table_name=FORECAST_TABLE_NAME):
+        self.http_io = http_io
+        self.table_name = table_name
+
+    @property
+    def request_count(self):
+        return self.http_io.request_count
+
+    def _select(self, params):
+        return self.http_io.run(self.http_io.request('GET', self.table_name, params=params)).json()
+
+    def fetch_existing(self, customer_ids, min_date, max_date):
+        return self._select([('select', 'CUSTOMER_ID,PREDICTED_DATE,MAPE'),
+                             ('CUSTOMER_ID', f"in.({','.join(str(int(c)) for c in customer_ids)})"),
+                             ('PREDICTED_DATE', f"gte.{min_date}"), ('PREDICTED_DATE', f"lte.{max_date}")])
+
+    def fetch_existing_page(self, min_date, max_date, offset, limit):
+        return self._select([('select', 'CUSTOMER_ID,PREDICTED_DATE,MAPE'), ('PREDICTED_DATE', f"gte.{min_date}"),
+                             ('PREDICTED_DATE', f"lte.{max_date}"), ('order', 'CUSTOMER_ID,PREDICTED_DATE'),
+                             ('offset', offset), ('limit', limit)])
+
+    async def _upsert(self, rows):
+        await self.http_io.request('POST', self.table_name, params=[('on_conflict', 'CUSTOMER_ID,PREDICTED_DATE')],
+                                   json_body=rows, headers={'Prefer': 'resolution=merge-duplicates,return=minimal'})
+
+    def upsert(self, rows):
+        self.http_io.run(self._upsert(rows))
+
+    def insert(self, rows):
+        self.http_io.run(self.http_io.request('POST', self.table_name, json_body=rows,
+                                              headers={'Prefer': 'return=minimal'}))
+
+    def update(self, rows):
+        """행마다 (CUSTOMER_ID, PREDICTED_DATE)가 같은 기존 행을 동시에 갱신"""
+        async def update_all():
+            await asyncio.gather(*(self.http_io.request(
+                'PATCH', self.table_name, json_body=row, headers={'Prefer': 'return=minimal'},
+                params=[('CUSTOMER_ID', f"eq.{row['CUSTOMER_ID']}"), ('PREDICTED_DATE', f"eq.{row['PREDICTED_DATE']}")])
+                for row in rows))
+        self.http_io.run(update_all())
+
+    def upsert_many(self, chunks):
+        """청크를 동시에 upsert하고 청크별 결과(None 또는 예외) 목록을 반환"""
+        async def upsert_all():
+            return await asyncio.gather(*(self._upsert(chunk) for chunk in chunks), return_exceptions=True)
+        return [result if isinstance(result, Exception) else None for result in self.http_io.run(upsert_all())]
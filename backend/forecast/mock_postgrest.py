@@ -0,0 +1,213 @@
+"""로컬 테스트용 PostgREST 흉내 서버
+
+AsyncPostgrestIO/AsyncPostgrestForecastBackend가 쓰는 /rest/v1/<table> 호출만 지원한다.
+- GET: select(무시, 행 전체 반환), order, offset/limit, eq/gt/gte/lt/lte/in 필터, Prefer: count=exact → Content-Range
+- POST: on_conflict 열 기준 upsert (Prefer: resolution=merge-duplicates), on_conflict가 없으면 그대로 추가
+- PATCH: eq/gt/gte/lt/lte/in 필터에 맞는 행 갱신
+unique_keys={'테이블': [('열', ...), ...]}로 테이블의 유니크 제약을 지정하면, 맞는 제약이 없는 on_conflict upsert에
+PostgREST처럼 400 (code 42P10) 오류를 돌려준다. 지정하지 않은 테이블은 모든 on_conflict를 받아들인다.
+latency_s로 응답 지연을, fail_every로 N번째 요청마다 503 응답을 넣어 동시성/재시도 동작을 확인할 수 있고,
+max_rows로 PostgREST의 db-max-rows 제한(요청한 limit보다 짧은 페이지)을 흉내낼 수 있다.
+
+    with MockPostgrestServer({'orders': rows, ...}) as base_url:
+        http_io = forecast.AsyncPostgrestIO(base_url, 'test-key')
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+REST_PREFIX = '/rest/v1/'
+FILTER_OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'gt': lambda a, b: a > b,
+    'gte': lambda a, b: a >= b,
+    'lt': lambda a, b: a < b,
+    'lte': lambda a, b: a <= b,
+}
+
+
+def _coerce(value, like):
+    """필터 문자열 값을 행 값과 비교할 수 있는 타입으로 변환"""
+    if isinstance(like, (int, float)) and not isinstance(like, bool):
+        return float(value)
+    return value
+
+
+def _row_filter(column, expression):
+    operator, _, value = expression.partition('.')
+    if operator == 'in':
+        values = value.strip('()').split(',')
+        return lambda row: row.get(column) is not None and row[column] in [_coerce(v, row[column]) for v in values]
+    compare = FILTER_OPERATORS[operator]
+    return lambda row: row.get(column) is not None and compare(row[column], _coerce(value, row[column]))
+
+
+class _PostgrestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _table_and_params(self):
+        parts = urlsplit(self.path)
+        return parts.path[len(REST_PREFIX):], parse_qsl(parts.query)
+
+    def _send(self, status, body=None, headers=None):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _begin(self):
+        """요청 수를 세고 지연/장애를 주입. 장애 응답을 보냈으면 False"""
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            request_number = server.request_count
+        if server.latency_s:
+            time.sleep(server.latency_s)
+        if server.fail_every and request_number % server.fail_every == 0:
+            server.failed_count += 1
+            self._send(503, {'message': 'injected failure'})
+            return False
+        return True
+
+    def do_GET(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if not self._begin():
+            return
+        table, params = self._table_and_params()
+        filters, order, offset, limit = [], None, 0, None
+        for key, value in params:
+            if key == 'select':
+                continue
+            elif key == 'order':
+                order = [column.split('.')[0] for column in value.split(',')]
+            elif key == 'offset':
+                offset = int(value)
+            elif key == 'limit':
+                limit = int(value)
+            else:
+                filters.append(_row_filter(key, value))
+        with self.server.lock:
+            rows = [row for row in self.server.tables.get(table, []) if all(f(row) for f in filters)]
+        if order:
+            rows.sort(key=lambda row: tuple(row.get(column) for column in order))
+        total = len(rows)
+        if self.server.max_rows:
+            limit = min(limit, self.server.max_rows) if limit is not None else self.server.max_rows
+        page = rows[offset:offset + limit if limit is not None else None]
+        headers = {}
+        if 'count=exact' in (self.headers.get('Prefer') or ''):
+            end = offset + len(page) - 1
+            headers['Content-Range'] = f"{offset}-{end}/{total}" if page else f"*/{total}"
+        self._send(200, page, headers)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'[]')
+        if not self._begin():
+            return
+        table, params = self._table_and_params()
+        on_conflict = dict(params).get('on_conflict')
+        rows = body if isinstance(body, list) else [body]
+        unique_keys = self.server.unique_keys.get(table)
+        if on_conflict and unique_keys is not None and tuple(on_conflict.split(',')) not in unique_keys:
+            self._send(400, {'code': '42P10', 'message': 'there is no unique or exclusion constraint matching the '
+                                                         'ON CONFLICT specification'})
+            return
+        with self.server.lock:
+            stored = self.server.tables.setdefault(table, [])
+            if not on_conflict:
+                stored.extend(dict(row) for row in rows)
+                self._send(201)
+                return
+            conflict_columns = on_conflict.split(',')
+            index = {tuple(row.get(c) for c in conflict_columns): i for i, row in enumerate(stored)}
+            for row in rows:
+                key = tuple(row.get(c) for c in conflict_columns)
+                if key in index:
+                    stored[index[key]] = {**stored[index[key]], **row}
+                else:
+                    index[key] = len(stored)
+                    stored.append(dict(row))
+        self._send(201)
+
+    def do_PATCH(self):
+        values = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        if not self._begin():
+            return
+        table, params = self._table_and_params()
+        filters = [_row_filter(key, value) for key, value in params]
+        with self.server.lock:
+            stored = self.server.tables.setdefault(table, [])
+            for i, row in enumerate(stored):
+                if all(f(row) for f in filters):
+                    stored[i] = {**row, **values}
+        self._send(204)
+
+
+class MockPostgrestServer:
+    """테이블(dict 리스트)을 메모리에 들고 PostgREST처럼 응답하는 스레드 HTTP 서버"""
+
+    def __init__(self, tables=None, latency_s=0.0, fail_every=0, max_rows=0, unique_keys=None, host='127.0.0.1',
+                 port=0):
+        self.server = ThreadingHTTPServer((host, port), _PostgrestHandler)
+        self.server.daemon_threads = True
+        self.server.tables = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.server.lock = threading.Lock()
+        self.server.latency_s = latency_s
+        self.server.fail_every = fail_every
+        self.server.max_rows = max_rows
+        self.server.unique_keys = {name: [tuple(key) for key in keys] for name, keys in (unique_keys or {}).items()}
+        self.server.request_count = 0
+        self.server.failed_count = 0
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def tables(self):
+        return self.server.tables
+
+    @property
+    def max_rows(self):
+        return self.server.max_rows
+
+    @max_rows.setter
+    def max_rows(self, value):
+        self.server.max_rows = value
+
+    @property
+    def request_count(self):
+        return self.server.request_count
+
+    @property
+    def failed_count(self):
+        return self.server.failed_count
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='mock-postgrest', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,172 @@
+"""httpx 기반 비동기 PostgREST 호출 계층 (원천 데이터 페이지 동시 조회, 예측 upsert 청크 동시 전송)
+
+httpx는 AsyncPostgrestIO를 만들 때 지연 로딩한다 (--async-io를 쓰지 않는 실행에서는 로딩되지 않음).
+"""
+import asyncio
+import os
+import random
+import threading
+from collections import deque
+
+ASYNC_IO_MAX_CONNECTIONS = int(os.environ.get("ASYNC_IO_MAX_CONNECTIONS", "8"))  # 연결 풀 크기 = 동시 요청 수
+ASYNC_IO_MAX_RETRIES = 4  # 429/5xx/연결 오류 재시도 횟수
+ASYNC_IO_BACKOFF_S = 0.5  # 재시도 대기: BACKOFF * 2^n (+최대 50% 지터)
+ASYNC_IO_TIMEOUT_S = 60
+ASYNC_IO_PREFETCH_PAGES = 8  # 로딩 시 미리 요청해 두는 페이지 수
+
+
+class PostgrestRequestError(Exception):
+    """재시도 후에도 실패했거나 재시도 대상이 아닌(4xx) PostgREST 요청 오류. code는 PostgREST 오류 코드(없으면 None)"""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def _error_code(response):
+    """PostgREST 오류 응답 본문의 code (예: '42P10'). 본문이 JSON이 아니면 None"""
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    return body.get('code') if isinstance(body, dict) else None
+
+
+class AsyncPostgrestIO:
+    """httpx.AsyncClient 기반 PostgREST 호출 계층 (연결 풀, 동시 요청 수 제한, 지수 백오프 재시도)
+
+    이벤트 루프는 전용 스레드 하나에서 돌고, 동기 코드(로딩, 저장 스레드)는 submit()/run()으로 코루틴을 넘긴다.
+    동시 요청은 max_connections개로 제한되며, 429/5xx 응답과 연결 오류는 max_retries번까지
+    backoff_s * 2^n (+지터, Retry-After 헤더가 있으면 그 값) 간격으로 다시 시도한다.
+    base_url은 Supabase 프로젝트 URL (또는 /rest/v1 경로를 흉내내는 테스트용 서버 주소)이다.
+    """
+
+    def __init__(self, base_url, api_key, max_connections=ASYNC_IO_MAX_CONNECTIONS, max_retries=ASYNC_IO_MAX_RETRIES,
+                 backoff_s=ASYNC_IO_BACKOFF_S, timeout_s=ASYNC_IO_TIMEOUT_S):
+        self.rest_url = base_url.rstrip('/') + '/rest/v1'
+        self.headers = {'apikey': api_key, 'Authorization': f'Bearer {api_key}'}
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+        self.request_count = 0
+        self.retry_count = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='forecast-io', daemon=True)
+        self._thread.start()
+        self._client = None
+        self._semaphore = None
+        self.run(self._open())
+
+    async def _open(self):
+        import httpx
+
+        self._client = httpx.AsyncClient(
+            base_url=self.rest_url, headers=self.headers, timeout=self.timeout_s,
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections))
+        self._semaphore = asyncio.Semaphore(self.max_connections)
+
+    def submit(self, coro):
+        """코루틴을 I/O 스레드에서 실행하고 concurrent.futures.Future를 반환"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro):
+        return self.submit(coro).result()
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self.run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def request(self, method, table, params=None, json_body=None, headers=None):
+        import httpx
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    self.request_count += 1
+                    response = await self._client.request(method, f"/{table}", params=params, json=json_body,
+                                                          headers=headers)
+                if response.status_code < 400:
+                    return response
+                if response.status_code != 429 and response.status_code < 500:
+                    raise PostgrestRequestError(f"{method} {table}: HTTP {response.status_code} {response.text[:200]}",
+                                                code=_error_code(response))
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get('Retry-After')
+            except httpx.TransportError as e:
+                error = repr(e)
+            if attempt == self.max_retries:
+                raise PostgrestRequestError(f"{method} {table}: {error} ({attempt + 1}회 시도)")
+            self.retry_count += 1
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = self.backoff_s * 2 ** attempt * (1 + random.random() * 0.5)
+            await asyncio.sleep(delay)
+
+    async def _get_page(self, table, params, offset, limit, count=False):
+        headers = {'Prefer': 'count=exact'} if count else None
+        response = await self.request('GET', table, params=params + [('offset', offset), ('limit', limit)],
+                                      headers=headers)
+        total = None
+        if count:
+            content_range = response.headers.get('Content-Range', '')
+            total_text = content_range.rpartition('/')[2]
+            total = int(total_text) if total_text.isdigit() else None
+        return response.json(), total
+
+    def count_rows(self, table, columns, filters=()):
+        """filters=[(열, 'op.값'), ...] 조건의 전체 행 수 (Prefer: count=exact)"""
+        params = [('select', columns.replace(' ', ''))] + list(filters)
+        _, total = self.run(self._get_page(table, params, 0, 1, count=True))
+        return total
+
+    def iter_table_pages(self, table, columns, order_column, page_size, after=None, prefetch=ASYNC_IO_PREFETCH_PAGES):
+        """data_loading._iter_table_pages()와 같은 순서로 페이지를 반환하되, 첫 페이지의 전체 행 수로 나머지 페이지를
+        최대 prefetch개까지 동시에 미리 요청한다 (메모리에는 그 이상 쌓이지 않음).
+
+        서버 max-rows가 page_size보다 작으면 첫 페이지가 짧게 오므로 그 길이로 나머지 페이지를 나눈다.
+        마지막이 아닌 페이지가 기대한 행 수보다 짧으면 (제한이 바뀌었거나 조회 중 행이 삭제됨) 행을 건너뛰지 않도록
+        PostgrestRequestError를 낸다.
+        """
+        params = [('select', columns.replace(' ', '')), ('order', order_column)]
+        if after is not None:
+            params.append((order_column, f"gt.{after}"))
+        rows, total = self.run(self._get_page(table, params, 0, page_size, count=True))
+        if not rows:
+            return
+        yield rows
+        if total is None:  # 전체 행 수를 모르면 빈 페이지가 올 때까지 순차 조회
+            offset = len(rows)
+            while True:
+                rows, _ = self.run(self._get_page(table, params, offset, page_size))
+                if not rows:
+                    return
+                yield rows
+                offset += len(rows)
+
+        page_size = len(rows)
+        offsets = deque(range(page_size, total, page_size))
+        in_flight = deque()
+        try:
+            while offsets or in_flight:
+                while offsets and len(in_flight) < prefetch:
+                    offset = offsets.popleft()
+                    in_flight.append((offset, self.submit(self._get_page(table, params, offset, page_size))))
+                offset, future = in_flight.popleft()
+                rows, _ = future.result()
+                expected = min(page_size, total - offset)
+                if len(rows) != expected:
+                    raise PostgrestRequestError(
+                        f"GET {table}: offset {offset}에서 {expected}행을 기대했지만 {len(rows)}행을 받았습니다 "
+                        f"(서버 max-rows 제한 변경 또는 조회 중 데이터 변경)")
+                yield rows
+        finally:
+            for _, future in in_flight:
+                future.cancel()
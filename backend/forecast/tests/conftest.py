@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+# forecast.py와 형제 모듈은 스크립트 디렉터리에서 최상위 모듈로 import된다 (python backend/forecast/forecast.py).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def synthetic_data():
+    """benchmark 합성 테이블을 파이프라인과 같은 경로(로딩 → 전처리)로 읽은 (orders, activities_df)
+
+    여러 테스트가 공유하므로 값을 바꾸는 함수에는 복사본을 넘긴다.
+    """
+    import benchmark
+    from data_loading import load_data_from_supabase, preprocess_data
+
+    client = benchmark.SyntheticSupabaseClient(benchmark.generate_synthetic_tables(40, 36, seed=7))
+    return preprocess_data(*load_data_from_supabase(client, page_size=500))
+
+
+def stub_single_customer_forecast(cust_id, grp_orders, context):
+    """Prophet/ARIMA 대신 월 평균 매출을 예측값으로 돌려주는 빠른 forecast_single_customer() 대역"""
+    import pandas as pd
+
+    import forecast
+
+    monthly_mean = float(grp_orders.groupby('MONTH_TS')['SALES_AMOUNT'].sum().mean())
+    frame = pd.DataFrame({'ds': context['future_dates_fixed'], 'yhat': monthly_mean + int(cust_id)})
+    return forecast.finalize_forecast_frame(frame, 5.0, 'Stub'), {'model': 'Stub', 'mape': 5.0,
+                                                                   'timings': {'total': 0.0}}
+
+
+@pytest.fixture
+def stub_forecasts(monkeypatch):
+    """forecast_single_customer()를 대역으로 바꾸고 (같은 프로세스에서) 호출된 고객 ID 목록을 반환
+
+    병렬 워커는 fork로 바뀐 함수를 그대로 물려받지만, 워커 안의 호출은 이 목록에 기록되지 않는다.
+    """
+    import forecast
+
+    calls = []
+
+    def stub(cust_id, grp_orders, context):
+        calls.append(int(cust_id))
+        return stub_single_customer_forecast(cust_id, grp_orders, context)
+
+    monkeypatch.setattr(forecast, 'forecast_single_customer', stub)
+    return calls
+
+
+@pytest.fixture
+def pipeline(tmp_path, stub_forecasts):
+    """같은 상태 디렉터리와 저장소로 파이프라인을 여러 번 실행하는 함수 (모델 학습은 대역 사용)
+
+    고객 60명이면 저장이 두 묶음 이상으로 나뉘어, 한 청크의 저장 실패가 다른 청크 고객에게 번지지 않는다.
+    """
+    import benchmark
+    import forecast
+    from forecast_backends import SQLiteForecastBackend
+
+    client = benchmark.SyntheticSupabaseClient(benchmark.generate_synthetic_tables(60, 30, seed=5))
+    backend = SQLiteForecastBackend()
+
+    def run(backend=backend, **overrides):
+        settings = forecast.PipelineSettings(**{'workers': 1, 'state_dir': str(tmp_path), 'use_snapshot': False,
+                                                'metrics_path': None, 'profile_top_n': 0, 'memory_limit_mb': 0,
+                                                'prophet_validation': {'strategy': 'holdout', 'parallel': None,
+                                                                       'max_cutoffs': 0}, **overrides})
+        return forecast.run_monthly_forecast_pipeline(settings, backend=backend, client=client)['customers']
+
+    run.client = client
+    run.state_dir = str(tmp_path)
+    return run
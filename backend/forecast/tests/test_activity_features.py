@@ -0,0 +1,68 @@
+"""ActivityFeatureMatrix.model_input()이 기존 고객별 get_dummies/merge 결과와 같은지 확인"""
+import numpy as np
+import pandas as pd
+
+import forecast
+
+
+def reference_model_input(activities_df, potential_regressors, cust_id, df_sales):
+    """기존 구현 (고객 활동을 필터링해 get_dummies 후 월별 합계를 merge). 고객 ID는 기존 로딩처럼 정수로 받는다."""
+    customer_activities = activities_df[activities_df["CUSTOMER_ID"] == cust_id].copy()
+    df_model_input = df_sales.copy()
+
+    if not customer_activities.empty:
+        df_model_input = pd.merge(df_model_input, customer_activities.groupby("MONTH_TS").size().reset_index(
+            name="total_activities_count").rename(columns={"MONTH_TS": "ds"}), on="ds", how="left")
+        if 'ACTIVITY_TYPE' in customer_activities.columns:
+            dummies_activities_type = pd.get_dummies(customer_activities, columns=['ACTIVITY_TYPE'],
+                                                     prefix='act_type', dtype=int)
+            df_model_input = pd.merge(df_model_input, dummies_activities_type.groupby("MONTH_TS").sum(
+                numeric_only=True).reset_index().rename(columns={"MONTH_TS": "ds"}), on="ds", how="left")
+        if 'OUTCOME' in customer_activities.columns:
+            dummies_outcomes = pd.get_dummies(customer_activities, columns=['OUTCOME'], prefix='outcome',
+                                              dtype=int)
+            df_model_input = pd.merge(df_model_input, dummies_outcomes.groupby("MONTH_TS").sum(
+                numeric_only=True).reset_index().rename(columns={"MONTH_TS": "ds"}), on="ds", how="left")
+
+    for col in potential_regressors:
+        if col not in df_model_input.columns:
+            df_model_input[col] = 0
+    df_model_input.fillna(0, inplace=True)
+    return df_model_input
+
+
+def monthly_sales(orders, cust_id):
+    grp_orders = orders[orders['CUSTOMER_ID'] == cust_id]
+    df_sales = grp_orders.groupby("MONTH_TS")["SALES_AMOUNT"].sum().reset_index().rename(
+        columns={"MONTH_TS": "ds", "SALES_AMOUNT": "y"})
+    df_sales["ds"] = pd.to_datetime(df_sales["ds"])
+    return df_sales
+
+
+def test_matches_per_customer_dummies(synthetic_data):
+    orders, activities_df = synthetic_data
+    potential_regressors = forecast.build_potential_regressors(activities_df)
+    matrix = forecast.ActivityFeatureMatrix.build(activities_df, potential_regressors)
+    plain_activities = activities_df.astype({'CUSTOMER_ID': 'int64'})
+
+    checked_regressors = set()
+    for cust_id in orders['CUSTOMER_ID'].unique():
+        df_sales = monthly_sales(orders, cust_id)
+        actual = matrix.model_input(cust_id, df_sales)
+        expected = reference_model_input(plain_activities, potential_regressors, int(cust_id), df_sales)
+        assert list(actual[['ds', 'y']].itertuples(index=False)) == list(df_sales.itertuples(index=False))
+        np.testing.assert_allclose(actual[potential_regressors].to_numpy(dtype=np.float64),
+                                   expected[potential_regressors].to_numpy(dtype=np.float64), err_msg=str(cust_id))
+        checked_regressors.update(col for col in potential_regressors if expected[col].sum() > 0)
+    assert len(checked_regressors) > 1
+    # 기존 get_dummies 열 이름은 공백을 그대로 두므로 '신규 제안' 활동은 회귀 변수로 집계되지 않는다.
+    assert (activities_df['ACTIVITY_TYPE'] == '신규 제안').any()
+    assert matrix.values[:, potential_regressors.index('act_type_신규_제안')].sum() == 0
+
+
+def test_customer_without_activities_gets_zero_regressors(synthetic_data):
+    orders, activities_df = synthetic_data
+    potential_regressors = forecast.build_potential_regressors(activities_df)
+    matrix = forecast.ActivityFeatureMatrix.build(activities_df.iloc[:0], potential_regressors)
+    df_sales = monthly_sales(orders, orders['CUSTOMER_ID'].iloc[0])
+    assert (matrix.model_input(orders['CUSTOMER_ID'].iloc[0], df_sales)[potential_regressors] == 0).all().all()
@@ -0,0 +1,86 @@
+"""seasonal_naive_baseline()/score_baseline_customers()를 고객별 pandas 기준 구현과 비교"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecast
+
+
+def reference_baseline(grp, future_dates, season=forecast.BASELINE_SEASON, test_periods=forecast.ARIMA_TEST_PERIODS):
+    """고객 한 명: ARIMA와 같은 asfreq('MS').interpolate() 시계열로 (MAPE, 미래 예측값 배열)을 계산"""
+    y = grp.groupby('MONTH_TS')['SALES_AMOUNT'].sum().asfreq('MS').interpolate().astype('float64')
+    if grp['MONTH_TS'].nunique() < forecast.MIN_MONTHS or len(y) < season + test_periods:
+        return np.nan, np.full(len(future_dates), np.nan)
+
+    year = pd.DateOffset(months=season)
+    test_y = y.iloc[-test_periods:]
+    test_pred = np.array([y[month - year] for month in test_y.index])
+    mape = np.mean(np.abs(test_y.to_numpy() - test_pred) / np.abs(test_y.to_numpy())) * 100 if (test_y > 0).all() \
+        else np.nan
+
+    forecasts = []
+    for month in future_dates:
+        source = month - year
+        while source > y.index[-1]:  # 마지막 데이터 월 이하가 될 때까지 1년씩 더 거슬러 올라간다
+            source -= year
+        forecasts.append(y[source])
+    return mape, np.array(forecasts)
+
+
+@pytest.fixture(scope='module')
+def orders(synthetic_data):
+    """합성 주문 + 경계 사례 고객 (9001: 홀드아웃 마지막 달 매출 0, 9002: 주문 월 수는 충분하지만 기간이 짧음,
+    9003: 중간에 빈 달이 있고 일찍 끝남)"""
+    orders = synthetic_data[0].astype({'CUSTOMER_ID': 'int64'})
+    months = pd.date_range('2024-01-01', periods=24, freq='MS')
+    extra = [(9001, month, 0.0 if i == 23 else 100.0 + 10 * (i % 12)) for i, month in enumerate(months)]
+    extra += [(9002, month, 50.0 + i) for i, month in enumerate(months[:14])]
+    extra += [(9003, month, 80.0 + 3 * i) for i, month in enumerate(months[:20]) if i not in (4, 5, 13)]
+    extra = pd.DataFrame(extra, columns=['CUSTOMER_ID', 'MONTH_TS', 'SALES_AMOUNT']).astype({'SALES_AMOUNT': 'float32'})
+    extra['ORDERED_AT'] = extra['MONTH_TS']
+    return pd.concat([orders, extra[orders.columns]], ignore_index=True)
+
+
+@pytest.fixture(scope='module')
+def future_dates(orders):
+    return pd.date_range(orders['MONTH_TS'].max() + pd.DateOffset(months=1), periods=forecast.BASE_FUTURE, freq='MS')
+
+
+@pytest.fixture(scope='module')
+def reference(orders, future_dates):
+    return {int(cust_id): reference_baseline(grp, future_dates)
+            for cust_id, grp in orders.groupby('CUSTOMER_ID', observed=True)}
+
+
+def test_matches_per_customer_reference(orders, future_dates, reference):
+    customer_ids = orders['CUSTOMER_ID'].unique()
+    baseline_ids, mape, forecasts = forecast.seasonal_naive_baseline(orders, customer_ids, future_dates)
+    assert sorted(int(c) for c in baseline_ids) == sorted(reference)
+    for i, cust_id in enumerate(baseline_ids):
+        expected_mape, expected_forecast = reference[int(cust_id)]
+        np.testing.assert_allclose(mape[i], expected_mape, rtol=1e-9, err_msg=f"customer {cust_id}")
+        np.testing.assert_allclose(forecasts[i], expected_forecast, rtol=1e-9, err_msg=f"customer {cust_id}")
+
+    # 경계 사례가 실제로 각 분기를 지나는지 확인
+    assert np.isnan(reference[9001][0]) and not np.isnan(reference[9001][1]).any()  # 홀드아웃 0 → MAPE 없음
+    assert np.isnan(reference[9002][1]).all()  # 기간 14개월 < season + test_periods
+    assert not np.isnan(reference[9003][0])
+    assert sum(np.isnan(f).all() for _, f in reference.values()) > 2  # 합성 데이터의 희소 고객도 제외된다
+
+
+def test_threshold_cutover(orders, future_dates, reference):
+    customer_ids = orders['CUSTOMER_ID'].unique()
+    valid_mapes = sorted(m for m, _ in reference.values() if not np.isnan(m))
+    threshold = valid_mapes[len(valid_mapes) // 2]
+    results = forecast.score_baseline_customers(orders, customer_ids, future_dates, mape_threshold=threshold)
+
+    expected_ids = sorted(c for c, (m, _) in reference.items() if not np.isnan(m) and m <= threshold)
+    assert sorted(int(c) for c, _, _ in results) == expected_ids and 0 < len(expected_ids) < len(valid_mapes)
+    for cust_id, frame, mape in results:
+        expected_mape, expected_forecast = reference[int(cust_id)]
+        assert mape == pytest.approx(expected_mape, rel=1e-9)
+        assert list(frame['PREDICTED_DATE']) == list(future_dates)
+        np.testing.assert_allclose(frame['PREDICTED_QUANTITY'], np.maximum(expected_forecast, 0), rtol=1e-9)
+        assert set(frame['PREDICTION_MODEL']) == {forecast.BASELINE_MODEL_NAME} and set(frame['MAPE']) == {mape}
+
+    assert forecast.score_baseline_customers(orders, customer_ids, future_dates, mape_threshold=0) == []
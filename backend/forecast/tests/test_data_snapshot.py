@@ -0,0 +1,111 @@
+"""DataSnapshot 전체 로딩 / 추가분 로딩 / 전체 갱신 경로 (SyntheticSupabaseClient 기준)"""
+import json
+import os
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import benchmark
+from data_loading import DataSnapshot, load_data_from_supabase, preprocess_data
+
+HELD_BACK = 25  # 처음에는 숨겨 두었다가 나중에 "새로 추가된" 행으로 보여 줄 마지막 행 수
+
+
+@pytest.fixture
+def client():
+    client = benchmark.SyntheticSupabaseClient(benchmark.generate_synthetic_tables(12, 24, seed=3))
+    client.all_rows = {table: list(rows) for table, rows in client.tables.items()}
+    for table, rows in client.all_rows.items():
+        client.tables[table] = rows[:-HELD_BACK]
+    return client
+
+
+def full_load(client):
+    return preprocess_data(*load_data_from_supabase(client, page_size=100))
+
+
+def normalized(df):
+    """범주형 열은 값으로 바꿔서 비교 (추가분을 덧붙이면 범주 순서가 전체 로딩과 다를 수 있다)"""
+    df = df.reset_index(drop=True)
+    categorical = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    return df.astype({c: df[c].cat.categories.dtype for c in categorical})
+
+
+def assert_same_frames(actual, expected):
+    for got, want in zip(actual, expected):
+        pd.testing.assert_frame_equal(normalized(got), normalized(want))
+
+
+def total_sales(orders):
+    return float(orders['SALES_AMOUNT'].astype('float64').sum())
+
+
+def read_meta(snapshot):
+    with open(os.path.join(snapshot.snapshot_dir, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_first_load_is_full_then_served_from_snapshot(tmp_path, client, capsys):
+    snapshot = DataSnapshot(str(tmp_path))
+    first = snapshot.load(client, page_size=100)
+    assert '로컬 스냅샷 전체 갱신: 스냅샷 없음' in capsys.readouterr().out
+    assert_same_frames(first, full_load(client))
+
+    requests_before = client.request_count
+    second = snapshot.load(client, page_size=100)
+    out = capsys.readouterr().out
+    assert '로컬 스냅샷 사용' in out and '전체 갱신' not in out
+    assert_same_frames(second, first)
+    assert client.request_count - requests_before == 4  # 행 수 확인 2회 + 빈 추가분 조회 2회
+
+
+def test_new_rows_are_appended_to_snapshot(tmp_path, client, capsys):
+    snapshot = DataSnapshot(str(tmp_path))
+    snapshot.load(client, page_size=100)
+    created_at = read_meta(snapshot)['created_at']
+
+    client.tables.update(client.all_rows)
+    appended = snapshot.load(client, page_size=100)
+    assert '스냅샷에 추가' in capsys.readouterr().out
+    assert_same_frames(appended, full_load(client))
+    meta = read_meta(snapshot)
+    assert meta['created_at'] == created_at  # 추가분은 마지막 전체 로딩 시각을 바꾸지 않는다
+    assert meta['watermarks'] == {'orders': client.tables['orders'][-1]['ORDER_ID'],
+                                  'sales_activities': client.tables['sales_activities'][-1]['ACTIVITY_ID']}
+    assert_same_frames(snapshot.load(client, page_size=100), appended)  # 저장된 스냅샷을 다시 읽어도 같다
+
+
+def test_edits_are_picked_up_by_the_periodic_full_refresh(tmp_path, client, capsys):
+    snapshot = DataSnapshot(str(tmp_path), full_refresh_hours=24)
+    snapshot.load(client, page_size=100)
+    edited_order = client.tables['orders'][3]
+    client.tables['orders'][3] = {**edited_order, 'AMOUNT': edited_order['AMOUNT'] + 1234.0}
+    expected = full_load(client)
+    capsys.readouterr()
+
+    # 행 수가 같으면 값 수정은 감지하지 못하고, 전체 갱신 주기가 지날 때까지 이전 값을 쓴다
+    orders, _ = snapshot.load(client, page_size=100)
+    assert '전체 갱신' not in capsys.readouterr().out
+    assert total_sales(expected[0]) - total_sales(orders) == pytest.approx(1234.0, abs=0.1)
+
+    meta = read_meta(snapshot)
+    snapshot.save(*snapshot.load(client, page_size=100), meta['watermarks'], meta['source_rows'],
+                  created_at=time.time() - 25 * 3600)
+    refreshed = snapshot.load(client, page_size=100)
+    assert '시간 경과' in capsys.readouterr().out
+    assert_same_frames(refreshed, expected)
+    assert time.time() - read_meta(snapshot)['created_at'] < 60
+
+
+def test_deleted_rows_trigger_full_refresh(tmp_path, client, capsys):
+    snapshot = DataSnapshot(str(tmp_path))
+    snapshot.load(client, page_size=100)
+    del client.tables['orders'][5]
+    del client.tables['sales_activities'][0]
+
+    reloaded = snapshot.load(client, page_size=100)
+    assert 'orders 행 수 변경' in capsys.readouterr().out
+    assert_same_frames(reloaded, full_load(client))
@@ -0,0 +1,68 @@
+"""벡터화된 create_event_features()가 기존 merge/rolling 방식과 같은 학습 데이터를 만드는지 확인"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import forecast
+
+
+def reference_event_features(orders, activities):
+    """기존 구현 (고객 x 월 격자를 merge하고 고객별 rolling/ffill/shift로 계산). 고객 ID는 기존 로딩처럼 정수로 받는다."""
+    large_order_threshold = orders['SALES_AMOUNT'].quantile(0.75)
+    orders['IS_LARGE_ORDER'] = orders['SALES_AMOUNT'] >= large_order_threshold
+
+    keywords = ['견적', '교체', '대규모', '신규', '제안']
+    activities['IS_KEY_ACTIVITY'] = activities['ACTIVITY_TYPE'].str.contains('|'.join(keywords), na=False)
+
+    all_months = pd.date_range(start=orders['MONTH_TS'].min(), end=pd.to_datetime(date.today()), freq='MS')
+    all_customers = orders['CUSTOMER_ID'].unique()
+    training_df = pd.MultiIndex.from_product([all_customers, all_months], names=['CUSTOMER_ID', 'MONTH_TS']).to_frame(
+        index=False)
+
+    key_activities_monthly = activities[activities['IS_KEY_ACTIVITY']].groupby(
+        ['CUSTOMER_ID', 'MONTH_TS']).size().reset_index(name='KEY_ACTIVITY_COUNT')
+    training_df = pd.merge(training_df, key_activities_monthly, on=['CUSTOMER_ID', 'MONTH_TS'], how='left').fillna(0)
+    training_df['KEY_ACTIVITY_LAST_6M'] = training_df.groupby('CUSTOMER_ID')[
+        'KEY_ACTIVITY_COUNT'].transform(lambda x: x.rolling(6, min_periods=1).sum())
+
+    large_orders = orders[orders['IS_LARGE_ORDER']]
+    last_large_order_month = large_orders.groupby('CUSTOMER_ID')['MONTH_TS'].max().reset_index().rename(
+        columns={'MONTH_TS': 'LAST_LARGE_ORDER_TS'})
+    training_df = pd.merge(training_df, last_large_order_month, on='CUSTOMER_ID', how='left')
+
+    training_df['MONTHS_SINCE_LAST_LARGE'] = (
+            (training_df['MONTH_TS'].dt.year - training_df['LAST_LARGE_ORDER_TS'].dt.year) * 12 +
+            (training_df['MONTH_TS'].dt.month - training_df['LAST_LARGE_ORDER_TS'].dt.month))
+    training_df['MONTHS_SINCE_LAST_LARGE'] = training_df.groupby('CUSTOMER_ID')[
+        'MONTHS_SINCE_LAST_LARGE'].ffill().fillna(120).clip(lower=0)
+
+    large_order_monthly = large_orders.groupby(['CUSTOMER_ID', 'MONTH_TS']).size().reset_index(
+        name='HAS_LARGE_ORDER')
+    training_df = pd.merge(training_df, large_order_monthly[['CUSTOMER_ID', 'MONTH_TS', 'HAS_LARGE_ORDER']],
+                           on=['CUSTOMER_ID', 'MONTH_TS'], how='left').fillna(0)
+    training_df['TARGET'] = training_df.groupby('CUSTOMER_ID')['HAS_LARGE_ORDER'].transform(
+        lambda x: x.rolling(6, min_periods=1).max().shift(-6)).fillna(0)
+    return training_df
+
+
+def test_matches_reference_implementation(synthetic_data):
+    orders, activities = synthetic_data
+    X, y, training_df = forecast.create_event_features(orders.copy(), activities.copy())
+    expected = reference_event_features(orders.astype({'CUSTOMER_ID': 'int64'}),
+                                        activities.astype({'CUSTOMER_ID': 'int64'}))
+
+    assert len(training_df) == len(expected)
+    assert list(training_df['CUSTOMER_ID'].astype(int)) == list(expected['CUSTOMER_ID'].astype(int))
+    assert (training_df['MONTH_TS'].to_numpy() == expected['MONTH_TS'].to_numpy()).all()
+    for column in ['KEY_ACTIVITY_COUNT', 'KEY_ACTIVITY_LAST_6M', 'MONTHS_SINCE_LAST_LARGE', 'HAS_LARGE_ORDER',
+                   'TARGET']:
+        np.testing.assert_allclose(training_df[column].to_numpy(dtype=np.float64),
+                                   expected[column].to_numpy(dtype=np.float64), err_msg=column)
+    assert list(X.columns) == ['KEY_ACTIVITY_LAST_6M', 'MONTHS_SINCE_LAST_LARGE']
+    assert y.sum() > 0 and expected['KEY_ACTIVITY_COUNT'].sum() > 0  # 합성 데이터가 양쪽 분기를 모두 거친다
+
+
+def test_empty_orders_return_nothing(synthetic_data):
+    orders, activities = synthetic_data
+    assert forecast.create_event_features(orders.iloc[:0].copy(), activities.copy()) == (None, None, None)
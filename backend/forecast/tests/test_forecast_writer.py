@@ -0,0 +1,157 @@
+"""decide_forecast_operation()과 ForecastBulkWriter의 저장 규칙 (SQLiteForecastBackend 기준)"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import forecast
+from forecast_backends import SQLiteForecastBackend
+
+DATES = pd.date_range('2030-01-01', periods=3, freq='MS')
+DATE_KEYS = [d.strftime('%Y-%m-%d') for d in DATES]
+RANGE = (DATE_KEYS[0], DATE_KEYS[-1])
+
+
+def forecast_frame(quantity, mape, model_name):
+    return forecast.finalize_forecast_frame(pd.DataFrame({'ds': DATES, 'yhat': float(quantity)}), mape, model_name)
+
+
+def stored(backend):
+    rows = backend.fetch_all().sort_values(['CUSTOMER_ID', 'PREDICTED_DATE'])
+    return {(int(r.CUSTOMER_ID), r.PREDICTED_DATE):
+            (r.PREDICTION_MODEL, None if pd.isna(r.MAPE) else r.MAPE, r.PREDICTED_QUANTITY)
+            for r in rows.itertuples()}
+
+
+def write(backend, frames, **writer_kwargs):
+    writer = forecast.ForecastBulkWriter(backend, datetime(2030, 1, 1), **writer_kwargs)
+    for customer_id, frame in frames.items():
+        writer.add(customer_id, frame)
+    writer.close()
+    return writer
+
+
+def seed(backend):
+    """고객 1: Prophet MAPE 10, 고객 2: MAPE 없는 예측 (빈 스냅샷을 넘겨 기존 예측 조회 없이 저장)"""
+    write(backend, {1: forecast_frame(100, 10.0, 'Prophet'), 2: forecast_frame(50, None, 'Prophet (No MAPE)')},
+          existing={}, existing_range=RANGE)
+
+
+@pytest.mark.parametrize('new_model, new_mape, has_existing, old_mape, expected', [
+    ('Prophet', 5.0, False, None, 'INSERT'),
+    ('Data Insufficient', None, True, 3.0, 'UPDATE'),
+    ('Prediction Failed', None, True, 3.0, 'UPDATE'),
+    ('Event-Driven (Logistic)', None, True, 3.0, 'UPDATE'),
+    ('ARIMA', 8.0, True, float('nan'), 'UPDATE'),
+    ('ARIMA', 8.0, True, 10.0, 'UPDATE'),
+    ('ARIMA', 10.0, True, 10.0, None),
+    ('ARIMA', 12.0, True, 10.0, None),
+    ('Prophet (No MAPE)', None, True, 10.0, None),
+])
+def test_decide_forecast_operation(new_model, new_mape, has_existing, old_mape, expected):
+    operation, _ = forecast.decide_forecast_operation(new_model, new_mape, has_existing, old_mape)
+    assert operation == expected
+
+
+def test_failure_models_overwrite_better_forecasts():
+    backend = SQLiteForecastBackend()
+    seed(backend)
+    writer = write(backend, {1: forecast_frame(0, None, 'Prediction Failed')})
+    rows = stored(backend)
+    assert all(rows[(1, d)] == ('Prediction Failed', None, 0.0) for d in DATE_KEYS)
+    assert writer.stats['UPDATE'] == 3
+
+
+def test_replaces_only_when_mape_improves():
+    backend = SQLiteForecastBackend()
+    seed(backend)
+    writer = write(backend, {1: forecast_frame(200, 12.0, 'ARIMA'), 2: forecast_frame(70, 20.0, 'ARIMA')})
+    rows = stored(backend)
+    assert rows[(1, '2030-01-01')] == ('Prophet', 10.0, 100.0)  # 더 나쁜 MAPE는 유지
+    assert rows[(2, '2030-01-01')] == ('ARIMA', 20.0, 70.0)  # 기존 MAPE가 없으면 교체
+    assert writer.stats['SKIP'] == 3 and writer.stats['UPDATE'] == 3
+
+    write(backend, {1: forecast_frame(150, 4.0, 'ARIMA')})
+    assert stored(backend)[(1, '2030-03-01')] == ('ARIMA', 4.0, 150.0)
+
+
+@pytest.mark.parametrize('queue_size', [0, 2])
+def test_prefetched_snapshot_matches_batch_reads(queue_size):
+    frames = {1: forecast_frame(200, 5.0, 'ARIMA'), 2: forecast_frame(70, 20.0, 'ARIMA'),
+              3: forecast_frame(0, None, 'Data Insufficient')}
+    per_batch, prefetched = SQLiteForecastBackend(), SQLiteForecastBackend()
+    seed(per_batch)
+    seed(prefetched)
+
+    write(per_batch, frames, batch_customers=2, queue_size=queue_size)
+    existing = forecast.prefetch_existing_forecasts(prefetched, *RANGE, page_size=2)
+    assert len(existing) == 6
+    requests_before = prefetched.request_count
+    write(prefetched, frames, batch_customers=2, existing=existing, existing_range=RANGE, queue_size=queue_size)
+
+    assert stored(prefetched) == stored(per_batch)
+    assert prefetched.request_count - requests_before == 2  # 묶음마다 upsert 1회, 기존 예측 재조회 없음
+
+
+class FailingPrefetchBackend(SQLiteForecastBackend):
+    def fetch_existing_page(self, min_date, max_date, offset, limit):
+        raise ConnectionError('prefetch unavailable')
+
+
+def test_failed_prefetch_falls_back_to_batch_reads():
+    backend = FailingPrefetchBackend()
+    seed(backend)
+    with pytest.raises(ConnectionError):
+        forecast.prefetch_existing_forecasts(backend, *RANGE)
+    # 파이프라인은 일괄 조회가 실패하면 existing=None으로 묶음 단위 조회를 한다.
+    write(backend, {1: forecast_frame(200, 12.0, 'ARIMA'), 3: forecast_frame(30, 8.0, 'ARIMA')},
+          existing=None, existing_range=RANGE)
+    rows = stored(backend)
+    assert rows[(1, '2030-01-01')] == ('Prophet', 10.0, 100.0)
+    assert rows[(3, '2030-01-01')] == ('ARIMA', 8.0, 30.0)
+
+
+class FailingReadBackend(SQLiteForecastBackend):
+    def fetch_existing(self, customer_ids, min_date, max_date):
+        raise ConnectionError('read unavailable')
+
+
+def test_failed_batch_read_skips_batch_instead_of_overwriting():
+    backend = FailingReadBackend()
+    seed(backend)
+    flushed = []
+    writer = write(backend, {1: forecast_frame(200, 12.0, 'ARIMA')}, on_flush=flushed.extend)
+    assert stored(backend)[(1, '2030-01-01')] == ('Prophet', 10.0, 100.0)
+    assert writer.failed_customers == {1}
+    assert flushed == []  # 저장하지 못한 고객은 체크포인트에 기록되지 않는다
+
+
+class MissingConstraintError(Exception):
+    code = '42P10'
+
+
+class NoUniqueConstraintBackend(SQLiteForecastBackend):
+    """(CUSTOMER_ID, PREDICTED_DATE) 유니크 제약이 없는 테이블처럼 upsert를 42P10 오류로 거부"""
+
+    def __init__(self):
+        super().__init__()
+        self.upsert_calls = 0
+
+    def upsert(self, rows):
+        self.upsert_calls += 1
+        raise MissingConstraintError('there is no unique or exclusion constraint matching the ON CONFLICT '
+                                     'specification')
+
+
+def test_missing_unique_constraint_falls_back_to_insert_and_update():
+    backend, reference = NoUniqueConstraintBackend(), SQLiteForecastBackend()
+    frames = {1: forecast_frame(200, 12.0, 'ARIMA'), 2: forecast_frame(70, 20.0, 'ARIMA'),
+              3: forecast_frame(30, 8.0, 'ARIMA')}
+    seed(backend)
+    seed(reference)
+    writer = write(backend, frames, batch_customers=1, chunk_size=2)
+    write(reference, frames, batch_customers=1, chunk_size=2)
+    assert stored(backend) == stored(reference)
+    assert len(backend.fetch_all()) == 9  # INSERT/UPDATE로 나눠 저장해도 (고객, 날짜)당 한 행
+    assert writer.failed_customers == set() and not writer.upsert_supported
+    assert backend.upsert_calls == 2  # 저장 때마다 첫 청크에서만 upsert를 시도한다
@@ -0,0 +1,64 @@
+"""score_group_b_customers()를 기존 고객별 predict_proba + 임계값 루프와 비교"""
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+
+import forecast
+
+
+def reference_group_b(cust_id, training_df_full, event_model, avg_large_order_amount, future_dates_fixed,
+                      purchase_threshold=0.5):
+    """기존 run_monthly_forecast_pipeline()의 고객별 B그룹 예측 (임계값은 기존 코드의 0.5 고정값을 인자로 뺌)"""
+    customer_rows = training_df_full[training_df_full['CUSTOMER_ID'] == cust_id]
+    base_months_since = customer_rows['MONTHS_SINCE_LAST_LARGE'].iloc[-1]
+    base_activities = customer_rows['KEY_ACTIVITY_LAST_6M'].iloc[-1]
+    future_features_df = pd.DataFrame([{'KEY_ACTIVITY_LAST_6M': base_activities,
+                                        'MONTHS_SINCE_LAST_LARGE': base_months_since + i + 1}
+                                       for i in range(forecast.BASE_FUTURE)])
+    purchase_probabilities = event_model.predict_proba(future_features_df)[:, 1]
+    avg_order_val = avg_large_order_amount.get(cust_id, 0)
+    predicted_quantities = [avg_order_val if prob >= purchase_threshold else 0 for prob in purchase_probabilities]
+    chosen_forecast = pd.DataFrame(
+        {'ds': future_dates_fixed, 'yhat': predicted_quantities, 'PROBABILITY': purchase_probabilities})
+    return forecast.finalize_forecast_frame(chosen_forecast, None, "Event-Driven (Logistic)")
+
+
+@pytest.fixture(scope='module')
+def event_inputs(synthetic_data):
+    orders, activities_df = (df.copy() for df in synthetic_data)
+    X_train, y_train, training_df_full = forecast.create_event_features(orders, activities_df)
+    event_model = forecast.train_event_model(X_train, y_train)
+    large_order_threshold = orders['SALES_AMOUNT'].quantile(0.75)
+    avg_large_order_amount = orders[orders['SALES_AMOUNT'] >= large_order_threshold].groupby(
+        'CUSTOMER_ID', observed=True)['SALES_AMOUNT'].mean()
+    # 순서를 섞고, 대량 주문 평균이 없는 고객(예측량 0)도 포함한다
+    customer_ids = list(training_df_full['CUSTOMER_ID'].unique())[::-1]
+    avg_large_order_amount = avg_large_order_amount.drop(customer_ids[0], errors='ignore')
+    return customer_ids, training_df_full, event_model, avg_large_order_amount
+
+
+@pytest.mark.parametrize('threshold_quantile', [None, 0.75])
+def test_matches_per_customer_loop(event_inputs, threshold_quantile):
+    customer_ids, training_df_full, event_model, avg_large_order_amount = event_inputs
+    future_dates_fixed = pd.date_range('2030-01-01', periods=forecast.BASE_FUTURE, freq='MS')
+    purchase_threshold = 0.5
+    if threshold_quantile is not None:
+        # 합성 데이터의 확률은 대부분 0.5보다 훨씬 작으므로 임계값 양쪽 분기를 모두 지나도록 분위수를 쓴다
+        probabilities = forecast.score_group_b_customers(customer_ids, training_df_full, event_model,
+                                                         avg_large_order_amount, future_dates_fixed)
+        purchase_threshold = float(np.quantile(np.concatenate([f['PROBABILITY'] for _, f in probabilities]),
+                                               threshold_quantile))
+
+    results = forecast.score_group_b_customers(customer_ids, training_df_full, event_model, avg_large_order_amount,
+                                               future_dates_fixed, purchase_threshold=purchase_threshold)
+    assert [cust_id for cust_id, _ in results] == customer_ids
+    for cust_id, frame in results:
+        expected = reference_group_b(cust_id, training_df_full, event_model, avg_large_order_amount,
+                                     future_dates_fixed, purchase_threshold)
+        pd.testing.assert_frame_equal(frame.reset_index(drop=True), expected, check_dtype=False, rtol=1e-12)
+    assert (results[0][1]['PREDICTED_QUANTITY'] == 0).all()
+    if threshold_quantile is not None:
+        quantities = np.concatenate([frame['PREDICTED_QUANTITY'] for _, frame in results])
+        assert (quantities > 0).any() and (quantities == 0).any()
@@ -0,0 +1,97 @@
+"""증분 실행: compute_customer_fingerprints()와 변경 없는 고객 건너뛰기 (SQLite 저장소, 합성 데이터)"""
+from datetime import date, timedelta
+
+import pandas as pd
+
+import forecast
+from forecast_backends import SQLiteForecastBackend
+
+
+def fingerprints_of(orders, activities_df, horizon='2030-01-01', config_key='config'):
+    return forecast.compute_customer_fingerprints(orders, activities_df, pd.Timestamp(horizon), config_key)
+
+
+def test_fingerprints_change_only_for_changed_customers(synthetic_data):
+    orders, activities_df = synthetic_data
+    base = fingerprints_of(orders, activities_df)
+    assert fingerprints_of(orders.copy(), activities_df.copy()) == base
+    cust_id = int(orders['CUSTOMER_ID'].iloc[0])
+
+    sales = orders['SALES_AMOUNT'].to_numpy().copy()
+    sales[0] += 100  # float32 그대로 바꾼다 (dtype이 바뀌면 모든 행의 해시가 달라진다)
+    changed = fingerprints_of(orders.assign(SALES_AMOUNT=sales), activities_df)
+    assert {c for c in base if changed[c] != base[c]} == {cust_id}
+
+    activity_customer = int(activities_df['CUSTOMER_ID'].iloc[-1])
+    changed = fingerprints_of(orders, activities_df.drop(index=activities_df.index[-1]))
+    assert {c for c in base if changed[c] != base[c]} == {activity_customer}
+
+    for changed in (fingerprints_of(orders, activities_df, horizon='2030-02-01'),
+                    fingerprints_of(orders, activities_df, config_key='other-config')):
+        assert all(changed[c] != base[c] for c in base)
+
+
+class FailingCustomerBackend(SQLiteForecastBackend):
+    """failing_customer의 행이 들어 있는 청크 저장을 실패시킴"""
+
+    def __init__(self, failing_customer):
+        super().__init__()
+        self.failing_customer = failing_customer
+
+    def upsert(self, rows):
+        if any(row['CUSTOMER_ID'] == self.failing_customer for row in rows):
+            raise ConnectionError('upsert unavailable')
+        super().upsert(rows)
+
+
+def test_unchanged_customers_are_skipped(pipeline, stub_forecasts):
+    first = pipeline()
+    assert first['skipped'] == 0 and first['group_a'] > 0 and stub_forecasts
+    group_a = first['group_a']
+
+    stub_forecasts.clear()
+    second = pipeline()
+    assert second['skipped'] == group_a and second['group_a'] == 0 and stub_forecasts == []
+
+    forced = pipeline(full_refit=True)
+    assert forced['skipped'] == 0 and forced['group_a'] == group_a
+
+
+def test_changed_data_horizon_or_config_triggers_refit(pipeline, monkeypatch):
+    group_a = pipeline()['group_a']
+
+    # 주문이 가장 많은(A그룹) 고객의 주문 금액 하나만 바꾸면 그 고객만 다시 예측한다
+    orders = pipeline.client.tables['orders']
+    order_counts = pd.Series([order['contacts']['CUSTOMER_ID'] for order in orders]).value_counts()
+    i = next(i for i, order in enumerate(orders) if order['contacts']['CUSTOMER_ID'] == order_counts.index[0])
+    orders[i] = {**orders[i], 'AMOUNT': orders[i]['AMOUNT'] + 500.0}
+    changed = pipeline()
+    assert changed['group_a'] == 1 and changed['skipped'] == group_a - 1
+    assert pipeline()['group_a'] == 0
+
+    assert pipeline(baseline_mape_threshold=forecast.BASELINE_MAPE_THRESHOLD + 1)['group_a'] == group_a
+
+    class NextMonth(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=32)
+
+    monkeypatch.setattr(forecast, 'date', NextMonth)
+    assert pipeline(baseline_mape_threshold=forecast.BASELINE_MAPE_THRESHOLD + 1)['skipped'] == 0
+
+
+def test_failed_writes_are_not_fingerprinted(pipeline):
+    backend = SQLiteForecastBackend()
+    group_a = pipeline(backend=backend)['group_a']
+    saved = forecast.load_fingerprints(pipeline.state_dir)
+    failing_customer = sorted(saved)[0]
+
+    forced = pipeline(backend=FailingCustomerBackend(failing_customer), full_refit=True)
+    assert forced['group_a'] == group_a
+    saved_after_failure = forecast.load_fingerprints(pipeline.state_dir)
+    assert failing_customer not in saved_after_failure
+    assert saved_after_failure and set(saved_after_failure) < set(saved)
+
+    retried = pipeline(backend=backend)
+    assert retried['group_a'] == len(set(saved) - set(saved_after_failure)) > 0
+    assert failing_customer in forecast.load_fingerprints(pipeline.state_dir)
@@ -0,0 +1,106 @@
+"""MemoryGuard 회수/동시 작업 수 조절 (RSS 읽기 대역)과 CustomerSeriesPartitions 월별 합계"""
+import os
+
+import numpy as np
+import pytest
+
+import forecast
+
+LIMIT_MB = 1000
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """forecast._current_rss_mb()가 돌려줄 부모 프로세스 RSS(MB)를 담는 dict"""
+    state = {'mb': 0.0}
+    monkeypatch.setattr(forecast, '_current_rss_mb', lambda: state['mb'])
+    return state
+
+
+def observe(guard, rss, mb, after_reclaim_mb=None, run_info=None):
+    """RSS를 mb로 두고 관찰. 회수가 일어나면 on_pressure에서 RSS를 after_reclaim_mb로 바꾼다 (None이면 그대로)"""
+    calls = []
+
+    def on_pressure():
+        calls.append(mb)
+        if after_reclaim_mb is not None:
+            rss['mb'] = after_reclaim_mb
+
+    rss['mb'] = mb
+    guard.observe(run_info or {}, on_pressure=on_pressure)
+    return bool(calls)
+
+
+def test_reclaim_hysteresis(rss):
+    guard = forecast.MemoryGuard(LIMIT_MB, workers=2, max_in_flight=4)
+    growth = forecast.MEMORY_RECLAIM_GROWTH_MB
+    assert not observe(guard, rss, LIMIT_MB - 1)
+    assert observe(guard, rss, LIMIT_MB + 100, after_reclaim_mb=LIMIT_MB - 50)  # 상한 초과 → 회수
+    assert not observe(guard, rss, LIMIT_MB + 10)  # 직전 회수 이후 증가분 < growth
+    assert observe(guard, rss, LIMIT_MB - 50 + growth, after_reclaim_mb=LIMIT_MB - 20)
+    assert not observe(guard, rss, LIMIT_MB + 1)
+    # 재개 비율 아래로 내려오면 회수 조건이 초기화되어 상한을 넘자마자 다시 회수한다
+    assert not observe(guard, rss, LIMIT_MB * forecast.MEMORY_RESUME_RATIO)
+    assert observe(guard, rss, LIMIT_MB + 1, after_reclaim_mb=LIMIT_MB - 100)
+    assert guard.reclaims == 3 and guard.over_limit == 0 and guard.in_flight_limit() == 4
+    assert guard.stats()['peak_rss_mb'] == LIMIT_MB + 100
+
+
+def test_in_flight_limit_halves_then_recovers(rss, capsys):
+    guard = forecast.MemoryGuard(LIMIT_MB, workers=2, max_in_flight=8)
+    growth = forecast.MEMORY_RECLAIM_GROWTH_MB
+    limits = []
+    for step in range(5):  # 회수해도 내려가지 않고 계속 늘어나는 RSS
+        observe(guard, rss, LIMIT_MB + 10 + step * growth)
+        limits.append(guard.in_flight_limit())
+    assert limits == [4, 2, 1, 1, 1]
+    assert guard.over_limit == 5 and guard.stats()['min_in_flight'] == 1
+    assert capsys.readouterr().out.count('메모리 상한 초과') == 1  # 경고는 한 번만
+
+    observe(guard, rss, LIMIT_MB - 1)  # 상한과 재개 비율 사이: 그대로
+    assert guard.in_flight_limit() == 1
+    restored = []
+    for _ in range(9):
+        observe(guard, rss, LIMIT_MB * forecast.MEMORY_RESUME_RATIO - 1)
+        restored.append(guard.in_flight_limit())
+    assert restored == [2, 3, 4, 5, 6, 7, 8, 8, 8]
+
+
+def test_worker_rss_counts_recent_workers_only(rss):
+    guard = forecast.MemoryGuard(LIMIT_MB, workers=2, max_in_flight=4)
+    parent = os.getpid()
+    observe(guard, rss, 100, run_info={'pid': parent + 1, 'rss_mb': 300})
+    observe(guard, rss, 100, run_info={'pid': parent + 2, 'rss_mb': 400})
+    assert guard.total_rss_mb() == 800
+    observe(guard, rss, 100, run_info={'pid': parent + 3, 'rss_mb': 200})  # 재시작된 워커: 가장 오래된 기록을 버림
+    assert guard.total_rss_mb() == 700
+    observe(guard, rss, 100, run_info={'pid': parent, 'rss_mb': 5000})  # 직렬 실행(부모)의 보고는 중복 집계 안 함
+    assert guard.total_rss_mb() == 700
+    assert guard.stats()['peak_worker_rss_mb'] == 400 and guard.stats()['peak_rss_mb'] == 800
+
+
+def test_zero_limit_only_records_peak(rss):
+    guard = forecast.MemoryGuard(0, workers=2, max_in_flight=4)
+    for mb in (10_000, 20_000, 500):
+        assert not observe(guard, rss, mb)
+    assert guard.in_flight_limit() == 4 and guard.reclaims == 0 and guard.stats()['peak_rss_mb'] == 20_000
+
+
+def test_partitions_match_groupby_bit_for_bit(synthetic_data):
+    orders = synthetic_data[0]
+    customer_ids = list(orders['CUSTOMER_ID'].unique())[::-1] + [999_999]  # 순서를 섞고, 주문 없는 고객 포함
+    partitions = forecast.CustomerSeriesPartitions.build(orders, customer_ids)
+    assert len(partitions) == len(customer_ids) - 1 and partitions.nbytes > 0
+
+    seen = []
+    for cust_id, part in partitions:
+        seen.append(cust_id)
+        grp_orders = orders[orders['CUSTOMER_ID'] == cust_id]
+        # forecast_single_customer()가 입력에서 계산하는 월별 합계와 같아야 한다
+        expected = grp_orders.groupby('MONTH_TS')['SALES_AMOUNT'].sum()
+        actual = part.groupby('MONTH_TS')['SALES_AMOUNT'].sum()
+        assert actual.dtype == expected.dtype
+        assert np.array_equal(actual.index.to_numpy(), expected.index.to_numpy())
+        assert actual.to_numpy().tobytes() == expected.to_numpy().tobytes()
+    assert seen == customer_ids[:-1]
+    assert partitions.nbytes == 0  # 꺼낸 고객의 배열은 바로 버린다
@@ -0,0 +1,75 @@
+"""iter_customer_forecasts() 병렬 모드: 직렬 결과와 동일성, 멈춘 작업의 제한 시간 처리 (대역 예측 함수 사용)"""
+import time
+
+import pandas as pd
+import pytest
+
+import forecast
+from conftest import stub_single_customer_forecast
+
+FUTURE_DATES = pd.date_range('2030-01-01', periods=forecast.BASE_FUTURE, freq='MS')
+
+
+@pytest.fixture(scope='module')
+def customer_groups(synthetic_data):
+    orders = synthetic_data[0]
+    return [(cust_id, grp) for cust_id, grp in orders.groupby('CUSTOMER_ID', observed=True)][:8]
+
+
+def run(customer_groups, **kwargs):
+    """(고객 ID, DataFrame, 프로세스별 값(pid, rss_mb)을 뺀 실행 정보) 목록"""
+    context = {'future_dates_fixed': FUTURE_DATES, 'profile': False}
+    return [(cust_id, frame, {k: v for k, v in run_info.items() if k not in ('pid', 'rss_mb')})
+            for cust_id, frame, run_info in forecast.iter_customer_forecasts(customer_groups, context, **kwargs)]
+
+
+def assert_same_results(actual, expected):
+    assert [cust_id for cust_id, _, _ in actual] == [cust_id for cust_id, _, _ in expected]
+    for (_, frame, run_info), (_, expected_frame, expected_info) in zip(actual, expected):
+        pd.testing.assert_frame_equal(frame, expected_frame)
+        assert run_info == expected_info
+
+
+@pytest.mark.parametrize('max_in_flight', [None, 2, lambda: 3])
+def test_parallel_matches_serial(customer_groups, stub_forecasts, max_in_flight):
+    serial = run(customer_groups, workers=1)
+    parallel = run(customer_groups, workers=2, task_timeout=60, max_in_flight=max_in_flight)
+    assert_same_results(parallel, serial)
+    assert all(run_info['model'] == 'Stub' for _, _, run_info in serial)
+
+
+def test_hung_task_fails_and_pool_restarts(customer_groups, stub_forecasts, monkeypatch, capsys):
+    hung_customer = customer_groups[1][0]
+
+    def hanging_forecast(cust_id, grp_orders, context):
+        if cust_id == hung_customer:
+            time.sleep(120)
+        return stub_single_customer_forecast(cust_id, grp_orders, context)
+
+    serial = run(customer_groups, workers=1)
+    monkeypatch.setattr(forecast, 'forecast_single_customer', hanging_forecast)
+    monkeypatch.setattr(forecast, 'TASK_POLL_INTERVAL_S', 0.05)
+    started = time.perf_counter()
+    parallel = run(customer_groups, workers=2, task_timeout=1.0)
+    assert time.perf_counter() - started < 60
+
+    hung = [i for i, (cust_id, _, _) in enumerate(parallel) if cust_id == hung_customer]
+    assert hung == [1]
+    _, frame, run_info = parallel[1]
+    assert run_info['model'] == 'Prediction Failed' and run_info['timed_out']
+    assert (frame['PREDICTED_QUANTITY'] == 0).all() and list(frame['PREDICTED_DATE']) == list(FUTURE_DATES)
+    assert_same_results(parallel[:1] + parallel[2:], serial[:1] + serial[2:])  # 다른 고객은 새 풀에서 정상 예측
+    assert '♻️ 멈춘 워커 정리' in capsys.readouterr().out
+
+
+def test_serial_mode_ignores_task_timeout(customer_groups, stub_forecasts, monkeypatch):
+    slow_customer = customer_groups[0][0]
+
+    def slow_forecast(cust_id, grp_orders, context):
+        if cust_id == slow_customer:
+            time.sleep(0.3)
+        return stub_single_customer_forecast(cust_id, grp_orders, context)
+
+    monkeypatch.setattr(forecast, 'forecast_single_customer', slow_forecast)
+    results = run(customer_groups[:2], workers=1, task_timeout=0.01)
+    assert [run_info['model'] for _, _, run_info in results] == ['Stub', 'Stub']
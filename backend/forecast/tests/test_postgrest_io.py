@@ -0,0 +1,133 @@
+"""AsyncPostgrestIO / AsyncPostgrestForecastBackend (mock_postgrest 서버 기준)"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('httpx')
+
+import forecast
+from forecast_backends import AsyncPostgrestForecastBackend
+from mock_postgrest import MockPostgrestServer
+from postgrest_io import AsyncPostgrestIO, PostgrestRequestError
+
+ROWS = [{'ID': i, 'V': i * 2} for i in range(1, 251)]
+
+
+def open_io(server, **kwargs):
+    return AsyncPostgrestIO(server.start(), 'test-key', backoff_s=0.001, **kwargs)
+
+
+@pytest.fixture
+def server():
+    server = MockPostgrestServer({'t': ROWS})
+    yield server
+    server.stop()
+
+
+def page_ids(http_io, page_size, **kwargs):
+    return [[row['ID'] for row in page] for page in http_io.iter_table_pages('t', 'ID, V', 'ID', page_size, **kwargs)]
+
+
+@pytest.mark.parametrize('max_rows', [0, 30])
+def test_iter_table_pages_returns_every_row_in_order(server, max_rows):
+    server.max_rows = max_rows
+    http_io = open_io(server)
+    try:
+        pages = page_ids(http_io, 100, prefetch=3)
+        after = page_ids(http_io, 100, after=200)
+    finally:
+        http_io.close()
+    assert [i for page in pages for i in page] == list(range(1, 251))
+    assert max(len(page) for page in pages) == (max_rows or 100)  # max-rows가 작으면 짧은 첫 페이지 길이로 나눈다
+    assert [i for page in after for i in page] == list(range(201, 251))
+
+
+def test_short_page_mid_stream_raises_instead_of_skipping_rows(server):
+    server.max_rows = 60
+    http_io = open_io(server)
+    try:
+        pages = http_io.iter_table_pages('t', 'ID, V', 'ID', 100, prefetch=1)
+        assert len(next(pages)) == 60
+        server.max_rows = 20
+        with pytest.raises(PostgrestRequestError):
+            list(pages)
+    finally:
+        http_io.close()
+
+
+def test_count_rows_applies_filters(server):
+    http_io = open_io(server)
+    try:
+        assert http_io.count_rows('t', 'ID') == 250
+        assert http_io.count_rows('t', 'ID', [('ID', 'gt.200'), ('V', 'lte.480')]) == 40
+    finally:
+        http_io.close()
+
+
+def test_retries_injected_failures():
+    server = MockPostgrestServer({'t': ROWS}, fail_every=3)
+    http_io = open_io(server)
+    try:
+        ids = [i for page in page_ids(http_io, 25) for i in page]
+    finally:
+        http_io.close()
+        server.stop()
+    assert ids == list(range(1, 251))
+    assert server.failed_count > 0 and http_io.retry_count == server.failed_count
+
+
+def test_gives_up_after_max_retries():
+    server = MockPostgrestServer({'t': ROWS}, fail_every=1)
+    http_io = open_io(server, max_retries=2)
+    try:
+        with pytest.raises(PostgrestRequestError):
+            http_io.count_rows('t', 'ID')
+    finally:
+        http_io.close()
+        server.stop()
+    assert server.request_count == 3 and http_io.retry_count == 2
+
+
+def test_forecast_backend_upserts_and_pages():
+    server = MockPostgrestServer({'forecasts': []})
+    backend = AsyncPostgrestForecastBackend(open_io(server), table_name='forecasts')
+    rows = [{'CUSTOMER_ID': c, 'PREDICTED_DATE': d, 'MAPE': float(c), 'PREDICTED_QUANTITY': 1.0}
+            for c in range(1, 6) for d in ('2030-01-01', '2030-02-01')]
+    try:
+        assert backend.upsert_many([rows[:4], rows[4:]]) == [None, None]
+        backend.upsert([{**rows[0], 'MAPE': 0.5}])
+        pages = [backend.fetch_existing_page('2030-01-01', '2030-02-01', offset, 4) for offset in (0, 4, 8)]
+        existing = backend.fetch_existing([2, 3], '2030-02-01', '2030-02-01')
+    finally:
+        backend.http_io.close()
+        server.stop()
+    assert len(server.tables['forecasts']) == 10
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert (pages[0][0]['CUSTOMER_ID'], pages[0][0]['PREDICTED_DATE'], pages[0][0]['MAPE']) == (1, '2030-01-01', 0.5)
+    assert sorted(row['CUSTOMER_ID'] for row in existing) == [2, 3]
+
+
+def test_forecast_writer_without_unique_constraint_inserts_and_updates():
+    server = MockPostgrestServer({'forecasts': []}, unique_keys={'forecasts': []})
+    backend = AsyncPostgrestForecastBackend(open_io(server), table_name='forecasts')
+    dates = pd.date_range('2030-01-01', periods=2, freq='MS')
+    try:
+        with pytest.raises(PostgrestRequestError) as excinfo:
+            backend.upsert([{'CUSTOMER_ID': 1, 'PREDICTED_DATE': '2030-01-01'}])
+        writers = []
+        for quantity, mape in ((100.0, 10.0), (50.0, 5.0), (80.0, 20.0)):
+            writers.append(forecast.ForecastBulkWriter(backend, datetime(2030, 1, 1), chunk_size=1))
+            for customer_id in (1, 2):
+                writers[-1].add(customer_id, forecast.finalize_forecast_frame(
+                    pd.DataFrame({'ds': dates, 'yhat': quantity}), mape, 'ARIMA'))
+            writers[-1].close()
+    finally:
+        backend.http_io.close()
+        server.stop()
+    assert excinfo.value.code == '42P10'
+    assert all(writer.failed_customers == set() for writer in writers)
+    assert [writer.stats['UPDATE'] for writer in writers] == [0, 4, 0] and not writers[1].upsert_supported
+    rows = server.tables['forecasts']
+    assert len(rows) == 4  # 두 번째/세 번째 저장은 기존 행을 갱신(또는 유지)한다
+    assert {(row['PREDICTED_QUANTITY'], row['MAPE']) for row in rows} == {(50.0, 5.0)}
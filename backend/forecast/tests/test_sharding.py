@@ -0,0 +1,93 @@
+"""샤드 지정/배정과 재시작 체크포인트 (RunCheckpoint, --shard, 재개)"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import forecast
+
+CUSTOMER_IDS = list(range(1, 501))
+
+
+@pytest.mark.parametrize('spec, expected', [('0/1', (0, 1)), ('2/3', (2, 3)), (' 1/4', (1, 4))])
+def test_parse_shard(spec, expected):
+    assert forecast.parse_shard(spec) == expected
+
+
+@pytest.mark.parametrize('spec', ['', '1', '1/2/3', 'a/b', '3/3', '-1/3', '0/0', '1/-2'])
+def test_parse_shard_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        forecast.parse_shard(spec)
+
+
+def test_cli_rejects_bad_shard(capsys):
+    with pytest.raises(SystemExit):
+        forecast.parse_args(['--shard', '4/4'])
+    assert '--shard' in capsys.readouterr().err
+
+
+def test_shard_assignment_is_stable_across_processes():
+    script = ("import json, forecast; "
+              f"print(json.dumps([forecast.customer_shard(c, 7) for c in {CUSTOMER_IDS!r}]))")
+    expected = [forecast.customer_shard(c, 7) for c in CUSTOMER_IDS]
+    for hash_seed in ('1', '2'):
+        output = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(forecast.__file__)),
+                                env={**os.environ, 'PYTHONHASHSEED': hash_seed}, capture_output=True, text=True,
+                                check=True).stdout
+        assert json.loads(output.strip().splitlines()[-1]) == expected
+
+
+@pytest.mark.parametrize('shard_count', [1, 3, 7])
+def test_shards_cover_every_customer_exactly_once(shard_count):
+    shards = [[c for c in CUSTOMER_IDS if forecast.customer_shard(c, shard_count) == i] for i in range(shard_count)]
+    assert sorted(c for shard in shards for c in shard) == CUSTOMER_IDS
+    assert all(len(shard) > len(CUSTOMER_IDS) / shard_count / 2 for shard in shards)  # 한쪽으로 쏠리지 않음
+
+
+def test_sharded_runs_split_customers(pipeline):
+    total = pipeline()['total']
+    per_shard = [pipeline(shard=(i, 3), full_refit=True) for i in range(3)]
+    assert sum(customers['total'] for customers in per_shard) == total
+    fingerprint_files = [forecast.shard_file_name(forecast.FINGERPRINT_FILE_NAME, (i, 3)) for i in range(3)]
+    shard_customers = [set(forecast.load_fingerprints(pipeline.state_dir, name)) for name in fingerprint_files]
+    assert not any(shard_customers[i] & shard_customers[j] for i in range(3) for j in range(i + 1, 3))
+    assert set().union(*shard_customers) == set(forecast.load_fingerprints(pipeline.state_dir))
+
+
+def test_checkpoint_tolerates_truncated_last_line(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = forecast.RunCheckpoint(path)
+    checkpoint.record({1: {'horizon': '2030-01'}, 2: {'horizon': '2030-01'}})
+    checkpoint.record({3: {'horizon': '2030-01'}})
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"customer_id": 4, "fingerp')  # 기록 도중 중단
+    assert forecast.RunCheckpoint(path).load() == {c: {'horizon': '2030-01'} for c in (1, 2, 3)}
+    checkpoint.clear()
+    assert forecast.RunCheckpoint(path).load() == {} and not os.path.exists(path)
+
+
+def test_checkpointed_customers_are_skipped_on_resume(pipeline, stub_forecasts):
+    pipeline()
+    fingerprints = forecast.load_fingerprints(pipeline.state_dir)
+    fitted = sorted(set(stub_forecasts))
+    assert len(fitted) >= 4
+
+    # 중단된 실행을 흉내낸다: 지문 파일은 이전 상태(없음), 체크포인트에는 저장을 마친 고객 일부
+    os.remove(os.path.join(pipeline.state_dir, forecast.FINGERPRINT_FILE_NAME))
+    checkpoint_path = os.path.join(pipeline.state_dir, forecast.CHECKPOINT_FILE_NAME)
+    done, stale = fitted[:3], fitted[3]
+    forecast.RunCheckpoint(checkpoint_path).record(
+        {**{c: fingerprints[c] for c in done}, stale: {**fingerprints[stale], 'series_hash': 'changed'}})
+
+    stub_forecasts.clear()
+    resumed = pipeline()
+    assert resumed['resumed'] == len(done)
+    assert not set(done) & set(stub_forecasts) and stale in stub_forecasts  # 지문이 다른 기록은 무시
+    assert set(done) <= set(forecast.load_fingerprints(pipeline.state_dir))  # 재개한 고객도 지문 파일에 합쳐진다
+    assert not os.path.exists(checkpoint_path)
+
+    forecast.RunCheckpoint(checkpoint_path).record({c: fingerprints[c] for c in done})
+    stub_forecasts.clear()
+    assert pipeline(full_refit=True, resume=False)['resumed'] == 0 and set(done) <= set(stub_forecasts)
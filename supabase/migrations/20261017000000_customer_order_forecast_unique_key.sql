@@ -0,0 +1,13 @@
+-- backend/forecast/forecast.py는 예측을 (CUSTOMER_ID, PREDICTED_DATE) 기준으로 일괄 upsert한다
+-- (PostgREST on_conflict=CUSTOMER_ID,PREDICTED_DATE). 이 유니크 제약이 없으면 PostgREST가 42P10 오류를 돌려주고,
+-- 파이프라인은 INSERT/UPDATE 개별 요청으로 되돌아가 느려진다.
+
+-- 같은 (고객, 예측 월)에 중복 행이 있으면 가장 최근(COF_ID가 가장 큰) 행만 남긴다.
+DELETE FROM public.customer_order_forecast AS older
+USING public.customer_order_forecast AS newer
+WHERE older."CUSTOMER_ID" = newer."CUSTOMER_ID"
+  AND older."PREDICTED_DATE" = newer."PREDICTED_DATE"
+  AND older."COF_ID" < newer."COF_ID";
+
+ALTER TABLE public.customer_order_forecast
+    ADD CONSTRAINT customer_order_forecast_customer_date_key UNIQUE ("CUSTOMER_ID", "PREDICTED_DATE");